@@ -0,0 +1,47 @@
+"""Partial index for pending wallet operations (balance projection, CONCURRENTLY)
+
+Revision ID: 20251226_000002
+Revises: 20251216_000001
+Create Date: 2025-12-26
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20251226_000002'
+down_revision = '20251216_000001'
+branch_labels = None
+depends_on = None
+
+
+INDEX = 'idx_wallet_operations_user_pending'
+
+
+def upgrade() -> None:
+    # Суммы pending депозитов/выводов в WalletService.get_balance.
+    # CREATE INDEX CONCURRENTLY не блокирует запись в wallet_operations, но не
+    # может выполняться внутри транзакции - поэтому autocommit_block.
+    with op.get_context().autocommit_block():
+        # Прерванный CONCURRENTLY оставляет невалидный индекс - удаляем его,
+        # иначе IF NOT EXISTS молча оставит сломанный индекс.
+        op.execute(f"""
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = '{INDEX}' AND NOT i.indisvalid
+                ) THEN
+                    EXECUTE 'DROP INDEX {INDEX}';
+                END IF;
+            END $$;
+        """)
+        op.execute(f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX}
+            ON wallet_operations (user_id, operation_type)
+            WHERE status = 'pending'
+        """)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX}')
@@ -0,0 +1,48 @@
+"""Indexes for keyset pagination of bet/transaction history (CONCURRENTLY)
+
+Revision ID: 20251227_000003
+Revises: 20251226_000002
+Create Date: 2025-12-27
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20251227_000003'
+down_revision = '20251226_000002'
+branch_labels = None
+depends_on = None
+
+
+# WalletService.get_bet_history: WHERE user_id = ? ORDER BY (время, id) DESC
+INDEXES = [
+    ('idx_bets_user_placed', 'bets (user_id, placed_at DESC, id DESC)'),
+    ('idx_balance_transactions_user_created', 'balance_transactions (user_id, created_at DESC, transaction_id DESC)'),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY не блокирует запись в bets и balance_transactions,
+    # но не может выполняться внутри транзакции - поэтому autocommit_block.
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            # Прерванный CONCURRENTLY оставляет невалидный индекс - удаляем его,
+            # иначе IF NOT EXISTS молча оставит сломанный индекс.
+            op.execute(f"""
+                DO $$
+                BEGIN
+                    IF EXISTS (
+                        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                        WHERE c.relname = '{name}' AND NOT i.indisvalid
+                    ) THEN
+                        EXECUTE 'DROP INDEX {name}';
+                    END IF;
+                END $$;
+            """)
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
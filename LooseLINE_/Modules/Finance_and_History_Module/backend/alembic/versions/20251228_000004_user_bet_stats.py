@@ -0,0 +1,64 @@
+"""Per-user betting statistics (user_bet_stats) with initial backfill
+
+Revision ID: 20251228_000004
+Revises: 20251227_000003
+Create Date: 2025-12-28
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20251228_000004'
+down_revision = '20251227_000003'
+branch_labels = None
+depends_on = None
+
+
+# Период -> начало периода по placed_at (ставки без placed_at - только в 'all')
+PERIOD_STARTS = {
+    'all': "DATE '1970-01-01'",
+    'month': "date_trunc('month', placed_at)::date",
+    'day': "placed_at::date",
+}
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS user_bet_stats (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            period_type VARCHAR(10) NOT NULL,
+            period_start DATE NOT NULL,
+            bets_settled INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            total_stake DECIMAL(15, 2) NOT NULL DEFAULT 0,
+            total_won DECIMAL(15, 2) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, period_type, period_start)
+        )
+    """)
+
+    # Начальное заполнение из bets (повторный запуск ничего не меняет)
+    for period_type, period_start in PERIOD_STARTS.items():
+        placed_filter = "" if period_type == 'all' else " AND placed_at IS NOT NULL"
+        op.execute(f"""
+            INSERT INTO user_bet_stats (
+                user_id, period_type, period_start,
+                bets_settled, wins, losses, total_stake, total_won
+            )
+            SELECT
+                user_id, '{period_type}', {period_start},
+                COUNT(*),
+                COUNT(*) FILTER (WHERE status = 'won'),
+                COUNT(*) FILTER (WHERE status = 'lost'),
+                COALESCE(SUM(stake), 0),
+                COALESCE(SUM(actual_win) FILTER (WHERE status = 'won'), 0)
+            FROM bets
+            WHERE status IN ('won', 'lost'){placed_filter}
+            GROUP BY user_id, {period_start}
+            ON CONFLICT (user_id, period_type, period_start) DO NOTHING
+        """)
+
+
+def downgrade() -> None:
+    op.execute('DROP TABLE IF EXISTS user_bet_stats CASCADE')
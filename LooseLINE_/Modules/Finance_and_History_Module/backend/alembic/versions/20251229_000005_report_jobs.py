@@ -0,0 +1,47 @@
+"""Background report jobs (report_jobs)
+
+Revision ID: 20251229_000005
+Revises: 20251228_000004
+Create Date: 2025-12-29
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20251229_000005'
+down_revision = '20251228_000004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            report_id VARCHAR(40) PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            format VARCHAR(10) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            params TEXT,
+            file_path VARCHAR(500),
+            file_size BIGINT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_report_jobs_user_created
+        ON report_jobs (user_id, created_at)
+    """)
+    # Очистка просроченных отчётов
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_report_jobs_expires_at
+        ON report_jobs (expires_at)
+        WHERE status <> 'expired'
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP TABLE IF EXISTS report_jobs')
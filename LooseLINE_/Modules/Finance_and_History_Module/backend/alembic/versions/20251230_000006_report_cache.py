@@ -0,0 +1,31 @@
+"""Report cache key and LRU access time on report_jobs
+
+Revision ID: 20251230_000006
+Revises: 20251229_000005
+Create Date: 2025-12-30
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20251230_000006'
+down_revision = '20251229_000005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE report_jobs ADD COLUMN IF NOT EXISTS cache_key VARCHAR(64)")
+    op.execute("ALTER TABLE report_jobs ADD COLUMN IF NOT EXISTS last_accessed_at TIMESTAMP")
+    # Поиск отчёта в кэше (ReportJobs.lookup)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_report_jobs_cache_key
+        ON report_jobs (cache_key)
+        WHERE status <> 'expired'
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP INDEX IF EXISTS idx_report_jobs_cache_key')
+    op.execute('ALTER TABLE report_jobs DROP COLUMN IF EXISTS last_accessed_at')
+    op.execute('ALTER TABLE report_jobs DROP COLUMN IF EXISTS cache_key')
@@ -0,0 +1,51 @@
+"""monthly_statements: period_date, file_path, status as in the ORM model
+
+Revision ID: 20251231_000007
+Revises: 20251230_000006
+Create Date: 2025-12-31
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20251231_000007'
+down_revision = '20251230_000006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Начальная схема хранила период как (year, month) и суммы, модель
+    # MonthlyStatement - period_date, file_path и status
+    op.execute("ALTER TABLE monthly_statements ADD COLUMN IF NOT EXISTS period_date DATE")
+    op.execute("ALTER TABLE monthly_statements ADD COLUMN IF NOT EXISTS file_path VARCHAR(500)")
+    op.execute("ALTER TABLE monthly_statements ADD COLUMN IF NOT EXISTS status VARCHAR(20) DEFAULT 'generated'")
+    op.execute("""
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'monthly_statements' AND column_name = 'year'
+            ) THEN
+                UPDATE monthly_statements
+                SET period_date = make_date(year, month, 1)
+                WHERE period_date IS NULL;
+
+                ALTER TABLE monthly_statements
+                    ALTER COLUMN year DROP NOT NULL,
+                    ALTER COLUMN month DROP NOT NULL,
+                    ALTER COLUMN opening_balance DROP NOT NULL,
+                    ALTER COLUMN closing_balance DROP NOT NULL;
+            END IF;
+        END $$;
+    """)
+    op.execute("ALTER TABLE monthly_statements ALTER COLUMN period_date SET NOT NULL")
+    # Одна выписка на пользователя и месяц (upsert генератора выписок)
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_monthly_statements_user_period
+        ON monthly_statements (user_id, period_date)
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP INDEX IF EXISTS uq_monthly_statements_user_period')
@@ -39,7 +39,39 @@ class Settings(BaseSettings):
     
     # Reports
     reports_dir: str = "./reports"
-    reports_base_url: str = "https://api.looseline.com/reports"
+    reports_base_url: str = "https://api.looseline.com/api/wallet/reports"
+    # Фоновая генерация отчётов (services/report_service.py)
+    report_workers: int = 2
+    report_ttl_days: int = 7
+    report_cleanup_interval_seconds: int = 3600
+    report_max_pending_per_user: int = 3
+    # queued/running дольше - задание потеряно (упавший воркер, рестарт) и помечается failed
+    report_stale_after_seconds: int = 1800
+    report_cache_max_mb: int = 1024
+    # Потоковый CSV экспорт: строк на кусок ответа и на выборку курсора
+    export_chunk_rows: int = 1000
+    # Parquet отчёты: строк в группе строк и кодек сжатия
+    parquet_row_group_rows: int = 100000
+    parquet_compression: str = "zstd"
+
+    # Internal API (межмодульные вызовы, например события ставок из модуля Betting)
+    internal_api_token: str = ""
+
+    # Audit log: очередь записей и фоновый сброс пачками (services/audit_service.py)
+    audit_queue_size: int = 10000
+    audit_batch_size: int = 500
+    audit_flush_interval_ms: int = 200
+    audit_enqueue_timeout_ms: int = 50
+
+    # Кэш X-User-ID -> users.id (services/identity_service.py)
+    identity_cache_size: int = 10000
+    identity_cache_ttl_seconds: int = 300
+    identity_negative_ttl_seconds: int = 5
+
+    # Месячные выписки (services/statement_service.py)
+    statements_dir: str = "./reports/statements"
+    statement_workers: int = 4
+    statement_chunk_size: int = 1000
     
     class Config:
         env_file = ".env"
@@ -25,6 +25,9 @@ from config.settings import settings
 from models.database import init_db
 from routes.wallet import router as wallet_router
 from routes.webhooks import router as webhook_router
+from routes.internal import router as internal_router
+from services.audit_service import audit_writer
+from services.report_service import report_jobs
 
 
 # Настройка логирования
@@ -66,12 +69,23 @@ async def lifespan(app: FastAPI):
     if not settings.stripe_webhook_secret:
         logger.warning("STRIPE_WEBHOOK_SECRET not configured!")
     
+    if not settings.internal_api_token:
+        logger.warning("INTERNAL_API_TOKEN not configured - /api/internal is disabled!")
+    
+    # Фоновая запись audit_log пачками
+    audit_writer.start()
+    
+    # Пул генерации отчётов и очистка просроченных файлов
+    report_jobs.start()
+    
     logger.info(f"Server starting on {settings.api_host}:{settings.api_port}")
     
     yield
     
     # Shutdown
     logger.info("Shutting down LOOSELINE Wallet Service...")
+    report_jobs.stop()
+    audit_writer.stop()
 
 
 # Создание приложения
@@ -136,6 +150,7 @@ templates = Jinja2Templates(directory=str(templates_dir))
 # Подключение роутеров
 app.include_router(wallet_router)
 app.include_router(webhook_router)
+app.include_router(internal_router)
 
 
 # Главная страница - веб-интерфейс кошелька
@@ -9,7 +9,9 @@ from .orm_models import (
     WithdrawalMethod,
     MonthlyStatement,
     AuditLog,
-    Bet
+    Bet,
+    UserBetStats,
+    ReportJob
 )
 
 __all__ = [
@@ -25,7 +27,9 @@ __all__ = [
     "WithdrawalMethod",
     "MonthlyStatement",
     "AuditLog",
-    "Bet"
+    "Bet",
+    "UserBetStats",
+    "ReportJob"
 ]
 
 
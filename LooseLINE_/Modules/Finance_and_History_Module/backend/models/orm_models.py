@@ -9,7 +9,7 @@ from typing import Optional, List
 
 from sqlalchemy import (
     Column, String, Integer, BigInteger, Boolean,
-    DECIMAL, TIMESTAMP, Text, ForeignKey, Index, DATE
+    DECIMAL, TIMESTAMP, Text, ForeignKey, Index, DATE, text
 )
 from sqlalchemy.dialects.postgresql import INET, JSONB
 from sqlalchemy.orm import relationship
@@ -144,6 +144,7 @@ class BalanceTransaction(Base):
 
     __table_args__ = (
         Index("idx_user_transactions", "user_id", "created_at"),
+        Index("idx_balance_transactions_user_created", "user_id", "created_at", "transaction_id"),
         Index("idx_transaction_type", "transaction_type"),
     )
 
@@ -186,6 +187,10 @@ class WalletOperation(Base):
     __table_args__ = (
         Index("idx_wallet_operations_user_id", "user_id"),
         Index("idx_wallet_operations_created_at", "created_at"),
+        Index(
+            "idx_wallet_operations_user_pending", "user_id", "operation_type",
+            postgresql_where=text("status = 'pending'")
+        ),
     )
 
 
@@ -238,7 +243,12 @@ class WithdrawalMethod(Base):
 
 
 class MonthlyStatement(Base):
-    """Месячные финансовые отчёты."""
+    """
+    Месячные финансовые отчёты (services/statement_service.py).
+
+    period_date: первое число месяца; одна выписка на пользователя и месяц
+    status: generated - файл выписки записан, failed - генерация не удалась
+    """
     __tablename__ = "monthly_statements"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -254,6 +264,7 @@ class MonthlyStatement(Base):
     __table_args__ = (
         Index("idx_monthly_statements_user_id", "user_id"),
         Index("idx_monthly_statements_period", "period_date"),
+        Index("uq_monthly_statements_user_period", "user_id", "period_date", unique=True),
     )
 
 
@@ -331,6 +342,68 @@ class Bet(Base):
         Index("idx_bets_placed_at", "placed_at"),
         Index("idx_bets_status", "status"),
         Index("idx_bets_user_status", "user_id", "status"),
+        Index("idx_bets_user_placed", "user_id", "placed_at", "id"),
     )
 
 
+class UserBetStats(Base):
+    """
+    Статистика рассчитанных ставок пользователя (won/lost).
+
+    Поддерживается инкрементально при применении событий ставок
+    (services/stats_service.py), пересчитывается из bets командой rebuild.
+
+    period_type: all (period_start = 1970-01-01), month, day - по дате placed_at
+    """
+    __tablename__ = "user_bet_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    period_type = Column(String(10), primary_key=True)
+    period_start = Column(DATE, primary_key=True)
+    bets_settled = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+    losses = Column(Integer, nullable=False, default=0)
+    total_stake = Column(DECIMAL(15, 2), nullable=False, default=0)
+    total_won = Column(DECIMAL(15, 2), nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+
+
+class ReportJob(Base):
+    """
+    Задания на генерацию отчётов (services/report_service.py).
+
+    status: queued -> running -> ready | failed;
+            ready -> expired после expires_at (файл удалён очисткой)
+    params: JSON параметров отчёта (date_from, date_to, include_*)
+    cache_key: хэш пользователя, параметров, формата и водяного знака данных
+    """
+    __tablename__ = "report_jobs"
+
+    report_id = Column(String(40), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    format = Column(String(10), nullable=False)
+    status = Column(String(20), nullable=False, default='queued')
+    params = Column(Text)
+    file_path = Column(String(500))
+    file_size = Column(BigInteger)
+    error = Column(Text)
+    cache_key = Column(String(64))
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    last_accessed_at = Column(TIMESTAMP)
+    started_at = Column(TIMESTAMP)
+    finished_at = Column(TIMESTAMP)
+    expires_at = Column(TIMESTAMP, nullable=False)
+
+    __table_args__ = (
+        Index("idx_report_jobs_user_created", "user_id", "created_at"),
+        Index(
+            "idx_report_jobs_expires_at", "expires_at",
+            postgresql_where=text("status <> 'expired'")
+        ),
+        Index(
+            "idx_report_jobs_cache_key", "cache_key",
+            postgresql_where=text("status <> 'expired'")
+        ),
+    )
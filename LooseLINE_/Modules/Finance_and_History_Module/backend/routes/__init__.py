@@ -1,7 +1,8 @@
 """Routes module."""
 from .wallet import router as wallet_router
 from .webhooks import router as webhook_router
+from .internal import router as internal_router
 
-__all__ = ["wallet_router", "webhook_router"]
+__all__ = ["wallet_router", "webhook_router", "internal_router"]
 
 
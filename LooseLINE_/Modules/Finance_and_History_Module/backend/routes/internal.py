@@ -0,0 +1,48 @@
+"""
+Внутренние API роуты для межмодульного взаимодействия.
+
+Endpoints:
+- POST /api/internal/bet-events - Пачка событий ставок из модуля Betting
+"""
+
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from models.database import get_db
+from schemas.bet_event_schemas import BetEventBatch, BetEventBatchResponse
+from services.bet_sync_service import BetSyncService
+
+
+router = APIRouter(prefix="/api/internal", tags=["Internal"])
+
+
+def verify_internal_token(x_internal_token: Optional[str] = Header(None)) -> None:
+    """
+    Проверяет общий секрет (INTERNAL_API_TOKEN).
+
+    Без настроенного секрета внутренний API закрыт: 503 на любой запрос.
+    """
+    if not settings.internal_api_token:
+        raise HTTPException(status_code=503, detail="Internal API is not configured")
+    if not x_internal_token or not hmac.compare_digest(x_internal_token, settings.internal_api_token):
+        raise HTTPException(status_code=401, detail="Invalid internal token")
+
+
+@router.post(
+    "/bet-events",
+    response_model=BetEventBatchResponse,
+    dependencies=[Depends(verify_internal_token)],
+)
+def ingest_bet_events(
+    batch: BetEventBatch,
+    db: Session = Depends(get_db)
+):
+    """
+    Применяет события ставок (at-least-once; повторы и устаревшие события пропускаются).
+    """
+    result = BetSyncService.apply_events(db, [e.model_dump(mode="json") for e in batch.events])
+    return BetEventBatchResponse(**result)
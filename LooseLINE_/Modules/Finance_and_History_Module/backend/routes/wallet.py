@@ -8,6 +8,10 @@ Endpoints:
 - POST /api/wallet/withdraw - Вывод средств
 - GET /api/wallet/history - История операций
 - GET /api/wallet/export - Экспорт отчёта
+- GET /api/wallet/export/stream - Потоковый CSV экспорт (опционально gzip)
+- POST /api/wallet/reports - Отчёт в фоне (CSV/PDF)
+- GET /api/wallet/reports/{report_id} - Статус отчёта
+- GET /api/wallet/reports/{report_id}/download - Скачать готовый отчёт
 - GET /api/wallet/payment-methods - Список способов оплаты
 - POST /api/wallet/payment-methods - Добавить способ оплаты
 - DELETE /api/wallet/payment-methods/{id} - Удалить способ оплаты
@@ -15,15 +19,24 @@ Endpoints:
 - POST /api/wallet/withdrawal-methods - Добавить способ вывода
 """
 
-from typing import Optional
+import os
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from loguru import logger
 
-from models.database import get_db
+from models.database import get_db, SessionLocal
 from models.orm_models import User, PaymentMethod, WithdrawalMethod
 from services.wallet_service import WalletService
+from services.identity_service import resolve_user_id
 from services.stripe_service import StripeService
+from services.report_service import (
+    report_jobs, report_info, report_filename, MEDIA_TYPES,
+    STATUS_READY, STATUS_EXPIRED
+)
 from schemas.wallet_schemas import (
     BalanceResponse,
     DepositRequest,
@@ -60,35 +73,11 @@ def get_current_user_id(request: Request, db: Session) -> int:
     Получает ID текущего пользователя.
     
     В production это должно быть через JWT токен или сессию.
-    Сейчас для тестирования берём из header X-User-ID и ищем пользователя.
+    Сейчас для тестирования берём из header X-User-ID и ищем пользователя
+    (сопоставление кэшируется на процесс, см. identity_service).
     """
     user_identifier = request.headers.get("X-User-ID", "demo_user")
-    
-    # Пытаемся найти пользователя по username или email
-    user = db.query(User).filter(
-        (User.username == user_identifier) | (User.email == user_identifier)
-    ).first()
-    
-    if not user:
-        # Создаём демо пользователя если не существует
-        from sqlalchemy import text
-        result = db.execute(text("""
-            INSERT INTO users (email, username, password_hash, is_active, is_verified)
-            VALUES (:email, :username, :password_hash, :is_active, :is_verified)
-            ON CONFLICT (email) DO UPDATE SET username = EXCLUDED.username
-            RETURNING id
-        """), {
-            "email": f"{user_identifier}@demo.looseline.com",
-            "username": user_identifier,
-            "password_hash": "demo",
-            "is_active": True,
-            "is_verified": True
-        })
-        user_id = result.scalar()
-        db.commit()
-        return user_id
-    
-    return user.id
+    return resolve_user_id(db, user_identifier)
 
 
 # ============================================================================
@@ -242,6 +231,11 @@ async def get_history(
     date_from: Optional[str] = Query(None, description="Начальная дата (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Конечная дата (YYYY-MM-DD)"),
     transaction_type: Optional[str] = Query(None, description="Тип транзакции"),
+    bets_cursor: Optional[str] = Query(None, description="Курсор страницы ставок (next_bets_cursor)"),
+    transactions_cursor: Optional[str] = Query(None, description="Курсор страницы транзакций (next_transactions_cursor)"),
+    timeline: bool = Query(False, description="Общая лента ставок и транзакций по времени"),
+    cursor: Optional[str] = Query(None, description="Курсор страницы ленты (next_cursor)"),
+    count: str = Query("estimate", pattern="^(exact|estimate|none)$", description="Подсчёт total_items"),
     db: Session = Depends(get_db)
 ):
     """
@@ -249,12 +243,17 @@ async def get_history(
     
     Args:
         limit: Количество результатов (1-100)
-        offset: Смещение для пагинации
+        offset: Смещение для пагинации (устаревшее, если нет курсора)
         status: Фильтр по статусу ставки
         result: Фильтр по результату
         date_from: Начальная дата
         date_to: Конечная дата
         transaction_type: Фильтр по типу транзакции
+        bets_cursor: Курсор следующей страницы ставок
+        transactions_cursor: Курсор следующей страницы транзакций
+        timeline: Слить ставки и транзакции в одну ленту
+        cursor: Курсор следующей страницы ленты
+        count: exact / estimate / none
     
     Returns:
         HistoryResponse: Ставки, транзакции, статистика, пагинация
@@ -278,10 +277,17 @@ async def get_history(
         user_id=user_id,
         limit=limit,
         offset=offset,
-        filters=filters if filters else None
+        filters=filters if filters else None,
+        bets_cursor=bets_cursor,
+        transactions_cursor=transactions_cursor,
+        timeline=timeline,
+        cursor=cursor,
+        count=count
     )
     
     if not history_result['success']:
+        if history_result.get('error') == "Invalid cursor":
+            raise HTTPException(status_code=400, detail="Invalid cursor")
         raise HTTPException(status_code=500, detail=history_result.get('error', 'Failed to get history'))
     
     return history_result
@@ -330,7 +336,7 @@ async def export_report(
 @router.get("/export", response_model=ExportResponse)
 async def export_report_get(
     request: Request,
-    format: str = Query("csv", description="Формат: csv или pdf"),
+    format: str = Query("csv", description="Формат: csv, pdf или parquet"),
     date_from: Optional[str] = Query(None, description="Начальная дата"),
     date_to: Optional[str] = Query(None, description="Конечная дата"),
     include_bets: bool = Query(True),
@@ -362,6 +368,169 @@ async def export_report_get(
     return result
 
 
+@router.get("/export/stream")
+async def export_report_stream(
+    request: Request,
+    date_from: Optional[str] = Query(None, description="Начальная дата"),
+    date_to: Optional[str] = Query(None, description="Конечная дата"),
+    include_bets: bool = Query(True),
+    include_transactions: bool = Query(True),
+    include_statistics: bool = Query(True),
+    gzip: bool = Query(False, description="Сжать ответ (файл .csv.gz)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Отдаёт CSV отчёт потоком: строки читаются из БД курсором и пишутся
+    в ответ кусками, память не зависит от длины периода.
+    """
+    user_id = get_current_user_id(request, db)
+    ip_address = get_client_ip(request)
+    
+    export = WalletService.prepare_csv_export(
+        db=db,
+        user_id=user_id,
+        date_from=date_from,
+        date_to=date_to,
+        ip_address=ip_address
+    )
+    
+    if not export['success']:
+        raise HTTPException(status_code=400, detail=export['error'])
+    
+    chunks = _stream_csv_report(
+        user_id=user_id,
+        date_from=export['date_from'],
+        date_to=export['date_to'],
+        include_bets=include_bets,
+        include_transactions=include_transactions,
+        include_statistics=include_statistics
+    )
+    filename = export['filename']
+    media_type = "text/csv; charset=utf-8"
+    if gzip:
+        chunks = _gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Report-ID": export['report_id']
+        }
+    )
+
+
+def _stream_csv_report(**params) -> Iterator[str]:
+    """
+    CSV отчёт в своей сессии: сессия из get_db закрывается до того,
+    как StreamingResponse дочитает генератор.
+    """
+    db = SessionLocal()
+    try:
+        yield from WalletService.iter_csv_report(db, **params)
+    finally:
+        db.close()
+
+
+def _gzip_chunks(chunks: Iterator[str]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # 31 - формат gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# ============================================================================
+# REPORT JOBS ENDPOINTS
+# ============================================================================
+
+@router.post("/reports", response_model=ExportResponse, status_code=202)
+async def create_report(
+    request: Request,
+    export_request: ExportRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Ставит отчёт (CSV, PDF или Parquet) в очередь фоновой генерации.
+    
+    Returns:
+        ExportResponse: report_id, status=queued, status_url и download_url
+    """
+    user_id = get_current_user_id(request, db)
+    ip_address = get_client_ip(request)
+    
+    result = WalletService.export_report(
+        db=db,
+        user_id=user_id,
+        format=export_request.format.value,
+        date_from=export_request.date_from,
+        date_to=export_request.date_to,
+        include_bets=export_request.include_bets,
+        include_transactions=export_request.include_transactions,
+        include_statistics=export_request.include_statistics,
+        ip_address=ip_address,
+        background=True
+    )
+    
+    if not result['success']:
+        status_code = 429 if result.get('error') == "Too many reports in progress" else 500
+        raise HTTPException(status_code=status_code, detail=result.get('error', 'Export failed'))
+    
+    return result
+
+
+@router.get("/reports/{report_id}", response_model=ExportResponse)
+async def get_report_status(
+    request: Request,
+    report_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Статус фонового отчёта.
+    """
+    user_id = get_current_user_id(request, db)
+    job = report_jobs.get(db, user_id, report_id)
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    
+    return {"success": True, "report": report_info(job)}
+
+
+@router.get("/reports/{report_id}/download")
+async def download_report(
+    request: Request,
+    report_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Отдаёт файл готового отчёта до expires_at.
+    
+    404 - отчёта нет, 409 - ещё строится или с ошибкой, 410 - срок истёк.
+    """
+    user_id = get_current_user_id(request, db)
+    job = report_jobs.get(db, user_id, report_id)
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if job.status == STATUS_EXPIRED or job.expires_at <= datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Report expired")
+    if job.status != STATUS_READY:
+        raise HTTPException(status_code=409, detail=f"Report is {job.status}")
+    if not job.file_path or not os.path.exists(job.file_path):
+        logger.error(f"Report {report_id} is ready but file is missing: {job.file_path}")
+        raise HTTPException(status_code=410, detail="Report file is no longer available")
+    
+    return FileResponse(
+        job.file_path,
+        media_type=MEDIA_TYPES[job.format],
+        filename=report_filename(job)
+    )
+
+
 # ============================================================================
 # PAYMENT METHODS ENDPOINTS
 # ============================================================================
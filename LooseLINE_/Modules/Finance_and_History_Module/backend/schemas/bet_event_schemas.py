@@ -0,0 +1,30 @@
+"""
+Pydantic схемы для приёма событий ставок из модуля Betting.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, Field
+
+
+class BetEvent(BaseModel):
+    """Событие из outbox модуля Betting."""
+    id: int = Field(..., description="ID события в outbox (монотонный)")
+    type: str = Field(..., description="bet.placed | bet.status_changed | bet.settled")
+    aggregate_type: str = Field("bet", description="bet | coupon")
+    aggregate_id: int = Field(..., description="bet_id (coupon_id для aggregate_type=coupon)")
+    occurred_at: datetime
+    payload: Dict[str, Any]
+
+
+class BetEventBatch(BaseModel):
+    """Пачка событий от релея."""
+    events: List[BetEvent] = Field(..., max_length=5000)
+
+
+class BetEventBatchResponse(BaseModel):
+    """Результат применения пачки."""
+    success: bool = True
+    applied: int
+    skipped: int
@@ -58,6 +58,7 @@ class ExportFormat(str, Enum):
     """Форматы экспорта."""
     CSV = "csv"
     PDF = "pdf"
+    PARQUET = "parquet"
 
 
 # ============================================================================
@@ -291,12 +292,19 @@ class Statistics(BaseModel):
 
 
 class Pagination(BaseModel):
-    """Информация о пагинации."""
-    current_page: int
-    total_pages: int
-    total_items: int
+    """Информация о пагинации (курсоры - keyset, offset - для старых клиентов)."""
     items_per_page: int
-    offset: int
+    offset: int = 0
+    current_page: Optional[int] = None
+    total_pages: Optional[int] = None
+    total_items: Optional[int] = None
+    total_is_estimate: bool = False
+    has_more_bets: Optional[bool] = None
+    next_bets_cursor: Optional[str] = None
+    has_more_transactions: Optional[bool] = None
+    next_transactions_cursor: Optional[str] = None
+    has_more: Optional[bool] = None
+    next_cursor: Optional[str] = None
 
 
 class HistoryResponse(BaseModel):
@@ -304,6 +312,7 @@ class HistoryResponse(BaseModel):
     success: bool
     bets: Optional[List[BetInfo]] = None
     transactions: Optional[List[TransactionInfo]] = None
+    timeline: Optional[List[Dict[str, Any]]] = None
     statistics: Optional[Statistics] = None
     pagination: Optional[Pagination] = None
     error: Optional[str] = None
@@ -315,7 +324,7 @@ class HistoryResponse(BaseModel):
 
 class ExportRequest(BaseModel):
     """Запрос на экспорт отчёта."""
-    format: ExportFormat = Field(ExportFormat.CSV, description="Формат экспорта (csv, pdf)")
+    format: ExportFormat = Field(ExportFormat.CSV, description="Формат экспорта (csv, pdf, parquet)")
     date_from: Optional[str] = Field(None, description="Начальная дата (YYYY-MM-DD)")
     date_to: Optional[str] = Field(None, description="Конечная дата (YYYY-MM-DD)")
     include_bets: bool = Field(True, description="Включить ставки")
@@ -340,11 +349,15 @@ class ReportInfo(BaseModel):
     report_id: str
     user_id: str
     format: str
+    status: str = "ready"  # queued, running, ready, failed, expired
     filename: str
-    file_size: str
+    file_size: Optional[str] = None  # Пока отчёт не готов - None
+    status_url: Optional[str] = None
     download_url: str
     expires_at: str
     created_at: str
+    error: Optional[str] = None
+    cached: bool = False  # Отчёт выдан из кэша
     content: Optional[str] = None  # Для CSV
 
 
@@ -0,0 +1,195 @@
+"""
+Запись audit_log: синхронно для движений денег, пачками - для чтений.
+
+Два режима (параметр durable):
+- durable=True - запись добавляется в сессию вызывающего и коммитится вместе
+  с операцией (депозиты, выводы): аудит и деньги в одной транзакции.
+- durable=False - запись ставится в ограниченную очередь процесса, фоновый
+  поток сбрасывает её одним multi-row INSERT каждые audit_flush_interval_ms
+  или по audit_batch_size записей (balance_checked, export_requested).
+
+Backpressure: если очередь полна дольше audit_enqueue_timeout_ms, запись
+пишется синхронно в сессию вызывающего - запрос замедляется, но аудит не
+теряется. Так же, синхронно, пишется всё, пока writer не запущен (скрипты,
+тесты). Запуск и финальный сброс очереди - в lifespan приложения (main.py).
+"""
+
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from config.settings import settings
+
+
+# Сколько раз повторять сброс пачки при ошибке БД, прежде чем записать её в лог
+FLUSH_RETRIES = 3
+
+
+class AuditWriter:
+    """
+    Очередь записей audit_log с фоновым сбросом пачками.
+
+    Attributes:
+        queue_size: ёмкость очереди
+        batch_size: максимум записей в одном INSERT
+        flush_interval: пауза между сбросами, секунды
+        enqueue_timeout: сколько ждать места в полной очереди, секунды
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        queue_size: int = settings.audit_queue_size,
+        batch_size: int = settings.audit_batch_size,
+        flush_interval_ms: int = settings.audit_flush_interval_ms,
+        enqueue_timeout_ms: int = settings.audit_enqueue_timeout_ms
+    ):
+        self._session_factory = session_factory
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # =========================================================================
+    # Запись
+    # =========================================================================
+
+    def log(self, db: Session, entry, durable: bool = False) -> bool:
+        """
+        Записывает строку audit_log.
+
+        Args:
+            db (Session): сессия вызывающего
+            entry: экземпляр модели AuditLog (ещё не добавленный в сессию)
+            durable (bool): True - в транзакции вызывающего, коммитит вызывающий
+
+        Returns:
+            bool: True - запись в очереди; False - добавлена в сессию db
+                  (при durable=False она уже закоммичена)
+        """
+        if not durable and self.running:
+            # Время события, а не сброса пачки
+            if getattr(entry, "created_at", None) is None:
+                entry.created_at = datetime.utcnow()
+            try:
+                self._queue.put(entry, timeout=self.enqueue_timeout)
+                return True
+            except queue.Full:
+                logger.warning("Audit queue is full, writing audit record synchronously")
+
+        db.add(entry)
+        if not durable:
+            db.commit()
+        return False
+
+    # =========================================================================
+    # Фоновый сброс
+    # =========================================================================
+
+    def start(self) -> None:
+        """Запускает фоновый поток сброса (идемпотентно)."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Audit writer started (batch={self.batch_size}, "
+            f"interval={int(self.flush_interval * 1000)}ms, queue={self.queue_size})"
+        )
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Останавливает поток, дописав всё, что осталось в очереди."""
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"Audit writer did not stop in {timeout}s, ~{self._queue.qsize()} records pending")
+            return
+        self._thread = None
+        logger.info(f"Audit writer stopped: written={self.written}, dropped={self.dropped}")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._take_batch(wait=self.flush_interval)
+            if batch:
+                self._flush(batch)
+        # Остановка: дописываем очередь до конца
+        while True:
+            batch = self._take_batch(wait=0)
+            if not batch:
+                break
+            self._flush(batch)
+
+    def _take_batch(self, wait: float) -> List:
+        """Ждёт первую запись не дольше wait и добирает пачку из очереди без ожидания."""
+        try:
+            batch = [self._queue.get(timeout=wait) if wait else self._queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List) -> None:
+        """Один multi-row INSERT на модель; при ошибке - повтор, затем запись в лог."""
+        rows_by_model: Dict[type, List[dict]] = {}
+        for entry in batch:
+            rows_by_model.setdefault(type(entry), []).append(_row(entry))
+
+        for attempt in range(1, FLUSH_RETRIES + 1):
+            db = self._new_session()
+            try:
+                for model, rows in rows_by_model.items():
+                    db.execute(insert(model), rows)
+                db.commit()
+                self.written += len(batch)
+                return
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Audit flush of {len(batch)} records failed (attempt {attempt}): {e}")
+                time.sleep(min(0.1 * attempt, 1.0))
+            finally:
+                db.close()
+
+        self.dropped += len(batch)
+        for rows in rows_by_model.values():
+            for row in rows:
+                logger.error(f"Audit record dropped: {row}")
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from models.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+
+def _row(entry) -> dict:
+    """Заданные колонки экземпляра модели для bulk INSERT (остальные - значения по умолчанию)."""
+    return {
+        column.key: getattr(entry, column.key)
+        for column in entry.__mapper__.column_attrs
+        if getattr(entry, column.key) is not None
+    }
+
+
+audit_writer = AuditWriter()
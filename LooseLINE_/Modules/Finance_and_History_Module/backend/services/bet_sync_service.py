@@ -0,0 +1,136 @@
+"""
+Приём событий ставок из модуля Betting (transactional outbox).
+
+Модуль Betting публикует пачки событий bet.placed / bet.status_changed /
+bet.settled / bet.cashed_out. Доставка at-least-once, поэтому применение идемпотентно:
+ставка ищется по детерминированному uuid, а событие с id не больше уже
+применённого (bets.metadata.outbox_event_id) пропускается - это и дедупликация
+повторов, и защита порядка внутри ставки. События купонов (aggregate_type=coupon,
+coupon.cashed_out) приходят в том же потоке; купонов в finance нет - пропускаются.
+"""
+
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from models.orm_models import Bet
+from services.identity_service import resolve_user_id
+from services.stats_service import StatsDelta, bet_contribution, lock_users
+
+
+# Пространство имён uuid5 для ставок модуля Betting
+BETTING_BET_NAMESPACE = uuid.UUID("6f1c2a52-3b0e-4f5e-9a57-1f3c9b7d0e35")
+
+
+def betting_bet_uuid(bet_id: int) -> str:
+    """Детерминированный uuid ставки finance для bet_id модуля Betting."""
+    return str(uuid.uuid5(BETTING_BET_NAMESPACE, f"betting-bet:{bet_id}"))
+
+
+def _map_status(payload: Dict) -> str:
+    """Статус Betting (open/cancelled/resolved/cashout) -> статус finance."""
+    status = payload.get("status")
+    # open -> pending: WalletService._balance_projection блокирует ставки в pending
+    if status == "cancelled":
+        return "void"
+    if status == "cashout":
+        return "cashout"
+    if status == "resolved":
+        # Исход - только из события (result); без него ставка не рассчитана
+        if payload.get("result") in ("won", "lost"):
+            return payload["result"]
+        logger.warning(f"Bet event without outcome: betting bet {payload.get('bet_id')} stays pending")
+    return "pending"
+
+
+def _parse_dt(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class BetSyncService:
+    """Применение событий ставок к таблице bets модуля finance."""
+
+    @staticmethod
+    def apply_events(db: Session, events: List[Dict]) -> Dict:
+        """
+        Применяет пачку событий одной транзакцией.
+
+        Args:
+            db (Session): SQLAlchemy сессия
+            events (List[Dict]): события {id, type, aggregate_type, aggregate_id, occurred_at, payload}
+
+        Returns:
+            Dict: {"applied": int, "skipped": int}
+        """
+        bet_events = [event for event in events if event.get("aggregate_type", "bet") == "bet"]
+        skipped = len(events) - len(bet_events)
+        events = bet_events
+
+        # Пользователи - до пачки: resolve_user_id сам коммитит созданного
+        # демо пользователя, а ставки и статистика должны уйти одним commit
+        user_ids = {
+            identifier: resolve_user_id(db, identifier)
+            for identifier in {event["payload"]["user_id"] for event in events}
+        }
+        # До чтения ставок: одновременный пересчёт статистики ждёт эту пачку (и наоборот)
+        lock_users(db, user_ids.values())
+
+        applied = 0
+        bets_by_uuid: Dict[str, Bet] = {}
+        stats = StatsDelta()
+
+        for event in sorted(events, key=lambda e: e["id"]):
+            payload = event["payload"]
+            bet_uuid = betting_bet_uuid(event["aggregate_id"])
+
+            bet = bets_by_uuid.get(bet_uuid)
+            if bet is None:
+                bet = db.query(Bet).filter(Bet.uuid == bet_uuid).first()
+
+            metadata = dict(bet.bet_metadata or {}) if bet else {}
+            if bet and metadata.get("outbox_event_id", 0) >= event["id"]:
+                skipped += 1
+                continue
+
+            before = bet_contribution(bet.status, bet.stake, bet.actual_win) if bet else None
+            if bet is None:
+                bet = Bet(
+                    uuid=bet_uuid,
+                    user_id=user_ids[payload["user_id"]],
+                    event_id=str(payload["event_id"]),
+                    placed_at=_parse_dt(payload.get("placed_at")),
+                )
+                db.add(bet)
+
+            bet.event_name = payload.get("event_name")
+            bet.market_type = "1X2"
+            bet.selection = payload.get("expected_result") or payload.get("bet_type")
+            bet.odds = Decimal(str(payload["coefficient"]))
+            bet.stake = Decimal(str(payload["bet_amount"]))
+            bet.potential_win = Decimal(str(payload["potential_win"]))
+            bet.actual_win = Decimal(str(payload["actual_win"])) if payload.get("actual_win") is not None else None
+            bet.status = _map_status(payload)
+            bet.expected_result_date = _parse_dt(payload.get("event_end_date"))
+            if event["type"] == "bet.settled" and bet.status in ("won", "lost"):
+                bet.settled_at = _parse_dt(payload.get("resolved_at")) or _parse_dt(event["occurred_at"])
+
+            metadata.update({
+                "source": "betting",
+                "betting_bet_id": event["aggregate_id"],
+                "outbox_event_id": event["id"],
+            })
+            bet.bet_metadata = metadata
+            bets_by_uuid[bet_uuid] = bet
+            stats.add(bet.user_id, bet.placed_at, before,
+                      bet_contribution(bet.status, bet.stake, bet.actual_win))
+            applied += 1
+
+        # Статистика пользователей - в той же транзакции, что и ставки
+        stats.flush(db)
+        db.commit()
+        logger.info(f"Bet events: applied={applied}, skipped={skipped}")
+        return {"applied": applied, "skipped": skipped}
@@ -0,0 +1,194 @@
+"""
+Сопоставление внешнего идентификатора пользователя с users.id.
+
+Идентификатор приходит из header X-User-ID (wallet API) или из событий
+модуля Betting (bets.user_id) - это username или email.
+
+Сопоставление кэшируется на процесс (IdentityCache): LRU на
+identity_cache_size записей с TTL identity_cache_ttl_seconds. Отсутствие
+пользователя (поиск без создания) кэшируется на identity_negative_ttl_seconds.
+Одновременные промахи по одному идентификатору ходят в БД один раз
+(single-flight): остальные потоки ждут результат первого.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from models.orm_models import User
+
+
+class _Flight:
+    """Загрузка идентификатора, которую ждут остальные потоки."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Optional[int] = None
+        self.error: Optional[BaseException] = None
+
+
+class IdentityCache:
+    """
+    Потокобезопасный LRU-кэш идентификатор -> users.id с TTL.
+
+    Attributes:
+        max_size: максимум записей
+        ttl: время жизни найденного id, секунды
+        negative_ttl: время жизни "пользователя нет", секунды
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.identity_cache_size,
+        ttl: float = settings.identity_cache_ttl_seconds,
+        negative_ttl: float = settings.identity_negative_ttl_seconds,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[Optional[int], float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, bool], _Flight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def resolve(self, db: Session, user_identifier: str, create: bool = True) -> Optional[int]:
+        """
+        Возвращает users.id по username/email.
+
+        Args:
+            db (Session): SQLAlchemy сессия (используется только при промахе)
+            user_identifier (str): username или email
+            create (bool): создать демо пользователя, если его нет
+
+        Returns:
+            Optional[int]: users.id; None - пользователя нет (только при create=False)
+        """
+        with self._lock:
+            found, user_id = self._get(user_identifier)
+            # "Нет пользователя" из кэша не годится, если его нужно создать
+            if found and (user_id is not None or not create):
+                self.hits += 1
+                return user_id
+            self.misses += 1
+            key = (user_identifier, create)
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = _load_user_id(db, user_identifier, create)
+            self.put(user_identifier, flight.value)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def put(self, user_identifier: str, user_id: Optional[int]) -> None:
+        """Кладёт сопоставление в кэш (None - пользователя нет)."""
+        ttl = self.ttl if user_id is not None else self.negative_ttl
+        with self._lock:
+            self._entries[user_identifier] = (user_id, self._clock() + ttl)
+            self._entries.move_to_end(user_identifier)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_identifier: str) -> None:
+        with self._lock:
+            self._entries.pop(user_identifier, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, user_identifier: str) -> Tuple[bool, Optional[int]]:
+        entry = self._entries.get(user_identifier)
+        if entry is None:
+            return False, None
+        user_id, expires_at = entry
+        if expires_at <= self._clock():
+            del self._entries[user_identifier]
+            return False, None
+        self._entries.move_to_end(user_identifier)
+        return True, user_id
+
+
+def _load_user_id(db: Session, user_identifier: str, create: bool) -> Optional[int]:
+    # Пытаемся найти пользователя по username или email
+    row = db.query(User.id).filter(
+        (User.username == user_identifier) | (User.email == user_identifier)
+    ).first()
+
+    if row:
+        return row.id
+    if not create:
+        return None
+
+    # Создаём демо пользователя если не существует
+    result = db.execute(text("""
+        INSERT INTO users (email, username, password_hash, is_active, is_verified)
+        VALUES (:email, :username, :password_hash, :is_active, :is_verified)
+        ON CONFLICT (email) DO UPDATE SET username = EXCLUDED.username
+        RETURNING id
+    """), {
+        "email": f"{user_identifier}@demo.looseline.com",
+        "username": user_identifier,
+        "password_hash": "demo",
+        "is_active": True,
+        "is_verified": True
+    })
+    user_id = result.scalar()
+    db.commit()
+    return user_id
+
+
+identity_cache = IdentityCache()
+
+
+def resolve_user_id(db: Session, user_identifier: str) -> int:
+    """
+    Возвращает users.id по username/email, создавая демо пользователя при отсутствии.
+
+    Args:
+        db (Session): SQLAlchemy сессия
+        user_identifier (str): username или email
+
+    Returns:
+        int: users.id
+    """
+    return identity_cache.resolve(db, user_identifier)
+
+
+def find_user_id(db: Session, user_identifier: str) -> Optional[int]:
+    """
+    Возвращает users.id по username/email или None, если пользователя нет.
+
+    Args:
+        db (Session): SQLAlchemy сессия
+        user_identifier (str): username или email
+
+    Returns:
+        Optional[int]: users.id
+    """
+    return identity_cache.resolve(db, user_identifier, create=False)
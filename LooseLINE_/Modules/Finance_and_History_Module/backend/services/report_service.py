@@ -0,0 +1,703 @@
+"""
+Фоновая генерация отчётов (CSV, PDF, Parquet) в settings.reports_dir.
+
+Запрос создаёт строку report_jobs (status=queued) и сразу возвращает
+report_id. Отчёт строит пул процессов (report_workers): рендеринг PDF не
+занимает event loop и GIL процесса API. Статус ведёт сам воркер:
+queued -> running -> ready | failed. Файл пишется во временный и
+переименовывается - ready всегда означает полный файл.
+
+Готовый отчёт скачивается до expires_at (report_ttl_days), затем фоновая
+очистка (раз в report_cleanup_interval_seconds) удаляет файл и ставит
+status=expired. Запуск пула и очистки - в lifespan приложения (main.py).
+
+Очередь пула живёт только в памяти процесса: после падения воркера или
+рестарта задание остаётся queued/running. Такое задание старше
+report_stale_after_seconds считается потерянным - очистка (в том числе
+сразу при старте) помечает его failed, в лимит незавершённых оно не идёт.
+
+Кэш: у задания есть cache_key - хэш пользователя, параметров, формата и
+"водяного знака" данных периода (WalletService.report_watermark). Повторный
+запрос с тем же ключом получает уже построенный (или строящийся) отчёт.
+Новая ставка или транзакция в периоде меняет водяной знак, а с ним ключ -
+устаревший отчёт больше не находится. Файлы сверх report_cache_max_mb
+вытесняются по давности последнего обращения (LRU).
+
+Parquet - ZIP с файлом на таблицу (bets, transactions, statistics):
+типизированные колонки (суммы - decimal, даты - timestamp), сжатие
+parquet_compression, строки пишутся из курсора группами по
+parquet_row_group_rows.
+
+Пока пул не запущен (скрипты, тесты), отчёт строится синхронно в сессии
+вызывающего.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from sqlalchemy import and_, func, or_, Boolean, Date, DateTime, Float, Integer, Numeric
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from config.settings import settings
+from models.orm_models import ReportJob
+
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+STATUS_EXPIRED = "expired"
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+REPORT_FORMATS = ("csv", "pdf", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "pdf": "application/pdf",
+    "parquet": "application/zip",
+}
+# Parquet - архив из файла на таблицу
+FILE_EXTENSIONS = {
+    "csv": "csv",
+    "pdf": "pdf",
+    "parquet": "parquet.zip",
+}
+
+
+def new_report_id() -> str:
+    return f"RPT_{datetime.utcnow().strftime('%Y%m%d')}_{uuid.uuid4().hex[:8]}"
+
+
+def report_filename(job) -> str:
+    """Имя файла для скачивания."""
+    params = json.loads(job.params or "{}")
+    period = f"{params.get('date_from', '')}_{params.get('date_to', '')}".replace("-", "_")
+    return f"betting_report_{period}.{FILE_EXTENSIONS[job.format]}"
+
+
+def report_cache_key(user_id, format: str, params: Dict, watermark) -> str:
+    """Ключ кэша отчёта: одинаковые параметры на неизменных данных - один ключ."""
+    raw = json.dumps([str(user_id), format, params, watermark], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def report_path(job) -> Path:
+    return Path(settings.reports_dir) / f"{job.report_id}.{FILE_EXTENSIONS[job.format]}"
+
+
+def report_info(job) -> Dict:
+    """Описание задания для API."""
+    return {
+        "report_id": job.report_id,
+        "user_id": str(job.user_id),
+        "format": job.format,
+        "status": job.status,
+        "filename": report_filename(job),
+        "file_size": f"{job.file_size} bytes" if job.file_size is not None else None,
+        "status_url": f"{settings.reports_base_url}/{job.report_id}",
+        "download_url": f"{settings.reports_base_url}/{job.report_id}/download",
+        "expires_at": job.expires_at.isoformat() if job.expires_at else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "error": job.error,
+    }
+
+
+class ReportJobs:
+    """
+    Очередь заданий на отчёты: пул процессов и фоновая очистка.
+
+    Attributes:
+        workers: процессов в пуле
+        ttl: сколько хранится готовый отчёт
+        cleanup_interval: пауза между очистками, секунды
+        max_pending_per_user: незавершённых заданий на пользователя
+        cache_max_bytes: объём готовых отчётов на диске до вытеснения
+        stale_after: сколько задание может быть queued/running
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        workers: int = settings.report_workers,
+        ttl_days: int = settings.report_ttl_days,
+        cleanup_interval_seconds: int = settings.report_cleanup_interval_seconds,
+        max_pending_per_user: int = settings.report_max_pending_per_user,
+        cache_max_mb: int = settings.report_cache_max_mb,
+        stale_after_seconds: int = settings.report_stale_after_seconds
+    ):
+        self._session_factory = session_factory
+        self.workers = workers
+        self.ttl = timedelta(days=ttl_days)
+        self.cleanup_interval = cleanup_interval_seconds
+        self.max_pending_per_user = max_pending_per_user
+        self.cache_max_bytes = cache_max_mb * 1024 * 1024
+        self.stale_after = timedelta(seconds=stale_after_seconds)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._cleaner: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._pool is not None
+
+    # =========================================================================
+    # Задания
+    # =========================================================================
+
+    def submit(
+        self,
+        db: Session,
+        user_id,
+        format: str,
+        date_from: str,
+        date_to: str,
+        include_bets: bool = True,
+        include_transactions: bool = True,
+        include_statistics: bool = True,
+        cache_key: Optional[str] = None
+    ) -> Dict:
+        """
+        Ставит отчёт в очередь.
+
+        Args:
+            db (Session): сессия вызывающего (задание коммитится сразу)
+            user_id: users.id
+            format (str): "csv", "pdf" или "parquet"
+            date_from (str): Начальная дата (YYYY-MM-DD)
+            date_to (str): Конечная дата (YYYY-MM-DD, включительно)
+            cache_key (str): ключ кэша (см. report_cache_key)
+
+        Returns:
+            dict: {"success": True, "report": {...}} (см. report_info)
+        """
+        if format not in REPORT_FORMATS:
+            return {"success": False, "error": "Format must be 'csv', 'pdf' or 'parquet'"}
+
+        pending = db.query(ReportJob).filter(
+            ReportJob.user_id == user_id,
+            self._in_progress(datetime.utcnow())
+        ).count()
+        if pending >= self.max_pending_per_user:
+            return {"success": False, "error": "Too many reports in progress"}
+
+        now = datetime.utcnow()
+        job = ReportJob(
+            report_id=new_report_id(),
+            user_id=user_id,
+            format=format,
+            status=STATUS_QUEUED,
+            params=json.dumps({
+                "date_from": date_from,
+                "date_to": date_to,
+                "include_bets": include_bets,
+                "include_transactions": include_transactions,
+                "include_statistics": include_statistics
+            }),
+            cache_key=cache_key,
+            created_at=now,
+            last_accessed_at=now,
+            expires_at=now + self.ttl
+        )
+        db.add(job)
+        db.commit()
+
+        if not self._dispatch(job.report_id):
+            render_report(db, job.report_id)
+        self.evict(db)
+        db.refresh(job)
+
+        logger.info(f"Report {job.report_id} ({format}) for user {user_id}: {job.status}")
+        return {"success": True, "report": report_info(job)}
+
+    def store(
+        self,
+        db: Session,
+        user_id,
+        format: str,
+        content: str,
+        cache_key: Optional[str] = None,
+        **params
+    ) -> Dict:
+        """
+        Сохраняет уже построенный отчёт (CSV, отданный в ответе) как готовое
+        задание - чтобы по download_url его можно было скачать до expires_at.
+
+        Returns:
+            dict: описание задания (см. report_info)
+        """
+        now = datetime.utcnow()
+        job = ReportJob(
+            report_id=new_report_id(),
+            user_id=user_id,
+            format=format,
+            status=STATUS_READY,
+            params=json.dumps(params),
+            cache_key=cache_key,
+            created_at=now,
+            last_accessed_at=now,
+            started_at=now,
+            finished_at=now,
+            expires_at=now + self.ttl
+        )
+        path = report_path(job)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = content.encode("utf-8")
+        path.write_bytes(data)
+        job.file_path = str(path)
+        job.file_size = len(data)
+        db.add(job)
+        db.commit()
+        self.evict(db)
+        return report_info(job)
+
+    def lookup(self, db: Session, user_id, cache_key: str) -> Optional[ReportJob]:
+        """
+        Отчёт из кэша: готовый или ещё строящийся (не дольше stale_after),
+        с неистёкшим expires_at.
+
+        Returns:
+            Optional[ReportJob]: задание (время обращения обновлено) или None
+        """
+        now = datetime.utcnow()
+        job = db.query(ReportJob).filter(
+            ReportJob.cache_key == cache_key,
+            ReportJob.user_id == user_id,
+            or_(ReportJob.status == STATUS_READY, self._in_progress(now)),
+            ReportJob.expires_at > now
+        ).order_by(ReportJob.created_at.desc()).first()
+        if job is None:
+            return None
+        if job.status == STATUS_READY and not (job.file_path and os.path.exists(job.file_path)):
+            logger.warning(f"Cached report {job.report_id} has no file, expiring it")
+            job.status = STATUS_EXPIRED
+            job.file_path = None
+            db.commit()
+            return None
+        job.last_accessed_at = now
+        db.commit()
+        return job
+
+    def get(self, db: Session, user_id, report_id: str) -> Optional[ReportJob]:
+        """Задание пользователя (чужие не видны)."""
+        return db.query(ReportJob).filter(
+            ReportJob.report_id == report_id,
+            ReportJob.user_id == user_id
+        ).first()
+
+    def _in_progress(self, now: datetime):
+        """Условие: задание queued/running и ещё не потеряно (моложе stale_after)."""
+        return and_(
+            ReportJob.status.in_(ACTIVE_STATUSES),
+            func.coalesce(ReportJob.started_at, ReportJob.created_at) > now - self.stale_after
+        )
+
+    def _dispatch(self, report_id: str) -> bool:
+        """Отдаёт задание пулу; False - пул не запущен или сломан."""
+        with self._lock:
+            if self._pool is None:
+                return False
+            try:
+                try:
+                    future = self._pool.submit(_render_in_worker, report_id)
+                except BrokenProcessPool as e:
+                    # Упавший воркер ломает весь пул - заменяем его новым
+                    logger.error(f"Report pool broken, restarting it: {e}")
+                    self._pool.shutdown(wait=False, cancel_futures=True)
+                    self._pool = self._new_pool()
+                    future = self._pool.submit(_render_in_worker, report_id)
+            except RuntimeError as e:
+                logger.error(f"Report pool unavailable, rendering {report_id} inline: {e}")
+                return False
+            self._futures[report_id] = future
+        future.add_done_callback(lambda done: self._finished(report_id, done))
+        return True
+
+    def _finished(self, report_id: str, future: Future) -> None:
+        """Воркер упал, не записав статус (BrokenProcessPool) - задание failed сразу."""
+        self._futures.pop(report_id, None)
+        if future.cancelled() or future.exception() is None:
+            return
+        logger.error(f"Report {report_id} worker crashed: {future.exception()}")
+        try:
+            with self._new_session() as db:
+                db.query(ReportJob).filter(
+                    ReportJob.report_id == report_id,
+                    ReportJob.status.in_(ACTIVE_STATUSES)
+                ).update({
+                    ReportJob.status: STATUS_FAILED,
+                    ReportJob.error: "Report worker crashed",
+                    ReportJob.finished_at: datetime.utcnow()
+                }, synchronize_session=False)
+                db.commit()
+        except Exception as e:
+            logger.error(f"Cannot mark report {report_id} failed: {e}")
+
+    # =========================================================================
+    # Пул и очистка
+    # =========================================================================
+
+    def start(self) -> None:
+        """Запускает пул процессов и поток очистки (идемпотентно)."""
+        if self.running:
+            return
+        self._pool = self._new_pool()
+        self._stop.clear()
+        self._cleaner = threading.Thread(target=self._cleanup_loop, name="report-cleanup", daemon=True)
+        self._cleaner.start()
+        logger.info(f"Report jobs started (workers={self.workers}, ttl={self.ttl.days}d)")
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn: дочерние процессы не наследуют потоки и соединения с БД родителя
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def stop(self) -> None:
+        """
+        Останавливает пул: начатые отчёты дописываются, не начатые
+        помечаются failed (их можно запросить заново).
+        """
+        if not self.running:
+            return
+        self._stop.set()
+        with self._lock:
+            pool, self._pool = self._pool, None
+            futures = dict(self._futures)
+        pool.shutdown(wait=True, cancel_futures=True)
+        cancelled = [report_id for report_id, future in futures.items() if future.cancelled()]
+        if cancelled:
+            with self._new_session() as db:
+                db.query(ReportJob).filter(
+                    ReportJob.report_id.in_(cancelled),
+                    ReportJob.status == STATUS_QUEUED
+                ).update({
+                    ReportJob.status: STATUS_FAILED,
+                    ReportJob.error: "Interrupted by shutdown",
+                    ReportJob.finished_at: datetime.utcnow()
+                }, synchronize_session=False)
+                db.commit()
+        logger.info(f"Report jobs stopped ({len(cancelled)} queued reports cancelled)")
+
+    def cleanup(self, db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Удаляет файлы отчётов с истёкшим expires_at и помечает их expired;
+        потерянные задания (см. fail_stale) помечает failed.
+
+        Returns:
+            int: количество просроченных заданий
+        """
+        now = now or datetime.utcnow()
+        self.fail_stale(db, now)
+        jobs = db.query(ReportJob).filter(
+            ReportJob.expires_at <= now,
+            ReportJob.status != STATUS_EXPIRED
+        ).all()
+        expired = sum(_expire(job) for job in jobs)
+        db.commit()
+        if expired:
+            logger.info(f"Expired {expired} reports")
+        return expired + self.evict(db)
+
+    def fail_stale(self, db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Помечает failed задания, которые queued/running дольше stale_after:
+        их воркер упал или процесс API перезапущен, статус уже никто не запишет.
+
+        Returns:
+            int: количество потерянных заданий
+        """
+        now = now or datetime.utcnow()
+        stale = db.query(ReportJob).filter(
+            ReportJob.status.in_(ACTIVE_STATUSES),
+            func.coalesce(ReportJob.started_at, ReportJob.created_at) <= now - self.stale_after
+        ).update({
+            ReportJob.status: STATUS_FAILED,
+            ReportJob.error: "Report generation interrupted",
+            ReportJob.finished_at: now
+        }, synchronize_session=False)
+        db.commit()
+        if stale:
+            logger.warning(f"Failed {stale} stale reports (queued/running over {self.stale_after})")
+        return stale
+
+    def evict(self, db: Session) -> int:
+        """
+        Вытесняет готовые отчёты сверх cache_max_bytes, начиная с давно
+        не запрашивавшихся (LRU).
+
+        Returns:
+            int: количество вытесненных отчётов
+        """
+        total = db.query(func.coalesce(func.sum(ReportJob.file_size), 0)).filter(
+            ReportJob.status == STATUS_READY
+        ).scalar()
+        if total <= self.cache_max_bytes:
+            return 0
+
+        evicted = 0
+        jobs = db.query(ReportJob).filter(ReportJob.status == STATUS_READY).order_by(
+            func.coalesce(ReportJob.last_accessed_at, ReportJob.created_at)
+        ).all()
+        for job in jobs:
+            if total <= self.cache_max_bytes:
+                break
+            size = job.file_size or 0
+            if _expire(job):
+                total -= size
+                evicted += 1
+        db.commit()
+        logger.info(f"Evicted {evicted} reports over cache budget ({self.cache_max_bytes} bytes)")
+        return evicted
+
+    def _cleanup_loop(self) -> None:
+        while True:
+            try:
+                with self._new_session() as db:
+                    self.cleanup(db)
+            except Exception as e:
+                logger.error(f"Report cleanup failed: {e}")
+            if self._stop.wait(self.cleanup_interval):
+                return
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from models.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+
+def _expire(job) -> bool:
+    """Удаляет файл отчёта и помечает задание expired (коммитит вызывающий)."""
+    if job.file_path:
+        try:
+            os.remove(job.file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Cannot remove report file {job.file_path}: {e}")
+            return False
+    job.status = STATUS_EXPIRED
+    job.file_path = None
+    return True
+
+
+# =============================================================================
+# Рендеринг (в процессе пула или синхронно)
+# =============================================================================
+
+def _render_in_worker(report_id: str) -> None:
+    from models.database import SessionLocal
+    with SessionLocal() as db:
+        render_report(db, report_id)
+
+
+def render_report(db: Session, report_id: str) -> None:
+    """Строит файл отчёта и переводит задание в ready (или failed)."""
+    job = db.get(ReportJob, report_id)
+    if job is None or job.status != STATUS_QUEUED:
+        return
+    job.status = STATUS_RUNNING
+    job.started_at = datetime.utcnow()
+    db.commit()
+
+    path = report_path(job)
+    tmp_path = path.with_name(path.name + ".part")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_report(db, job, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        db.rollback()
+        tmp_path.unlink(missing_ok=True)
+        logger.error(f"Report {report_id} failed: {e}")
+        job.status = STATUS_FAILED
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        return
+
+    job.status = STATUS_READY
+    job.file_path = str(path)
+    job.file_size = path.stat().st_size
+    job.finished_at = datetime.utcnow()
+    db.commit()
+
+
+def _write_report(db: Session, job, path: Path) -> None:
+    # wallet_service сам ставит задания через report_jobs - импорт здесь, не на уровне модуля
+    from services.wallet_service import WalletService
+
+    params = json.loads(job.params)
+    if job.format == "pdf":
+        write_pdf(
+            path,
+            WalletService.report_title(job.user_id, params["date_from"], params["date_to"]),
+            WalletService.report_sections(db, job.user_id, **params)
+        )
+        return
+    if job.format == "parquet":
+        write_parquet(path, WalletService.report_tables(db, job.user_id, **params))
+        return
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for chunk in WalletService.iter_csv_report(db, job.user_id, **params):
+            f.write(chunk)
+
+
+# =============================================================================
+# PDF
+# =============================================================================
+
+PDF_MARGIN = 36
+PDF_FONT = "Helvetica"
+PDF_FONT_BOLD = "Helvetica-Bold"
+PDF_FONT_SIZE = 7
+PDF_LINE = 10
+
+
+def write_pdf(path: Path, title: List[str], sections: Iterator) -> None:
+    """
+    PDF отчёт (A4 альбомная): заголовок и таблицы секций.
+
+    Строки рисуются сразу на canvas по мере чтения из БД; при переносе
+    на новую страницу заголовок таблицы повторяется.
+
+    Args:
+        path (Path): файл
+        title: строки заголовка отчёта
+        sections: (название, колонки, строки) - см. WalletService.report_sections
+    """
+    width, height = landscape(A4)
+    pdf = canvas.Canvas(str(path), pagesize=(width, height))
+    pdf.setTitle(title[0])
+    y = height - PDF_MARGIN
+
+    def line(cells: list, col_width: float, font: str = PDF_FONT) -> None:
+        nonlocal y
+        if y < PDF_MARGIN:
+            pdf.showPage()
+            y = height - PDF_MARGIN
+        pdf.setFont(font, PDF_FONT_SIZE)
+        for i, cell in enumerate(cells):
+            pdf.drawString(PDF_MARGIN + i * col_width, y, _fit(str(cell), font, col_width - 4))
+        y -= PDF_LINE
+
+    pdf.setFont(PDF_FONT_BOLD, 12)
+    pdf.drawString(PDF_MARGIN, y, title[0])
+    y -= 2 * PDF_LINE
+    for text_line in title[1:]:
+        line([text_line], width)
+    y -= PDF_LINE
+
+    for section_title, columns, rows in sections:
+        col_width = (width - 2 * PDF_MARGIN) / len(columns)
+        written = 0
+        for row in rows:
+            if not written:
+                y -= PDF_LINE
+                line([section_title], width, PDF_FONT_BOLD)
+                line(columns, col_width, PDF_FONT_BOLD)
+            elif y < PDF_MARGIN:
+                line(columns, col_width, PDF_FONT_BOLD)
+            line(row, col_width)
+            written += 1
+
+    pdf.save()
+
+
+def _fit(text: str, font: str, max_width: float) -> str:
+    """Обрезает текст по ширине колонки."""
+    if stringWidth(text, font, PDF_FONT_SIZE) <= max_width:
+        return text
+    while text and stringWidth(text + "...", font, PDF_FONT_SIZE) > max_width:
+        text = text[:-1]
+    return text + "..."
+
+
+# =============================================================================
+# Parquet
+# =============================================================================
+
+def write_parquet(
+    path: Path,
+    tables: Iterator,
+    row_group_rows: Optional[int] = None,
+    compression: Optional[str] = None
+) -> None:
+    """
+    Parquet отчёт: ZIP, в нём файл <таблица>.parquet на каждую таблицу.
+
+    Выборки курсора копятся до row_group_rows строк и пишутся одной группой
+    строк - в памяти не больше одной группы. Архив без сжатия: страницы
+    Parquet уже сжаты (compression).
+
+    Args:
+        path (Path): файл
+        tables: (имя, [(колонка, тип SQLAlchemy)], выборки строк) -
+                см. WalletService.report_tables
+        row_group_rows (int): строк в группе (по умолчанию parquet_row_group_rows)
+        compression (str): кодек Parquet (по умолчанию parquet_compression)
+    """
+    # pyarrow нужен только воркеру, строящему Parquet
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    row_group_rows = row_group_rows or settings.parquet_row_group_rows
+    compression = compression or settings.parquet_compression
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        for name, columns, partitions in tables:
+            schema = pa.schema([(column, _arrow_type(pa, sql_type)) for column, sql_type in columns])
+            with archive.open(f"{name}.parquet", "w", force_zip64=True) as f, \
+                    pq.ParquetWriter(f, schema, compression=compression) as writer:
+                batches = []
+                buffered = 0
+                for rows in partitions:
+                    batches.append(pa.record_batch(
+                        [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                        schema=schema
+                    ))
+                    buffered += len(rows)
+                    if buffered >= row_group_rows:
+                        writer.write_table(pa.Table.from_batches(batches), row_group_size=buffered)
+                        batches = []
+                        buffered = 0
+                if batches:
+                    writer.write_table(pa.Table.from_batches(batches), row_group_size=buffered)
+
+
+def _arrow_type(pa, sql_type):
+    """Тип колонки Arrow по типу SQLAlchemy: деньги - decimal, не float."""
+    if isinstance(sql_type, Float):
+        return pa.float64()
+    if isinstance(sql_type, Numeric):
+        if sql_type.precision:
+            return pa.decimal128(sql_type.precision, sql_type.scale or 0)
+        return pa.float64()
+    if isinstance(sql_type, Integer):
+        return pa.int64()
+    if isinstance(sql_type, Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(sql_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+report_jobs = ReportJobs()
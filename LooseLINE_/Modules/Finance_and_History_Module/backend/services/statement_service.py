@@ -0,0 +1,373 @@
+"""
+Месячные выписки пользователей (monthly_statements).
+
+Генерация за месяц для всех активных пользователей:
+    python -m services.statement_service generate [--month 2025-12] [--workers 4] [--chunk-size 1000]
+(по умолчанию - прошлый месяц).
+
+Пользователи без готовой выписки читаются по возрастанию id пачками по
+chunk_size (keyset, короткий запрос на пачку). Пачка - задача пула
+процессов: транзакции месяца всех пользователей пачки одним потоковым
+запросом (yield_per), по CSV файлу на пользователя, затем одна вставка
+строк monthly_statements (upsert) и commit.
+
+Перезапуск после сбоя продолжает с того же места: пользователи с выпиской
+status=generated пропускаются, упавшая пачка записывается как failed и
+подхватывается следующим запуском. Файл пишется во временный и
+переименовывается - повторная генерация безопасна.
+
+Метрики - в лог после каждой пачки (пользователей и транзакций в секунду,
+оценка оставшегося времени), итог возвращает generate_month().
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import groupby
+from operator import attrgetter
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from config.settings import settings
+from models.orm_models import BalanceTransaction, MonthlyStatement, User
+from services.stats_service import dialect_insert
+
+
+STATUS_GENERATED = "generated"
+STATUS_FAILED = "failed"
+
+# Пачек в очереди пула на процесс: воркеры не простаивают между пачками
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+
+def month_start(value: str) -> date:
+    """'2025-12' -> date(2025, 12, 1)"""
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def next_month(period: date) -> date:
+    return (period.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def statement_path(period: date, user_id) -> Path:
+    """Файл выписки; каталоги по тысячам id - без миллиона файлов в одном каталоге."""
+    return (
+        Path(settings.statements_dir) / period.strftime("%Y-%m") / str(int(user_id) // 1000)
+        / f"statement_{user_id}_{period.strftime('%Y_%m')}.csv"
+    )
+
+
+# =============================================================================
+# Пачка пользователей
+# =============================================================================
+
+def generate_chunk(db: Session, period: date, user_ids: List[int]) -> Dict:
+    """
+    Выписки пачки пользователей за месяц.
+
+    Args:
+        db (Session): SQLAlchemy сессия
+        period (date): первое число месяца
+        user_ids (List[int]): users.id пачки
+
+    Returns:
+        dict: {"users": int, "transactions": int, "failed": int, "seconds": float}
+    """
+    started = time.monotonic()
+    period_start = datetime(period.year, period.month, 1)
+    period_end = datetime.combine(next_month(period), datetime.min.time())
+
+    try:
+        opening = _opening_balances(db, user_ids, period_start)
+        transactions = db.query(BalanceTransaction).filter(
+            BalanceTransaction.user_id.in_(user_ids),
+            BalanceTransaction.created_at >= period_start,
+            BalanceTransaction.created_at < period_end
+        ).order_by(
+            BalanceTransaction.user_id, BalanceTransaction.created_at, BalanceTransaction.transaction_id
+        ).yield_per(settings.export_chunk_rows)
+
+        rows = []
+        total_transactions = 0
+        with_activity = set()
+        for user_id, user_transactions in groupby(transactions, key=attrgetter("user_id")):
+            path, count = _write_statement(period, user_id, opening.get(user_id, Decimal("0")), user_transactions)
+            rows.append(_statement_row(user_id, period, path))
+            total_transactions += count
+            with_activity.add(user_id)
+        # Без движений за месяц - выписка только с балансом
+        for user_id in user_ids:
+            if user_id not in with_activity:
+                path, _ = _write_statement(period, user_id, opening.get(user_id, Decimal("0")), [])
+                rows.append(_statement_row(user_id, period, path))
+
+        _upsert_statements(db, rows)
+        db.commit()
+        return {
+            "users": len(user_ids),
+            "transactions": total_transactions,
+            "failed": 0,
+            "seconds": time.monotonic() - started,
+        }
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Statements {period:%Y-%m} for users {user_ids[0]}..{user_ids[-1]} failed: {e}")
+        try:
+            _upsert_statements(db, [_statement_row(user_id, period, None) for user_id in user_ids])
+            db.commit()
+        except Exception as mark_error:
+            # БД недоступна - пачку без строк failed подхватит следующий запуск
+            db.rollback()
+            logger.error(f"Cannot mark statements {period:%Y-%m} failed: {mark_error}")
+        return {"users": 0, "transactions": 0, "failed": len(user_ids), "seconds": time.monotonic() - started}
+
+
+def _opening_balances(db: Session, user_ids: List[int], before: datetime) -> Dict[int, Decimal]:
+    """
+    Баланс на начало месяца: balance_after последней транзакции до него -
+    в порядке выписки (created_at, transaction_id).
+    """
+    ranked = db.query(
+        BalanceTransaction.user_id,
+        BalanceTransaction.balance_after,
+        func.row_number().over(
+            partition_by=BalanceTransaction.user_id,
+            order_by=(BalanceTransaction.created_at.desc(), BalanceTransaction.transaction_id.desc())
+        ).label("position")
+    ).filter(
+        BalanceTransaction.user_id.in_(user_ids),
+        BalanceTransaction.created_at < before
+    ).subquery()
+
+    rows = db.query(ranked.c.user_id, ranked.c.balance_after).filter(ranked.c.position == 1)
+    return {user_id: balance for user_id, balance in rows}
+
+
+def _write_statement(period: date, user_id, opening: Decimal, transactions: Iterable) -> Tuple[Path, int]:
+    """Пишет CSV выписки; возвращает путь и количество транзакций."""
+    path = statement_path(period, user_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".part")
+
+    totals: Dict[str, Decimal] = defaultdict(Decimal)
+    closing = opening
+    count = 0
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["LOOSELINE Monthly Statement"])
+        writer.writerow([f"User ID: {user_id}"])
+        writer.writerow([f"Period: {period.strftime('%Y-%m')}"])
+        writer.writerow(["Opening Balance", float(opening)])
+        writer.writerow([])
+
+        writer.writerow(["=== TRANSACTIONS ==="])
+        writer.writerow([
+            "Transaction ID", "Type", "Amount", "Balance Before",
+            "Balance After", "Status", "Description", "Created At"
+        ])
+        for trans in transactions:
+            writer.writerow([
+                trans.transaction_id,
+                trans.transaction_type,
+                float(trans.amount),
+                float(trans.balance_before),
+                float(trans.balance_after),
+                trans.status,
+                trans.description or "",
+                trans.created_at.isoformat() if trans.created_at else ""
+            ])
+            if trans.status == "completed":
+                totals[trans.transaction_type] += trans.amount
+            closing = trans.balance_after
+            count += 1
+        writer.writerow([])
+
+        writer.writerow(["=== SUMMARY ==="])
+        writer.writerow(["Transactions", count])
+        writer.writerow(["Total Deposits", float(totals["deposit"])])
+        writer.writerow(["Total Withdrawals", float(totals["withdrawal"])])
+        writer.writerow(["Total Bets", float(totals["bet_placed"])])
+        writer.writerow(["Total Wins", float(totals["bet_won"])])
+        writer.writerow(["Closing Balance", float(closing)])
+
+    os.replace(tmp_path, path)
+    return path, count
+
+
+def _statement_row(user_id, period: date, path: Optional[Path]) -> Dict:
+    return {
+        "user_id": user_id,
+        "period_date": period,
+        "file_path": str(path) if path else None,
+        "status": STATUS_GENERATED if path else STATUS_FAILED,
+        "generated_at": datetime.utcnow(),
+    }
+
+
+def _upsert_statements(db: Session, rows: List[Dict]) -> None:
+    """Одна вставка строк пачки; повторная генерация обновляет строку."""
+    stmt = dialect_insert(db)(MonthlyStatement)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "period_date"],
+        set_={
+            "file_path": stmt.excluded.file_path,
+            "status": stmt.excluded.status,
+            "generated_at": stmt.excluded.generated_at,
+        }
+    )
+    db.execute(stmt, rows)
+
+
+def _generate_chunk_in_worker(period: date, user_ids: List[int]) -> Dict:
+    from models.database import SessionLocal
+    with SessionLocal() as db:
+        return generate_chunk(db, period, user_ids)
+
+
+# =============================================================================
+# Месяц целиком
+# =============================================================================
+
+def _pending_users(period: date):
+    """Активные пользователи без готовой выписки за месяц."""
+    return select(User.id).where(
+        User.is_active.is_(True),
+        ~exists().where(
+            MonthlyStatement.user_id == User.id,
+            MonthlyStatement.period_date == period,
+            MonthlyStatement.status == STATUS_GENERATED
+        )
+    )
+
+
+def _pending_chunks(db: Session, period: date, chunk_size: int) -> Iterator[List[int]]:
+    """Пачки id по возрастанию (keyset): без долгой транзакции на весь запуск."""
+    last_id = 0
+    while True:
+        user_ids = list(db.scalars(
+            _pending_users(period).where(User.id > last_id).order_by(User.id).limit(chunk_size)
+        ))
+        db.commit()
+        if not user_ids:
+            return
+        yield user_ids
+        last_id = user_ids[-1]
+
+
+class _Metrics:
+    """Пропускная способность генерации - в лог после каждой пачки."""
+
+    def __init__(self, period: date, total: int):
+        self.period = period
+        self.total = total
+        self.users = 0
+        self.transactions = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def add(self, result: Dict) -> None:
+        self.users += result["users"]
+        self.transactions += result["transactions"]
+        self.failed += result["failed"]
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        users_per_second = self.users / elapsed
+        remaining = self.total - self.users - self.failed
+        eta = remaining / users_per_second if users_per_second else 0
+        logger.info(
+            f"Statements {self.period:%Y-%m}: {self.users + self.failed}/{self.total} users, "
+            f"{users_per_second:.0f} users/s, {self.transactions / elapsed:.0f} tx/s, "
+            f"failed={self.failed}, ETA {eta:.0f}s"
+        )
+
+    def summary(self) -> Dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "period": self.period.isoformat(),
+            "users": self.users,
+            "transactions": self.transactions,
+            "failed": self.failed,
+            "seconds": round(elapsed, 3),
+            "users_per_second": round(self.users / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def generate_month(
+    period: date,
+    workers: int = settings.statement_workers,
+    chunk_size: int = settings.statement_chunk_size,
+    session_factory: Optional[Callable[[], Session]] = None
+) -> Dict:
+    """
+    Генерирует выписки за месяц всем активным пользователям без готовой выписки.
+
+    Args:
+        period (date): первое число месяца
+        workers (int): процессов в пуле; 0 - пачки в текущем процессе
+        chunk_size (int): пользователей в пачке
+        session_factory: фабрика сессий (по умолчанию SessionLocal; воркеры пула
+                         всегда используют SessionLocal)
+
+    Returns:
+        dict: {"period", "users", "transactions", "failed", "seconds", "users_per_second"}
+    """
+    if session_factory is None:
+        from models.database import SessionLocal
+        session_factory = SessionLocal
+
+    with session_factory() as db:
+        total = db.scalar(select(func.count()).select_from(_pending_users(period).subquery()))
+        db.commit()
+        logger.info(f"Statements {period:%Y-%m}: {total} users to generate (workers={workers}, chunk={chunk_size})")
+        metrics = _Metrics(period, total)
+        chunks = _pending_chunks(db, period, chunk_size)
+
+        if workers <= 0:
+            for user_ids in chunks:
+                with session_factory() as chunk_db:
+                    metrics.add(generate_chunk(chunk_db, period, user_ids))
+            return metrics.summary()
+
+        # spawn: дочерние процессы не наследуют соединения с БД родителя
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            in_flight = set()
+            for user_ids in chunks:
+                if len(in_flight) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        metrics.add(future.result())
+                in_flight.add(pool.submit(_generate_chunk_in_worker, period, user_ids))
+            for future in wait(in_flight).done:
+                metrics.add(future.result())
+
+    return metrics.summary()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m services.statement_service")
+    sub = parser.add_subparsers(dest="command", required=True)
+    generate_parser = sub.add_parser("generate", help="generate monthly statements for all active users")
+    generate_parser.add_argument("--month", help="YYYY-MM (default: previous month)")
+    generate_parser.add_argument("--workers", type=int, default=settings.statement_workers)
+    generate_parser.add_argument("--chunk-size", type=int, default=settings.statement_chunk_size)
+    args = parser.parse_args(argv)
+
+    period = month_start(args.month) if args.month else (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+    summary = generate_month(period, workers=args.workers, chunk_size=args.chunk_size)
+    logger.info(f"Statements done: {summary}")
+    if summary["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Статистика ставок пользователя (таблица user_bet_stats).
+
+Строки - по пользователю и периоду: all (за всё время), month и day по дате
+placed_at. Учитываются рассчитанные ставки (won/lost): количество, выигрыши,
+проигрыши, сумма ставок, сумма выплат.
+
+Поддержка инкрементальная: применяя события ставок, BetSyncService копит
+изменения в StatsDelta (вклад ставки до и после события) и в той же
+транзакции прибавляет их одним upsert на пачку. Чтение статистики - одна
+строка (all) или несколько строк day за период.
+
+Пересчёт из bets (после ручных правок, сбоев, на новой реплике):
+    python -m services.stats_service rebuild [--workers 4] [--chunk-size 1000]
+Пользователи делятся на пачки, каждая пересчитывается в своём потоке и своей
+транзакции: DELETE строк пачки + INSERT ... SELECT с GROUP BY.
+
+Пересчёт можно запускать на живой базе: оба пути записи (дельты BetSyncService
+и пересчёт пачки) сначала берут advisory lock пользователей (lock_users), так
+что дельта попадает либо в пересчёт, либо после него - не теряется и не
+удваивается.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, literal, select, case, distinct, text
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from models.orm_models import Bet, UserBetStats
+
+
+SETTLED_STATUSES = ("won", "lost")
+ALL_TIME = date(1970, 1, 1)
+PERIOD_TYPES = ("all", "month", "day")
+
+# Пространство advisory locks статистики: pg_advisory_xact_lock(STATS_LOCK_NAMESPACE, user_id)
+STATS_LOCK_NAMESPACE = 4501
+
+# (bets_settled, wins, losses, total_stake, total_won)
+Contribution = Tuple[int, int, int, Decimal, Decimal]
+NO_CONTRIBUTION: Contribution = (0, 0, 0, Decimal("0"), Decimal("0"))
+
+
+def bet_contribution(status: Optional[str], stake, actual_win) -> Optional[Contribution]:
+    """Вклад ставки в статистику; None - ставка не рассчитана."""
+    if status not in SETTLED_STATUSES:
+        return None
+    won = status == "won"
+    return (
+        1,
+        1 if won else 0,
+        0 if won else 1,
+        Decimal(str(stake or 0)),
+        Decimal(str(actual_win or 0)) if won else Decimal("0"),
+    )
+
+
+def period_keys(placed_at: Optional[datetime]) -> List[Tuple[str, date]]:
+    """Периоды, в которые попадает ставка."""
+    keys = [("all", ALL_TIME)]
+    if placed_at is not None:
+        day = placed_at.date()
+        keys += [("month", day.replace(day=1)), ("day", day)]
+    return keys
+
+
+class StatsDelta:
+    """Накопленные изменения user_bet_stats в рамках одной транзакции."""
+
+    def __init__(self):
+        self._rows: Dict[Tuple[int, str, date], List] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._rows)
+
+    def add(self, user_id: int, placed_at: Optional[datetime],
+            before: Optional[Contribution], after: Optional[Contribution]) -> None:
+        """
+        Учитывает смену вклада ставки (before -> after).
+
+        Args:
+            user_id (int): users.id
+            placed_at (datetime): время ставки (определяет day/month)
+            before: вклад до изменения (None - не учитывалась)
+            after: вклад после изменения (None - больше не учитывается)
+        """
+        if before == after:
+            return
+        diff = [a - b for a, b in zip(after or NO_CONTRIBUTION, before or NO_CONTRIBUTION)]
+        for period_type, period_start in period_keys(placed_at):
+            row = self._rows.setdefault((user_id, period_type, period_start), list(NO_CONTRIBUTION))
+            for i, value in enumerate(diff):
+                row[i] += value
+
+    def flush(self, db: Session) -> int:
+        """
+        Прибавляет накопленное к user_bet_stats одним upsert (в транзакции db).
+
+        Returns:
+            int: количество затронутых строк статистики
+        """
+        rows = [
+            {
+                "user_id": user_id,
+                "period_type": period_type,
+                "period_start": period_start,
+                "bets_settled": d[0],
+                "wins": d[1],
+                "losses": d[2],
+                "total_stake": d[3],
+                "total_won": d[4],
+                "updated_at": datetime.utcnow(),
+            }
+            for (user_id, period_type, period_start), d in self._rows.items()
+            if any(d)
+        ]
+        self._rows.clear()
+        if not rows:
+            return 0
+
+        stmt = dialect_insert(db)(UserBetStats)
+        table = UserBetStats.__table__
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "period_type", "period_start"],
+            set_={
+                column: table.c[column] + getattr(stmt.excluded, column)
+                for column in ("bets_settled", "wins", "losses", "total_stake", "total_won")
+            } | {"updated_at": stmt.excluded.updated_at}
+        )
+        db.execute(stmt, rows)
+        return len(rows)
+
+
+def lock_users(db: Session, user_ids) -> None:
+    """
+    Блокирует статистику пользователей до конца транзакции (PostgreSQL advisory lock).
+
+    Порядок - по возрастанию id: без взаимных блокировок (deadlock) между пачками.
+    На SQLite (тесты) ничего не делает: запись там и так последовательная.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids or db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(text("""
+        SELECT pg_advisory_xact_lock(:namespace, id)
+        FROM (SELECT unnest(CAST(:ids AS integer[])) AS id ORDER BY id) AS ordered
+    """), {"namespace": STATS_LOCK_NAMESPACE, "ids": user_ids})
+
+
+def dialect_insert(db: Session):
+    """INSERT с ON CONFLICT для диалекта сессии (PostgreSQL; SQLite - в тестах)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    return upsert
+
+
+# =============================================================================
+# Пересчёт из bets
+# =============================================================================
+
+def _period_start_expr(dialect: str, period_type: str):
+    if period_type == "all":
+        return literal(ALL_TIME)
+    if dialect == "postgresql":
+        if period_type == "month":
+            return func.date_trunc("month", Bet.placed_at).cast(UserBetStats.period_start.type)
+        return Bet.placed_at.cast(UserBetStats.period_start.type)
+    if period_type == "month":
+        return func.strftime("%Y-%m-01", Bet.placed_at)
+    return func.date(Bet.placed_at)
+
+
+def rebuild_users(db: Session, user_ids: List[int]) -> None:
+    """Пересчитывает статистику пачки пользователей в одной транзакции."""
+    dialect = db.get_bind().dialect.name
+    # До DELETE: INSERT ... SELECT увидит все дельты, закоммиченные до блокировки
+    lock_users(db, user_ids)
+    db.execute(delete(UserBetStats).where(UserBetStats.user_id.in_(user_ids)))
+    for period_type in PERIOD_TYPES:
+        period_start = _period_start_expr(dialect, period_type)
+        query = select(
+            Bet.user_id,
+            literal(period_type),
+            period_start,
+            func.count(),
+            func.count(case((Bet.status == "won", 1))),
+            func.count(case((Bet.status == "lost", 1))),
+            func.coalesce(func.sum(Bet.stake), 0),
+            func.coalesce(func.sum(case((Bet.status == "won", Bet.actual_win))), 0),
+            literal(datetime.utcnow()),
+        ).where(
+            Bet.user_id.in_(user_ids),
+            Bet.status.in_(SETTLED_STATUSES),
+        )
+        if period_type == "all":
+            query = query.group_by(Bet.user_id)
+        else:
+            query = query.where(Bet.placed_at.isnot(None)).group_by(Bet.user_id, period_start)
+        db.execute(insert(UserBetStats).from_select(
+            ["user_id", "period_type", "period_start", "bets_settled", "wins", "losses",
+             "total_stake", "total_won", "updated_at"],
+            query
+        ))
+    db.commit()
+
+
+def rebuild(
+    session_factory: Callable[[], Session],
+    user_ids: Optional[List[int]] = None,
+    workers: int = 4,
+    chunk_size: int = 1000
+) -> int:
+    """
+    Пересчитывает user_bet_stats из bets параллельными пачками пользователей.
+
+    Args:
+        session_factory: фабрика сессий (своя сессия на пачку)
+        user_ids: только эти пользователи (по умолчанию - все, у кого есть ставки)
+        workers (int): потоков
+        chunk_size (int): пользователей в пачке
+
+    Returns:
+        int: количество пересчитанных пользователей
+    """
+    with session_factory() as db:
+        if user_ids is None:
+            user_ids = list(db.scalars(
+                select(distinct(Bet.user_id)).where(Bet.status.in_(SETTLED_STATUSES)).order_by(Bet.user_id)
+            ))
+            # Строки пользователей, у которых рассчитанных ставок больше нет
+            db.execute(delete(UserBetStats).where(UserBetStats.user_id.not_in(
+                select(Bet.user_id).where(Bet.status.in_(SETTLED_STATUSES))
+            )))
+            db.commit()
+
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+    def run(chunk: List[int]) -> int:
+        with session_factory() as db:
+            rebuild_users(db, chunk)
+        return len(chunk)
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for count in pool.map(run, chunks):
+            done += count
+            logger.info(f"User bet stats rebuilt: {done}/{len(user_ids)} users")
+    return done
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m services.stats_service")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = sub.add_parser("rebuild", help="recompute user_bet_stats from bets")
+    rebuild_parser.add_argument("--workers", type=int, default=4)
+    rebuild_parser.add_argument("--chunk-size", type=int, default=1000)
+    rebuild_parser.add_argument("--user", type=int, action="append", dest="user_ids", help="only this users.id")
+    args = parser.parse_args(argv)
+
+    from models.database import SessionLocal
+    rebuild(SessionLocal, args.user_ids, workers=args.workers, chunk_size=args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
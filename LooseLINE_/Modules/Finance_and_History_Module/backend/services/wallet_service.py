@@ -10,26 +10,63 @@
 """
 
 import os
+import base64
 import csv
 import io
 import json
 import uuid
 from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import Dict, Optional, List, Any
+from types import SimpleNamespace
+from typing import Dict, Iterator, Optional, List, Any, Tuple
 
-from sqlalchemy import func, and_, desc, Integer, case
+from sqlalchemy import func, and_, or_, desc, Integer, case, select, literal, Float, String
 from sqlalchemy.orm import Session
 from loguru import logger
 
 from models.orm_models import (
     User, UserBalance, BalanceTransaction, WalletOperation,
-    PaymentMethod, WithdrawalMethod, Bet, AuditLog
+    PaymentMethod, WithdrawalMethod, Bet, AuditLog, UserBetStats
 )
 from services.stripe_service import StripeService
+from services.audit_service import audit_writer
+from services.report_service import report_jobs, report_cache_key, report_info, REPORT_FORMATS
+from services.identity_service import find_user_id
+from services.stats_service import ALL_TIME
 from config.settings import settings
 
 
+# История: COUNT для режима count="estimate" не дальше стольких строк
+HISTORY_COUNT_CAP = 10000
+
+# Порядок ставок и транзакций с одинаковым временем в общей ленте
+TIMELINE_BET = 1
+TIMELINE_TRANSACTION = 0
+
+
+def encode_cursor(ts: Optional[datetime], row_id: int, rank: int = TIMELINE_BET) -> str:
+    """Непрозрачный курсор истории: позиция последней строки страницы."""
+    raw = json.dumps([ts.isoformat() if ts else None, rank, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """
+    Курсор -> (ts, rank, id); None - первая страница.
+    
+    Raises:
+        ValueError: курсор повреждён
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, rank, row_id = json.loads(raw)
+        return (datetime.fromisoformat(ts) if ts else datetime.min), int(rank), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
 class WalletService:
     """
     Сервис для работы с кошельком пользователя.
@@ -95,13 +132,15 @@ class WalletService:
             2180.0
         
         Database Queries:
-            1. SELECT * FROM users WHERE id = ?
-            2. SELECT * FROM users_balance WHERE user_id = ?
-            3. SELECT COUNT(*) FROM bets WHERE user_id = ? AND result = 'win'
-            4. SELECT COUNT(*) FROM bets WHERE user_id = ? AND result = 'loss'
-            5. SELECT SUM(amount) FROM wallet_operations WHERE status = 'pending'
-            6. SELECT SUM(bet_amount) FROM bets WHERE status = 'open'
-        
+            1. SELECT users.id по username/email - только если user_id не число
+               и его нет в кэше идентификаторов (identity_service)
+            2. Один SELECT: users LEFT JOIN users_balance LEFT JOIN
+               user_bet_stats (выигрыши/проигрыши) + коррелированные подзапросы
+               (pending депозиты/выводы, сумма открытых ставок) - см.
+               _balance_projection()
+            3. INSERT users_balance - только если записи баланса ещё нет
+            4. INSERT audit_log (balance_checked) - через очередь audit_writer
+
         Business Logic:
             - net_profit = total_won - total_lost
             - roi_percent = (total_won / total_bet) * 100 если total_bet > 0
@@ -109,29 +148,25 @@ class WalletService:
             - available = balance - locked_in_bets
         """
         try:
-            # 1. Проверяем существует ли пользователь
-            if user_id_int:
-                user = db.query(User).filter(User.id == user_id_int).first()
-            else:
-                user = db.query(User).filter(
-                    (User.username == user_id) | (User.email == user_id)
-                ).first()
-            
-            if not user:
+            # 1. username/email -> users.id (через кэш идентификаторов)
+            if user_id_int is None:
+                user_id_int = find_user_id(db, user_id)
+
+            # 2. Пользователь, баланс и все агрегаты - за один запрос
+            row = None
+            if user_id_int is not None:
+                row = db.execute(WalletService._balance_projection(user_id_int)).first()
+
+            if not row:
                 return {
                     "success": False,
                     "error": "User not found",
                     "user_id": user_id
                 }
-            
-            user_id_int = user.id  # Используем числовой ID пользователя
-            
-            # 2. Получаем баланс пользователя
-            balance = db.query(UserBalance).filter(
-                UserBalance.user_id == user_id_int
-            ).first()
 
-            if not balance:
+            # 3. Получаем баланс пользователя
+            balance = row
+            if row.balance_user_id is None:
                 # Создаём запись баланса если её нет
                 balance = UserBalance(
                     user_id=user_id_int,
@@ -141,42 +176,19 @@ class WalletService:
                 db.add(balance)
                 db.commit()
                 db.refresh(balance)
-            
-            # 3. Получаем количество выигрышей и проигрышей
-            win_count = db.query(func.count(Bet.id)).filter(
-                and_(Bet.user_id == user_id_int, Bet.status == 'won')
-            ).scalar() or 0
 
-            lose_count = db.query(func.count(Bet.id)).filter(
-                and_(Bet.user_id == user_id_int, Bet.status == 'lost')
-            ).scalar() or 0
-            
+            # 4. Количество выигрышей и проигрышей
+            win_count = row.win_count or 0
+            lose_count = row.lose_count or 0
+
             total_bets_count = win_count + lose_count
             win_rate = (win_count / total_bets_count * 100) if total_bets_count > 0 else 0.0
-            
-            # 4. Получаем pending депозиты
-            pending_deposits = db.query(func.sum(WalletOperation.amount)).filter(
-                and_(
-                    WalletOperation.user_id == user_id_int,
-                    WalletOperation.operation_type == 'deposit',
-                    WalletOperation.status == 'pending'
-                )
-            ).scalar() or Decimal("0.00")
-            
-            # 5. Получаем pending выводы
-            pending_withdrawals = db.query(func.sum(WalletOperation.amount)).filter(
-                and_(
-                    WalletOperation.user_id == user_id_int,
-                    WalletOperation.operation_type == 'withdrawal',
-                    WalletOperation.status == 'pending'
-                )
-            ).scalar() or Decimal("0.00")
-            
-            # 6. Получаем locked_in_bets (деньги в открытых ставках)
-            locked_in_bets = db.query(func.sum(Bet.stake)).filter(
-                and_(Bet.user_id == user_id_int, Bet.status == 'pending')
-            ).scalar() or Decimal("0.00")
-            
+
+            # 5-6. pending депозиты/выводы и деньги в открытых ставках
+            pending_deposits = row.pending_deposits or Decimal("0.00")
+            pending_withdrawals = row.pending_withdrawals or Decimal("0.00")
+            locked_in_bets = row.locked_in_bets or Decimal("0.00")
+
             # 7. Рассчитываем производные значения
             current_balance = float(balance.balance or 0)
             total_won = float(balance.total_won or 0)
@@ -193,8 +205,7 @@ class WalletService:
                 action="balance_checked",
                 status="success"
             )
-            db.add(audit_log)
-            db.commit()
+            audit_writer.log(db, audit_log)
             
             # 9. Возвращаем результат
             return {
@@ -225,7 +236,7 @@ class WalletService:
                     "lose_count": lose_count,
                     "win_rate": round(win_rate, 2),
                     "last_transaction": balance.last_transaction.isoformat() if balance.last_transaction else None,
-                    "account_created": user.created_at.isoformat() if user.created_at else None
+                    "account_created": row.account_created.isoformat() if row.account_created else None
                 },
                 "available_balance": round(available_balance, 2),
                 "locked_in_bets": float(locked_in_bets),
@@ -241,6 +252,63 @@ class WalletService:
                 "details": str(e)
             }
 
+    @staticmethod
+    def _balance_projection(user_id: int):
+        """
+        SELECT для get_balance: строка пользователя с балансом и агрегатами.
+
+        Выигрыши/проигрыши - строка 'all' из user_bet_stats, остальные
+        агрегаты - коррелированные скалярные подзапросы по индексам
+        (user_id, status) ставок и (user_id, operation_type) pending-операций,
+        поэтому вся проекция - один round trip к БД.
+
+        Args:
+            user_id (int): users.id
+
+        Returns:
+            Select: колонки user_id, account_created, balance_user_id, поля
+            users_balance, win_count, lose_count, pending_deposits,
+            pending_withdrawals, locked_in_bets
+        """
+        def bets(*conditions):
+            return and_(Bet.user_id == User.id, *conditions)
+
+        def pending(operation_type):
+            return select(func.sum(WalletOperation.amount)).where(and_(
+                WalletOperation.user_id == User.id,
+                WalletOperation.operation_type == operation_type,
+                WalletOperation.status == 'pending'
+            )).scalar_subquery()
+
+        return (
+            select(
+                User.id.label("user_id"),
+                User.created_at.label("account_created"),
+                UserBalance.user_id.label("balance_user_id"),
+                UserBalance.balance,
+                UserBalance.currency,
+                UserBalance.total_deposited,
+                UserBalance.total_withdrawn,
+                UserBalance.total_bet,
+                UserBalance.total_won,
+                UserBalance.total_lost,
+                UserBalance.last_transaction,
+                UserBetStats.wins.label("win_count"),
+                UserBetStats.losses.label("lose_count"),
+                pending('deposit').label("pending_deposits"),
+                pending('withdrawal').label("pending_withdrawals"),
+                select(func.sum(Bet.stake)).where(bets(Bet.status == 'pending'))
+                .scalar_subquery().label("locked_in_bets"),
+            )
+            .outerjoin(UserBalance, UserBalance.user_id == User.id)
+            .outerjoin(UserBetStats, and_(
+                UserBetStats.user_id == User.id,
+                UserBetStats.period_type == 'all',
+                UserBetStats.period_start == ALL_TIME
+            ))
+            .where(User.id == user_id)
+        )
+
     # =========================================================================
     # МЕТОД 2: replenish_balance()
     # =========================================================================
@@ -359,7 +427,7 @@ class WalletService:
                 ip_address=ip_address,
                 status="pending"
             )
-            db.add(audit_log)
+            audit_writer.log(db, audit_log, durable=True)
             db.commit()
             
             # 6. ЕСЛИ НОВАЯ КАРТА: создаём Payment Intent
@@ -432,7 +500,7 @@ class WalletService:
                         status="failed",
                         details=json.dumps(details_data) if details_data else None
                     )
-                    db.add(audit_log)
+                    audit_writer.log(db, audit_log, durable=True)
                     db.commit()
                     
                     return {
@@ -514,7 +582,7 @@ class WalletService:
                     ip_address=ip_address,
                     status="success"
                 )
-                db.add(audit_log)
+                audit_writer.log(db, audit_log, durable=True)
                 
                 db.commit()
                 
@@ -667,7 +735,7 @@ class WalletService:
                 ip_address=ip_address,
                 status="pending"
             )
-            db.add(audit_log)
+            audit_writer.log(db, audit_log, durable=True)
             
             # 8. ВЫЧИТАЕМ ДЕНЬГИ ИЗ БАЛАНСА (СРАЗУ)
             balance_after = current_balance - amount
@@ -736,16 +804,31 @@ class WalletService:
         user_id: str,
         limit: int = 50,
         offset: int = 0,
-        filters: Optional[Dict] = None
+        filters: Optional[Dict] = None,
+        bets_cursor: Optional[str] = None,
+        transactions_cursor: Optional[str] = None,
+        timeline: bool = False,
+        cursor: Optional[str] = None,
+        count: str = "estimate"
     ) -> Dict:
         """
         Получает историю ставок и транзакций пользователя с фильтрацией и пагинацией.
         
+        Пагинация keyset: ставки упорядочены по (placed_at, id), транзакции -
+        по (created_at, transaction_id), по убыванию. Курсор следующей страницы
+        (next_bets_cursor / next_transactions_cursor) - позиция последней
+        строки, поэтому глубокая страница стоит столько же, сколько первая.
+        Списки листаются независимо. offset поддерживается для старых
+        клиентов и применяется, только если курсор не передан.
+        
+        В режиме timeline ставки и транзакции сливаются в одну ленту по
+        времени с общим курсором (cursor / next_cursor).
+        
         Args:
             db (Session): SQLAlchemy сессия
             user_id (str): ID пользователя
             limit (int): Количество результатов (1-100, по умолчанию 50)
-            offset (int): Смещение для пагинации
+            offset (int): Смещение (устаревшее, без курсора)
             filters (dict): Фильтры (опционально)
                 {
                     "status": "open/resolved/cancelled",
@@ -754,159 +837,128 @@ class WalletService:
                     "date_to": "2025-12-15",
                     "transaction_type": "deposit/bet_placed/bet_won"
                 }
+            bets_cursor (str): курсор страницы ставок
+            transactions_cursor (str): курсор страницы транзакций
+            timeline (bool): общая лента ставок и транзакций
+            cursor (str): курсор страницы ленты (timeline=True)
+            count (str): подсчёт total_items ставок:
+                "exact" - COUNT(*), "estimate" - COUNT не дальше
+                HISTORY_COUNT_CAP строк (total_is_estimate=True, если упёрлись),
+                "none" - без подсчёта
         
         Returns:
             dict: {
                 "success": True,
                 "bets": [...],
                 "transactions": [...],
-                "statistics": {...},
+                "timeline": [...],        # только timeline=True
+                "statistics": {...},      # только на первой странице
                 "pagination": {...}
             }
         """
         try:
-            # 1. Валидация limit/offset
+            # 1. Валидация limit/offset/курсоров
             limit = min(max(limit, 1), 100)
             offset = max(offset, 0)
+            try:
+                bets_after = decode_cursor(bets_cursor)
+                trans_after = decode_cursor(transactions_cursor)
+                timeline_after = decode_cursor(cursor)
+            except ValueError:
+                return {
+                    "success": False,
+                    "error": "Invalid cursor"
+                }
             
             filters = filters or {}
             
-            # 2. Строим запрос для ставок
-            bets_query = db.query(Bet).filter(Bet.user_id == user_id)
-            
-            if filters.get('status'):
-                bets_query = bets_query.filter(Bet.status == filters['status'])
+            # 2. Строим запросы (фильтры без пагинации)
+            bets_query = WalletService._history_bets_query(db, user_id, filters)
+            trans_query = WalletService._history_transactions_query(db, user_id, filters)
             
-            if filters.get('result'):
-                bets_query = bets_query.filter(Bet.result == filters['result'])
+            pagination: Dict[str, Any] = {
+                "items_per_page": limit,
+                "offset": offset
+            }
+            first_page = offset == 0 and not (bets_after or trans_after or timeline_after)
             
-            if filters.get('date_from'):
-                bets_query = bets_query.filter(
-                    Bet.placed_at >= datetime.fromisoformat(filters['date_from'])
+            if timeline:
+                # 3a. Общая лента: по limit+1 с каждой стороны после курсора и слияние
+                bets_rows = WalletService._keyset_page(
+                    bets_query, Bet.placed_at, Bet.id, timeline_after, TIMELINE_BET, limit
                 )
-            
-            if filters.get('date_to'):
-                bets_query = bets_query.filter(
-                    Bet.placed_at <= datetime.fromisoformat(filters['date_to'])
+                trans_rows = WalletService._keyset_page(
+                    trans_query, BalanceTransaction.created_at, BalanceTransaction.transaction_id,
+                    timeline_after, TIMELINE_TRANSACTION, limit
                 )
-            
-            # Получаем общее количество для пагинации
-            total_bets = bets_query.count()
-            
-            # Получаем ставки с пагинацией
-            bets_rows = bets_query.order_by(desc(Bet.placed_at)).offset(offset).limit(limit).all()
-            
-            # 3. Строим запрос для транзакций
-            trans_query = db.query(BalanceTransaction).filter(
-                BalanceTransaction.user_id == user_id
-            )
-            
-            if filters.get('transaction_type'):
-                trans_query = trans_query.filter(
-                    BalanceTransaction.transaction_type == filters['transaction_type']
+                entries = sorted(
+                    [(b.placed_at, TIMELINE_BET, b.id, b) for b in bets_rows] +
+                    [(t.created_at, TIMELINE_TRANSACTION, t.transaction_id, t) for t in trans_rows],
+                    key=lambda e: (e[0] or datetime.min, e[1], e[2]),
+                    reverse=True
                 )
-            
-            if filters.get('date_from'):
-                trans_query = trans_query.filter(
-                    BalanceTransaction.created_at >= datetime.fromisoformat(filters['date_from'])
+                page = entries[:limit]
+                bets_rows = [e[3] for e in page if e[1] == TIMELINE_BET]
+                trans_rows = [e[3] for e in page if e[1] == TIMELINE_TRANSACTION]
+                last = page[-1] if len(entries) > limit else None
+                pagination["has_more"] = last is not None
+                pagination["next_cursor"] = encode_cursor(last[0], last[2], last[1]) if last else None
+            else:
+                # 3b. Независимые страницы ставок и транзакций
+                bets_rows = WalletService._keyset_page(
+                    bets_query, Bet.placed_at, Bet.id, bets_after, TIMELINE_BET, limit,
+                    offset=0 if bets_after else offset
                 )
-            
-            if filters.get('date_to'):
-                trans_query = trans_query.filter(
-                    BalanceTransaction.created_at <= datetime.fromisoformat(filters['date_to'])
+                trans_rows = WalletService._keyset_page(
+                    trans_query, BalanceTransaction.created_at, BalanceTransaction.transaction_id,
+                    trans_after, TIMELINE_TRANSACTION, limit,
+                    offset=0 if trans_after else offset
                 )
-            
-            trans_rows = trans_query.order_by(
-                desc(BalanceTransaction.created_at)
-            ).offset(offset).limit(limit).all()
-            
-            # 4. Рассчитываем статистику
-            stats = db.query(
-                func.count(Bet.id).label('total'),
-                func.sum(
-                    func.cast(Bet.status == 'won', Integer)
-                ).label('wins'),
-                func.sum(
-                    func.cast(Bet.status == 'lost', Integer)
-                ).label('losses'),
-                func.sum(Bet.stake).label('total_bet'),
-                func.sum(
-                    case(
-                        (Bet.status == 'won', Bet.actual_win),
-                        else_=Decimal("0")
-                    )
-                ).label('total_won')
-            ).filter(
-                and_(Bet.user_id == user_id, Bet.status.in_(['won', 'lost']))
-            ).first()
-
-            # 5. Форматируем результаты
-            bets = []
-            for bet in bets_rows:
-                bets.append({
-                    "bet_id": bet.id,
-                    "event_id": bet.event_id,
-                    "event_name": bet.event_name,
-                    "odds_id": getattr(bet, 'odds_id', None),
-                    "bet_type": getattr(bet, 'bet_type', 'single'),
-                    "bet_amount": float(bet.stake),
-                    "coefficient": float(bet.odds),
-                    "potential_win": float(bet.potential_win),
-                    "status": bet.status,
-                    "result": bet.status if bet.status in ['won', 'lost'] else None,
-                    "actual_win": float(bet.actual_win) if bet.actual_win else None,
-                    "placed_at": bet.placed_at.isoformat() if bet.placed_at else None,
-                    "resolved_at": bet.settled_at.isoformat() if bet.settled_at else None,
-                    "expected_result_date": bet.expected_result_date.isoformat() if bet.expected_result_date else None
+                has_more_bets = len(bets_rows) > limit
+                has_more_trans = len(trans_rows) > limit
+                bets_rows = bets_rows[:limit]
+                trans_rows = trans_rows[:limit]
+                pagination.update({
+                    "has_more_bets": has_more_bets,
+                    "next_bets_cursor": encode_cursor(
+                        bets_rows[-1].placed_at, bets_rows[-1].id
+                    ) if has_more_bets else None,
+                    "has_more_transactions": has_more_trans,
+                    "next_transactions_cursor": encode_cursor(
+                        trans_rows[-1].created_at, trans_rows[-1].transaction_id, TIMELINE_TRANSACTION
+                    ) if has_more_trans else None
                 })
             
-            transactions = []
-            for trans in trans_rows:
-                transactions.append({
-                    "transaction_id": trans.transaction_id,
-                    "type": trans.transaction_type,
-                    "amount": float(trans.amount),
-                    "balance_before": float(trans.balance_before),
-                    "balance_after": float(trans.balance_after),
-                    "status": trans.status,
-                    "description": trans.description,
-                    "created_at": trans.created_at.isoformat() if trans.created_at else None
+            # 4. Количество ставок - по запросу
+            if count != "none":
+                total_bets, is_estimate = WalletService._count_history(bets_query, count)
+                pagination.update({
+                    "current_page": (offset // limit) + 1,
+                    "total_pages": (total_bets + limit - 1) // limit,
+                    "total_items": total_bets,
+                    "total_is_estimate": is_estimate
                 })
             
-            # 6. Рассчитываем статистику
-            total = stats.total or 0
-            wins = stats.wins or 0
-            losses = stats.losses or 0
-            total_bet_amount = float(stats.total_bet or 0)
-            total_won_amount = float(stats.total_won or 0)
+            # 5. Статистика по рассчитанным ставкам - только на первой странице
+            statistics = WalletService._history_statistics(db, user_id) if first_page else None
             
-            win_rate = (wins / (wins + losses) * 100) if (wins + losses) > 0 else 0
-            net_profit = total_won_amount - total_bet_amount
-            roi_percent = (total_won_amount / total_bet_amount * 100) if total_bet_amount > 0 else 0
+            # 6. Форматируем результаты
+            bets = [WalletService._bet_history_item(bet) for bet in bets_rows]
+            transactions = [WalletService._transaction_history_item(trans) for trans in trans_rows]
             
             # 7. Возвращаем результат
-            return {
+            result = {
                 "success": True,
                 "bets": bets,
                 "transactions": transactions,
-                "statistics": {
-                    "total_bets": total,
-                    "total_wins": wins,
-                    "total_losses": losses,
-                    "win_rate": round(win_rate, 2),
-                    "total_amount_bet": total_bet_amount,
-                    "total_amount_won": total_won_amount,
-                    "net_profit": round(net_profit, 2),
-                    "roi_percent": round(roi_percent, 2)
-                },
-                "pagination": {
-                    "current_page": (offset // limit) + 1,
-                    "total_pages": (total_bets + limit - 1) // limit,
-                    "total_items": total_bets,
-                    "items_per_page": limit,
-                    "offset": offset
-                }
+                "statistics": statistics,
+                "pagination": pagination
             }
+            if timeline:
+                items = {id(b): dict(kind="bet", **item) for b, item in zip(bets_rows, bets)}
+                items.update({id(t): dict(kind="transaction", **item) for t, item in zip(trans_rows, transactions)})
+                result["timeline"] = [items[id(e[3])] for e in page]
+            return result
         
         except Exception as e:
             logger.error(f"Error in get_bet_history for user {user_id}: {str(e)}")
@@ -916,6 +968,186 @@ class WalletService:
                 "details": str(e)
             }
 
+    @staticmethod
+    def _history_bets_query(db: Session, user_id: str, filters: Dict):
+        """Ставки пользователя с фильтрами истории (без сортировки и пагинации)."""
+        bets_query = db.query(Bet).filter(Bet.user_id == user_id)
+        
+        if filters.get('status'):
+            bets_query = bets_query.filter(Bet.status == filters['status'])
+        
+        if filters.get('result'):
+            bets_query = bets_query.filter(Bet.result == filters['result'])
+        
+        if filters.get('date_from'):
+            bets_query = bets_query.filter(
+                Bet.placed_at >= datetime.fromisoformat(filters['date_from'])
+            )
+        
+        if filters.get('date_to'):
+            bets_query = bets_query.filter(
+                Bet.placed_at <= datetime.fromisoformat(filters['date_to'])
+            )
+        return bets_query
+
+    @staticmethod
+    def _history_transactions_query(db: Session, user_id: str, filters: Dict):
+        """Транзакции пользователя с фильтрами истории (без сортировки и пагинации)."""
+        trans_query = db.query(BalanceTransaction).filter(
+            BalanceTransaction.user_id == user_id
+        )
+        
+        if filters.get('transaction_type'):
+            trans_query = trans_query.filter(
+                BalanceTransaction.transaction_type == filters['transaction_type']
+            )
+        
+        if filters.get('date_from'):
+            trans_query = trans_query.filter(
+                BalanceTransaction.created_at >= datetime.fromisoformat(filters['date_from'])
+            )
+        
+        if filters.get('date_to'):
+            trans_query = trans_query.filter(
+                BalanceTransaction.created_at <= datetime.fromisoformat(filters['date_to'])
+            )
+        return trans_query
+
+    @staticmethod
+    def _keyset_page(query, ts_column, id_column, after, rank: int, limit: int, offset: int = 0) -> list:
+        """
+        limit+1 строк по убыванию (ts, id) после курсора after = (ts, rank, id).
+        
+        rank различает ставки и транзакции в общей ленте: при равном времени
+        ставки идут раньше транзакций. Лишняя строка показывает, есть ли
+        следующая страница.
+        """
+        if after is not None:
+            after_ts, after_rank, after_id = after
+            if rank == after_rank:
+                query = query.filter(or_(
+                    ts_column < after_ts,
+                    and_(ts_column == after_ts, id_column < after_id)
+                ))
+            elif rank < after_rank:
+                query = query.filter(ts_column <= after_ts)
+            else:
+                query = query.filter(ts_column < after_ts)
+        query = query.order_by(desc(ts_column), desc(id_column))
+        if offset:
+            query = query.offset(offset)
+        return query.limit(limit + 1).all()
+
+    @staticmethod
+    def _count_history(query, mode: str):
+        """
+        Количество строк запроса истории.
+        
+        Returns:
+            tuple: (количество, True если это нижняя оценка HISTORY_COUNT_CAP)
+        """
+        if mode == "exact":
+            return query.order_by(None).count(), False
+        capped = query.order_by(None).with_entities(literal(1)).limit(HISTORY_COUNT_CAP + 1).subquery()
+        total = query.session.query(func.count()).select_from(capped).scalar() or 0
+        if total > HISTORY_COUNT_CAP:
+            return HISTORY_COUNT_CAP, True
+        return total, False
+
+    @staticmethod
+    def _history_statistics(db: Session, user_id: str) -> Dict:
+        """Статистика по рассчитанным (won/lost) ставкам пользователя - строка 'all' user_bet_stats."""
+        stats = db.query(
+            UserBetStats.bets_settled.label('total'),
+            UserBetStats.wins.label('wins'),
+            UserBetStats.losses.label('losses'),
+            UserBetStats.total_stake.label('total_bet'),
+            UserBetStats.total_won.label('total_won')
+        ).filter(
+            UserBetStats.user_id == user_id,
+            UserBetStats.period_type == 'all',
+            UserBetStats.period_start == ALL_TIME
+        ).first() or WalletService._empty_statistics()
+        
+        total = stats.total or 0
+        wins = stats.wins or 0
+        losses = stats.losses or 0
+        total_bet_amount = float(stats.total_bet or 0)
+        total_won_amount = float(stats.total_won or 0)
+        
+        win_rate = (wins / (wins + losses) * 100) if (wins + losses) > 0 else 0
+        net_profit = total_won_amount - total_bet_amount
+        roi_percent = (total_won_amount / total_bet_amount * 100) if total_bet_amount > 0 else 0
+        
+        return {
+            "total_bets": total,
+            "total_wins": wins,
+            "total_losses": losses,
+            "win_rate": round(win_rate, 2),
+            "total_amount_bet": total_bet_amount,
+            "total_amount_won": total_won_amount,
+            "net_profit": round(net_profit, 2),
+            "roi_percent": round(roi_percent, 2)
+        }
+
+    @staticmethod
+    def _period_statistics(db: Session, user_id: str, date_from, date_to):
+        """
+        Статистика ставок, сделанных в [date_from, date_to): сумма строк 'day' user_bet_stats.
+        
+        Returns:
+            Row: total, wins, losses, total_bet, total_won
+        """
+        return db.query(
+            func.coalesce(func.sum(UserBetStats.bets_settled), 0).label('total'),
+            func.coalesce(func.sum(UserBetStats.wins), 0).label('wins'),
+            func.coalesce(func.sum(UserBetStats.losses), 0).label('losses'),
+            func.coalesce(func.sum(UserBetStats.total_stake), 0).label('total_bet'),
+            func.coalesce(func.sum(UserBetStats.total_won), 0).label('total_won')
+        ).filter(
+            UserBetStats.user_id == user_id,
+            UserBetStats.period_type == 'day',
+            UserBetStats.period_start >= date_from,
+            UserBetStats.period_start < date_to
+        ).first()
+
+    @staticmethod
+    def _empty_statistics():
+        """Строка статистики пользователя без рассчитанных ставок."""
+        return SimpleNamespace(total=0, wins=0, losses=0, total_bet=0, total_won=0)
+
+    @staticmethod
+    def _bet_history_item(bet) -> Dict:
+        return {
+            "bet_id": bet.id,
+            "event_id": bet.event_id,
+            "event_name": bet.event_name,
+            "odds_id": getattr(bet, 'odds_id', None),
+            "bet_type": getattr(bet, 'bet_type', 'single'),
+            "bet_amount": float(bet.stake),
+            "coefficient": float(bet.odds),
+            "potential_win": float(bet.potential_win),
+            "status": bet.status,
+            "result": bet.status if bet.status in ['won', 'lost'] else None,
+            "actual_win": float(bet.actual_win) if bet.actual_win else None,
+            "placed_at": bet.placed_at.isoformat() if bet.placed_at else None,
+            "resolved_at": bet.settled_at.isoformat() if bet.settled_at else None,
+            "expected_result_date": bet.expected_result_date.isoformat() if bet.expected_result_date else None
+        }
+
+    @staticmethod
+    def _transaction_history_item(trans) -> Dict:
+        return {
+            "transaction_id": trans.transaction_id,
+            "type": trans.transaction_type,
+            "amount": float(trans.amount),
+            "balance_before": float(trans.balance_before),
+            "balance_after": float(trans.balance_after),
+            "status": trans.status,
+            "description": trans.description,
+            "created_at": trans.created_at.isoformat() if trans.created_at else None
+        }
+
     # =========================================================================
     # МЕТОД 5: export_report()
     # =========================================================================
@@ -929,131 +1161,92 @@ class WalletService:
         include_bets: bool = True,
         include_transactions: bool = True,
         include_statistics: bool = True,
-        ip_address: Optional[str] = None
+        ip_address: Optional[str] = None,
+        background: bool = False
     ) -> Dict:
         """
-        Экспортирует отчёт в CSV или PDF.
+        Экспортирует отчёт в CSV, PDF или Parquet.
+        
+        PDF и Parquet (и CSV при background=True) строятся заданием в пуле
+        процессов: в ответе status=queued, готовность - по status_url.
         
         Args:
             db (Session): SQLAlchemy сессия
             user_id (str): ID пользователя
-            format (str): "csv" или "pdf"
+            format (str): "csv", "pdf" или "parquet"
             date_from (str): Начальная дата (YYYY-MM-DD)
             date_to (str): Конечная дата (YYYY-MM-DD)
             include_bets (bool): Включить ставки
             include_transactions (bool): Включить транзакции
             include_statistics (bool): Включить статистику
             ip_address (str): IP адрес клиента
+            background (bool): строить и CSV заданием, без content в ответе
         
         Returns:
             dict: {
                 "success": True,
                 "report": {
-                    "report_id": "RPT_20251215_123456",
-                    "filename": "betting_report_2025_12_15.csv",
+                    "report_id": "RPT_20251215_1a2b3c4d",
+                    "filename": "betting_report_2025_12_01_2025_12_15.csv",
                     "format": "csv",
-                    "file_size": "45 KB",
+                    "status": "ready",  # PDF: queued, пока строится
+                    "file_size": "45000 bytes",
+                    "status_url": "...",
                     "download_url": "...",
-                    "expires_at": "2025-12-22T10:30:00Z",
+                    "expires_at": "2025-12-22T10:30:00",
                     "content": "..." (для CSV)
                 }
             }
         """
         try:
             # 1. Валидация параметров
-            if format not in ["csv", "pdf"]:
-                return {"success": False, "error": "Format must be 'csv' or 'pdf'"}
+            if format not in REPORT_FORMATS:
+                return {"success": False, "error": "Format must be 'csv', 'pdf' or 'parquet'"}
             
-            # Установки даты по умолчанию
-            if not date_to:
-                date_to = datetime.utcnow().date().isoformat()
+            date_from, date_to = WalletService._export_range(date_from, date_to)
             
-            if not date_from:
-                date_from = (datetime.utcnow().date() - timedelta(days=30)).isoformat()
-            
-            date_from_dt = datetime.fromisoformat(date_from)
-            date_to_dt = datetime.fromisoformat(date_to) + timedelta(days=1)  # Включаем конечную дату
-            
-            # 2. Получаем данные для экспорта
-            report_data: Dict[str, Any] = {
-                "bets": [],
-                "transactions": [],
-                "statistics": {}
+            params = {
+                "date_from": date_from,
+                "date_to": date_to,
+                "include_bets": include_bets,
+                "include_transactions": include_transactions,
+                "include_statistics": include_statistics
             }
             
-            # ПОЛУЧАЕМ СТАВКИ
-            if include_bets:
-                bets = db.query(Bet).filter(
-                    and_(
-                        Bet.user_id == user_id,
-                        Bet.placed_at >= date_from_dt,
-                        Bet.placed_at < date_to_dt
-                    )
-                ).order_by(desc(Bet.placed_at)).all()
-                
-                report_data["bets"] = bets
-            
-            # ПОЛУЧАЕМ ТРАНЗАКЦИИ
-            if include_transactions:
-                transactions = db.query(BalanceTransaction).filter(
-                    and_(
-                        BalanceTransaction.user_id == user_id,
-                        BalanceTransaction.created_at >= date_from_dt,
-                        BalanceTransaction.created_at < date_to_dt
-                    )
-                ).order_by(desc(BalanceTransaction.created_at)).all()
-                
-                report_data["transactions"] = transactions
-            
-            # ПОЛУЧАЕМ СТАТИСТИКУ
-            if include_statistics:
-                stats = db.query(
-                    func.count(Bet.bet_id).label('total'),
-                    func.sum(
-                        func.cast(Bet.result == 'win', Integer)
-                    ).label('wins'),
-                    func.sum(
-                        func.cast(Bet.result == 'loss', Integer)
-                    ).label('losses'),
-                    func.sum(Bet.bet_amount).label('total_bet'),
-                    func.sum(
-                        case(
-                            (Bet.result == 'win', Bet.actual_win),
-                            else_=Decimal("0")
-                        )
-                    ).label('total_won')
-                ).filter(
-                    and_(
-                        Bet.user_id == user_id,
-                        Bet.status == 'resolved',
-                        Bet.placed_at >= date_from_dt,
-                        Bet.placed_at < date_to_dt
-                    )
-                ).first()
-                
-                report_data["statistics"] = stats
-            
-            # 3. Генерируем отчёт
-            report_id = f"RPT_{datetime.utcnow().strftime('%Y%m%d')}_{uuid.uuid4().hex[:8]}"
-            
-            if format == "csv":
-                csv_content = WalletService._generate_csv_report(
-                    user_id, date_from, date_to, report_data,
-                    include_bets, include_transactions, include_statistics
-                )
-                filename = f"betting_report_{datetime.utcnow().strftime('%Y_%m_%d')}.csv"
-                file_size = f"{len(csv_content)} bytes"
-            else:  # PDF
-                csv_content = None
-                filename = f"betting_report_{datetime.utcnow().strftime('%Y_%m_%d')}.pdf"
-                file_size = "~200 KB"
+            # 2. Тот же отчёт на тех же данных - из кэша
+            cache_key = report_cache_key(
+                user_id, format, params, WalletService.report_watermark(db, user_id, **params)
+            )
+            cached = report_jobs.lookup(db, user_id, cache_key)
+            if cached is not None and format == "csv" and not background and cached.status != "ready":
+                # Синхронному CSV нужен content: строящееся фоновое задание не ждём
+                cached = None
+            
+            # 3. Генерируем отчёт: CSV - сразу (и сохраняем файл для download_url),
+            #    PDF и Parquet - заданием в пуле процессов (services/report_service.py)
+            if cached is not None:
+                report = report_info(cached)
+                report["cached"] = True
+                if format == "csv" and not background:
+                    with open(cached.file_path, encoding="utf-8", newline="") as f:
+                        report["content"] = f.read()
+            elif format == "csv" and not background:
+                csv_content = "".join(WalletService.iter_csv_report(db, user_id, **params))
+                report = report_jobs.store(db, user_id, "csv", csv_content, cache_key=cache_key, **params)
+                report["content"] = csv_content
+            else:
+                submitted = report_jobs.submit(db, user_id, format, cache_key=cache_key, **params)
+                if not submitted["success"]:
+                    return submitted
+                report = submitted["report"]
             
-            # 4. Логируем запрос экспорта
+            # 4. Логируем запрос экспорта (и из кэша - это выдача данных пользователю)
             details_data = {
                 "format": format,
-                "report_id": report_id,
+                "report_id": report["report_id"],
                 "date_from": date_from,
-                "date_to": date_to
+                "date_to": date_to,
+                "cached": cached is not None
             }
             # Сериализуем в JSON для совместимости (работает и с JSONB и с Text)
             audit_log = AuditLog(
@@ -1063,32 +1256,12 @@ class WalletService:
                 status="success",
                 details=json.dumps(details_data) if details_data else None
             )
-            db.add(audit_log)
-            db.commit()
+            audit_writer.log(db, audit_log)
             
-            logger.info(f"Generated report {report_id} for user {user_id} in format {format}")
+            logger.info(f"Report {report['report_id']} for user {user_id} in format {format}: {report['status']}")
             
             # 5. Возвращаем результат
-            expires_at = (datetime.utcnow() + timedelta(days=7)).isoformat()
-            
-            result = {
-                "success": True,
-                "report": {
-                    "report_id": report_id,
-                    "user_id": user_id,
-                    "format": format,
-                    "filename": filename,
-                    "file_size": file_size,
-                    "download_url": f"{settings.reports_base_url}/{report_id}",
-                    "expires_at": expires_at,
-                    "created_at": datetime.utcnow().isoformat()
-                }
-            }
-            
-            if format == "csv" and csv_content:
-                result["report"]["content"] = csv_content
-            
-            return result
+            return {"success": True, "report": report}
         
         except Exception as e:
             logger.error(f"Error in export_report for user {user_id}: {str(e)}")
@@ -1099,61 +1272,140 @@ class WalletService:
             }
 
     @staticmethod
-    def _generate_csv_report(
+    def prepare_csv_export(
+        db: Session,
+        user_id: str,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        ip_address: Optional[str] = None
+    ) -> Dict:
+        """
+        Проверяет параметры потокового CSV экспорта и логирует запрос.
+        
+        Сам отчёт отдаёт iter_csv_report() - уже после того, как ответ начат,
+        поэтому всё, что может завершиться ошибкой клиента, проверяется здесь.
+        
+        Returns:
+            dict: {
+                "success": True,
+                "report_id": "RPT_20251215_1a2b3c4d",
+                "filename": "betting_report_2025_12_01_2025_12_15.csv",
+                "date_from": "2025-12-01",
+                "date_to": "2025-12-15"
+            }
+        """
+        try:
+            date_from, date_to = WalletService._export_range(date_from, date_to)
+        except ValueError:
+            return {"success": False, "error": "Dates must be YYYY-MM-DD"}
+        
+        report_id = f"RPT_{datetime.utcnow().strftime('%Y%m%d')}_{uuid.uuid4().hex[:8]}"
+        audit_writer.log(db, AuditLog(
+            user_id=user_id,
+            action="export_requested",
+            ip_address=ip_address,
+            status="success",
+            details=json.dumps({
+                "format": "csv_stream",
+                "report_id": report_id,
+                "date_from": date_from,
+                "date_to": date_to
+            })
+        ))
+        
+        return {
+            "success": True,
+            "report_id": report_id,
+            "filename": f"betting_report_{date_from.replace('-', '_')}_{date_to.replace('-', '_')}.csv",
+            "date_from": date_from,
+            "date_to": date_to
+        }
+
+    @staticmethod
+    def _export_range(date_from: Optional[str], date_to: Optional[str]):
+        """
+        Период экспорта: по умолчанию - последние 30 дней.
+        
+        Raises:
+            ValueError: дата не в формате YYYY-MM-DD
+        """
+        if not date_to:
+            date_to = datetime.utcnow().date().isoformat()
+        if not date_from:
+            date_from = (datetime.utcnow().date() - timedelta(days=30)).isoformat()
+        datetime.fromisoformat(date_from)
+        datetime.fromisoformat(date_to)
+        return date_from, date_to
+
+    @staticmethod
+    def report_sections(
+        db: Session,
         user_id: str,
         date_from: str,
         date_to: str,
-        report_data: Dict,
-        include_bets: bool,
-        include_transactions: bool,
-        include_statistics: bool
-    ) -> str:
-        """Генерирует CSV содержимое отчёта."""
-        output = io.StringIO()
-        writer = csv.writer(output)
+        include_bets: bool = True,
+        include_transactions: bool = True,
+        include_statistics: bool = True,
+        chunk_rows: int = settings.export_chunk_rows
+    ) -> Iterator[Tuple[str, List[str], Iterator[list]]]:
+        """
+        Секции отчёта (BETS, TRANSACTIONS, STATISTICS): заголовок, колонки и строки.
         
-        # Заголовок
-        writer.writerow(["LOOSELINE Betting Report"])
-        writer.writerow([f"User ID: {user_id}"])
-        writer.writerow([f"Export Date: {datetime.utcnow().isoformat()}"])
-        writer.writerow([f"Period: {date_from} to {date_to}"])
-        writer.writerow([])
+        Строки ставок и транзакций - ленивые, читаются курсором на стороне
+        сервера (yield_per) выборками по chunk_rows. Общий источник для CSV и PDF.
+        
+        Args:
+            date_from (str): Начальная дата (YYYY-MM-DD)
+            date_to (str): Конечная дата (YYYY-MM-DD, включительно)
+        """
+        date_from_dt = datetime.fromisoformat(date_from)
+        date_to_dt = datetime.fromisoformat(date_to) + timedelta(days=1)  # Включаем конечную дату
         
         # СТАВКИ
-        if include_bets and report_data.get("bets"):
-            writer.writerow(["=== BETS ==="])
-            writer.writerow([
+        if include_bets:
+            bets = db.query(Bet).filter(
+                and_(
+                    Bet.user_id == user_id,
+                    Bet.placed_at >= date_from_dt,
+                    Bet.placed_at < date_to_dt
+                )
+            ).order_by(desc(Bet.placed_at)).yield_per(chunk_rows)
+            
+            yield "BETS", [
                 "Bet ID", "Event ID", "Bet Amount", "Coefficient",
                 "Potential Win", "Status", "Result", "Actual Win",
                 "Placed At", "Resolved At"
-            ])
-            
-            for bet in report_data["bets"]:
-                writer.writerow([
-                    bet.bet_id,
+            ], (
+                [
+                    bet.id,
                     bet.event_id,
-                    float(bet.bet_amount),
-                    float(bet.coefficient),
+                    float(bet.stake),
+                    float(bet.odds),
                     float(bet.potential_win),
                     bet.status,
-                    bet.result or "",
+                    bet.status if bet.status in ['won', 'lost'] else "",
                     float(bet.actual_win) if bet.actual_win else "",
                     bet.placed_at.isoformat() if bet.placed_at else "",
-                    bet.resolved_at.isoformat() if bet.resolved_at else ""
-                ])
-            
-            writer.writerow([])
+                    bet.settled_at.isoformat() if bet.settled_at else ""
+                ]
+                for bet in bets
+            )
         
         # ТРАНЗАКЦИИ
-        if include_transactions and report_data.get("transactions"):
-            writer.writerow(["=== TRANSACTIONS ==="])
-            writer.writerow([
+        if include_transactions:
+            transactions = db.query(BalanceTransaction).filter(
+                and_(
+                    BalanceTransaction.user_id == user_id,
+                    BalanceTransaction.created_at >= date_from_dt,
+                    BalanceTransaction.created_at < date_to_dt
+                )
+            ).order_by(desc(BalanceTransaction.created_at)).yield_per(chunk_rows)
+            
+            yield "TRANSACTIONS", [
                 "Transaction ID", "Type", "Amount", "Balance Before",
                 "Balance After", "Status", "Description", "Created At"
-            ])
-            
-            for trans in report_data["transactions"]:
-                writer.writerow([
+            ], (
+                [
                     trans.transaction_id,
                     trans.transaction_type,
                     float(trans.amount),
@@ -1162,32 +1414,205 @@ class WalletService:
                     trans.status,
                     trans.description or "",
                     trans.created_at.isoformat() if trans.created_at else ""
-                ])
-            
-            writer.writerow([])
-        
-        # СТАТИСТИКА
-        if include_statistics and report_data.get("statistics"):
-            stats = report_data["statistics"]
-            writer.writerow(["=== STATISTICS ==="])
-            writer.writerow(["Metric", "Value"])
-            writer.writerow(["Total Bets", stats.total or 0])
-            writer.writerow(["Wins", stats.wins or 0])
-            writer.writerow(["Losses", stats.losses or 0])
-            writer.writerow(["Total Bet Amount", float(stats.total_bet or 0)])
-            writer.writerow(["Total Won", float(stats.total_won or 0)])
-            
+                ]
+                for trans in transactions
+            )
+        
+        # СТАТИСТИКА (дневные строки user_bet_stats за период)
+        if include_statistics:
+            stats = WalletService._period_statistics(
+                db, user_id, date_from_dt.date(), date_to_dt.date()
+            )
             total_bet = float(stats.total_bet or 0)
             total_won = float(stats.total_won or 0)
             wins = stats.wins or 0
             losses = stats.losses or 0
             
+            rows = [
+                ["Total Bets", stats.total or 0],
+                ["Wins", wins],
+                ["Losses", losses],
+                ["Total Bet Amount", total_bet],
+                ["Total Won", total_won],
+            ]
             if wins + losses > 0:
-                writer.writerow(["Win Rate %", round(wins / (wins + losses) * 100, 2)])
+                rows.append(["Win Rate %", round(wins / (wins + losses) * 100, 2)])
             if total_bet > 0:
-                writer.writerow(["ROI %", round(total_won / total_bet * 100, 2)])
-            writer.writerow(["Net Profit", round(total_won - total_bet, 2)])
+                rows.append(["ROI %", round(total_won / total_bet * 100, 2)])
+            rows.append(["Net Profit", round(total_won - total_bet, 2)])
+            
+            yield "STATISTICS", ["Metric", "Value"], iter(rows)
+
+    @staticmethod
+    def report_tables(
+        db: Session,
+        user_id: str,
+        date_from: str,
+        date_to: str,
+        include_bets: bool = True,
+        include_transactions: bool = True,
+        include_statistics: bool = True,
+        chunk_rows: int = settings.export_chunk_rows
+    ) -> Iterator[Tuple[str, List[Tuple[str, Any]], Iterator[list]]]:
+        """
+        Таблицы отчёта для колоночного формата (Parquet): имя, колонки
+        (имя и тип SQLAlchemy) и строки выборками по chunk_rows.
+        
+        В отличие от report_sections значения не приводятся к float и строкам:
+        суммы остаются Decimal, даты - datetime. Выборки идут прямо из
+        курсора на стороне сервера (yield_per).
+        
+        Args:
+            date_from (str): Начальная дата (YYYY-MM-DD)
+            date_to (str): Конечная дата (YYYY-MM-DD, включительно)
+        """
+        date_from_dt = datetime.fromisoformat(date_from)
+        date_to_dt = datetime.fromisoformat(date_to) + timedelta(days=1)  # Включаем конечную дату
+        
+        def table(stmt):
+            stmt = stmt.execution_options(yield_per=chunk_rows)
+            columns = [(column.name, column.type) for column in stmt.selected_columns]
+            return columns, db.execute(stmt).partitions()
         
-        return output.getvalue()
+        # СТАВКИ
+        if include_bets:
+            yield ("bets", *table(
+                select(
+                    Bet.id.label("bet_id"), Bet.event_id, Bet.event_name,
+                    Bet.stake.label("bet_amount"), Bet.odds.label("coefficient"),
+                    Bet.potential_win, Bet.status, Bet.actual_win,
+                    Bet.placed_at, Bet.settled_at
+                ).where(
+                    Bet.user_id == user_id,
+                    Bet.placed_at >= date_from_dt,
+                    Bet.placed_at < date_to_dt
+                ).order_by(desc(Bet.placed_at))
+            ))
+        
+        # ТРАНЗАКЦИИ
+        if include_transactions:
+            yield ("transactions", *table(
+                select(
+                    BalanceTransaction.transaction_id, BalanceTransaction.transaction_type,
+                    BalanceTransaction.amount, BalanceTransaction.balance_before,
+                    BalanceTransaction.balance_after, BalanceTransaction.status,
+                    BalanceTransaction.description, BalanceTransaction.created_at
+                ).where(
+                    BalanceTransaction.user_id == user_id,
+                    BalanceTransaction.created_at >= date_from_dt,
+                    BalanceTransaction.created_at < date_to_dt
+                ).order_by(desc(BalanceTransaction.created_at))
+            ))
+        
+        # СТАТИСТИКА - те же строки, что в CSV
+        if include_statistics:
+            for _, _, rows in WalletService.report_sections(
+                db, user_id, date_from, date_to,
+                include_bets=False, include_transactions=False, include_statistics=True
+            ):
+                yield "statistics", [("metric", String()), ("value", Float())], iter([list(rows)])
 
+    @staticmethod
+    def report_watermark(
+        db: Session,
+        user_id: str,
+        date_from: str,
+        date_to: str,
+        include_bets: bool = True,
+        include_transactions: bool = True,
+        include_statistics: bool = True
+    ) -> Dict:
+        """
+        "Водяной знак" данных отчёта: меняется, когда в периоде появляется
+        или меняется ставка (updated_at) или появляется транзакция (журнал
+        транзакций только дополняется - хватает количества и последнего id).
+        
+        Returns:
+            dict: {"bets": [count, max_updated_at], "transactions": [count, max_id]}
+        """
+        date_from_dt = datetime.fromisoformat(date_from)
+        date_to_dt = datetime.fromisoformat(date_to) + timedelta(days=1)
+        watermark = {}
+        
+        # Статистика считается по тем же ставкам (user_bet_stats обновляется вместе с ними)
+        if include_bets or include_statistics:
+            row = db.query(func.count(), func.max(Bet.updated_at)).filter(
+                Bet.user_id == user_id,
+                Bet.placed_at >= date_from_dt,
+                Bet.placed_at < date_to_dt
+            ).one()
+            watermark["bets"] = [row[0], row[1]]
+        
+        if include_transactions:
+            row = db.query(func.count(), func.max(BalanceTransaction.transaction_id)).filter(
+                BalanceTransaction.user_id == user_id,
+                BalanceTransaction.created_at >= date_from_dt,
+                BalanceTransaction.created_at < date_to_dt
+            ).one()
+            watermark["transactions"] = [row[0], row[1]]
+        
+        return watermark
+
+    @staticmethod
+    def report_title(user_id: str, date_from: str, date_to: str) -> List[str]:
+        """Строки заголовка отчёта."""
+        return [
+            "LOOSELINE Betting Report",
+            f"User ID: {user_id}",
+            f"Export Date: {datetime.utcnow().isoformat()}",
+            f"Period: {date_from} to {date_to}",
+        ]
 
+    @staticmethod
+    def iter_csv_report(
+        db: Session,
+        user_id: str,
+        date_from: str,
+        date_to: str,
+        include_bets: bool = True,
+        include_transactions: bool = True,
+        include_statistics: bool = True,
+        chunk_rows: int = settings.export_chunk_rows
+    ) -> Iterator[str]:
+        """
+        Генерирует CSV отчёт частями.
+        
+        Текст отдаётся кусками по chunk_rows строк - память не зависит от
+        длины периода (строки читает report_sections()).
+        
+        Args:
+            date_from (str): Начальная дата (YYYY-MM-DD)
+            date_to (str): Конечная дата (YYYY-MM-DD, включительно)
+            chunk_rows (int): строк в одном куске (и в одной выборке курсора)
+        """
+        output = io.StringIO()
+        writer = csv.writer(output)
+        
+        def take() -> str:
+            chunk = output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+            return chunk
+        
+        for line in WalletService.report_title(user_id, date_from, date_to):
+            writer.writerow([line])
+        writer.writerow([])
+        
+        for title, columns, rows in WalletService.report_sections(
+            db, user_id, date_from, date_to,
+            include_bets, include_transactions, include_statistics, chunk_rows
+        ):
+            # Пустая секция не пишется
+            written = 0
+            for row in rows:
+                if not written:
+                    writer.writerow([f"=== {title} ==="])
+                    writer.writerow(columns)
+                writer.writerow(row)
+                written += 1
+                if written % chunk_rows == 0:
+                    yield take()
+            if written and title != "STATISTICS":
+                writer.writerow([])
+        
+        yield take()
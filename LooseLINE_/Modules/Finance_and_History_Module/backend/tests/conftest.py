@@ -5,8 +5,8 @@ Matches real ORM models structure
 import pytest
 from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import create_engine, Column, Integer, String, Numeric, Boolean, DateTime, Text, ForeignKey, BigInteger
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, Column, Integer, String, Numeric, Boolean, Date, DateTime, Text, ForeignKey, BigInteger
+from sqlalchemy.orm import sessionmaker, declarative_base, synonym
 from sqlalchemy.pool import StaticPool
 
 # Create test-specific Base
@@ -115,6 +115,7 @@ class Bet(TestBase):
     bet_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String(20), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     event_id = Column(Integer, nullable=False)
+    event_name = Column(String(255))
     odds_id = Column(Integer)  # Добавлено для совместимости
     bet_type = Column(String(20), default="single")
     bet_amount = Column(Numeric(15, 2), nullable=False)
@@ -127,6 +128,12 @@ class Bet(TestBase):
     resolved_at = Column(DateTime)  # Добавлено для совместимости (вместо settled_at)
     settled_at = Column(DateTime)  # Оставляем для обратной совместимости
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Имена атрибутов production-модели (id, stake, odds)
+    id = synonym("bet_id")
+    stake = synonym("bet_amount")
+    odds = synonym("coefficient")
 
 
 class AuditLog(TestBase):
@@ -142,6 +149,37 @@ class AuditLog(TestBase):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class UserBetStats(TestBase):
+    __tablename__ = "user_bet_stats"
+    user_id = Column(String(20), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    period_type = Column(String(10), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    bets_settled = Column(Integer, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    losses = Column(Integer, default=0, nullable=False)
+    total_stake = Column(Numeric(15, 2), default=Decimal("0.00"), nullable=False)
+    total_won = Column(Numeric(15, 2), default=Decimal("0.00"), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ReportJob(TestBase):
+    __tablename__ = "report_jobs"
+    report_id = Column(String(40), primary_key=True)
+    user_id = Column(String(20), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    format = Column(String(10), nullable=False)
+    status = Column(String(20), default="queued", nullable=False)
+    params = Column(Text)
+    file_path = Column(String(500))
+    file_size = Column(BigInteger)
+    error = Column(Text)
+    cache_key = Column(String(64))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    expires_at = Column(DateTime, nullable=False)
+
+
 # Use SQLite for testing
 TEST_DATABASE_URL = "sqlite:///:memory:"
 
@@ -158,6 +196,13 @@ def engine():
     TestBase.metadata.drop_all(bind=engine)
     engine.dispose()
 
+@pytest.fixture(autouse=True)
+def reports_dir(tmp_path, monkeypatch):
+    """Файлы отчётов - во временный каталог теста"""
+    from config.settings import settings
+    monkeypatch.setattr(settings, "reports_dir", str(tmp_path / "reports"))
+    return tmp_path / "reports"
+
 @pytest.fixture(scope="function")
 def db_session(engine):
     """Create a new database session for each test"""
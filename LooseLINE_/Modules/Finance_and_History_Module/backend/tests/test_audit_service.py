@@ -0,0 +1,71 @@
+"""
+Tests for the batched audit_log writer
+"""
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from services.audit_service import AuditWriter
+from tests.conftest import AuditLog, User
+
+
+@pytest.fixture
+def factory(engine):
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_factory()
+    db.add(User(id="user_1", email="u1@example.com", name="u1", password_hash="hash"))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def _entry(action="balance_checked", **fields):
+    return AuditLog(user_id="user_1", action=action, **fields)
+
+
+class TestAuditWriter:
+    """Tests for AuditWriter"""
+
+    def test_not_running_writes_synchronously(self, factory):
+        writer = AuditWriter(session_factory=factory)
+        db = factory()
+
+        assert writer.log(db, _entry()) is False
+        assert factory().query(AuditLog).count() == 1
+
+    def test_durable_joins_caller_transaction(self, factory):
+        writer = AuditWriter(session_factory=factory)
+        writer.start()
+        try:
+            db = factory()
+            assert writer.log(db, _entry("deposit_initiated"), durable=True) is False
+            # Пока вызывающий не закоммитил - записи нет
+            assert factory().query(AuditLog).count() == 0
+            db.commit()
+            assert factory().query(AuditLog).count() == 1
+        finally:
+            writer.stop()
+
+    def test_queued_records_flushed_in_batches_and_on_stop(self, factory):
+        writer = AuditWriter(session_factory=factory, batch_size=50, flush_interval_ms=10_000)
+        writer.start()
+        db = factory()
+        for i in range(120):
+            assert writer.log(db, _entry(amount=Decimal(i), ip_address="10.0.0.1")) is True
+        writer.stop()
+
+        rows = factory().query(AuditLog).order_by(AuditLog.log_id).all()
+        assert writer.written == 120
+        assert [r.amount for r in rows] == [Decimal(i) for i in range(120)]
+        assert all(r.created_at is not None and r.status == "success" for r in rows)
+
+    def test_full_queue_falls_back_to_sync_write(self, factory):
+        writer = AuditWriter(session_factory=factory, queue_size=1, enqueue_timeout_ms=1)
+        # Поток "запущен", но не разбирает очередь
+        writer._thread = type("Alive", (), {"is_alive": lambda self: True})()
+        db = factory()
+
+        assert writer.log(db, _entry()) is True
+        assert writer.log(db, _entry()) is False
+        assert factory().query(AuditLog).count() == 1
@@ -0,0 +1,150 @@
+"""
+Tests for applying betting-module bet events (outbox consumer)
+"""
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, JSON
+from sqlalchemy.orm import declarative_base
+
+from config.settings import settings
+from services import bet_sync_service
+from services.bet_sync_service import BetSyncService, betting_bet_uuid
+
+SyncBase = declarative_base()
+
+
+class SyncBet(SyncBase):
+    """Колонки bets, которые пишет BetSyncService (отдельно от моделей, подменяемых test_wallet)"""
+    __tablename__ = "bets"
+    id = Column(Integer, primary_key=True)
+    uuid = Column(String(36))
+    user_id = Column(Integer)
+    event_id = Column(String(100))
+    event_name = Column(String(255))
+    market_type = Column(String(100))
+    selection = Column(String(255))
+    odds = Column(Numeric(10, 4))
+    stake = Column(Numeric(15, 2))
+    potential_win = Column(Numeric(15, 2))
+    actual_win = Column(Numeric(15, 2))
+    status = Column(String(20))
+    placed_at = Column(DateTime)
+    settled_at = Column(DateTime)
+    expected_result_date = Column(DateTime)
+    bet_metadata = Column("metadata", JSON)
+
+
+def _event(event_id, event_type, status="open", **payload):
+    body = {
+        "bet_id": 7, "user_id": "user_123", "event_id": 42, "event_name": "A vs B",
+        "bet_type": "1", "expected_result": "П1", "bet_amount": "100.00",
+        "coefficient": "1.85", "potential_win": "185.00", "status": status,
+        "actual_win": None, "placed_at": "2025-12-20T10:00:00",
+    }
+    body.update(payload)
+    return {"id": event_id, "type": event_type, "aggregate_id": 7,
+            "occurred_at": "2025-12-20T12:00:00", "payload": body}
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    monkeypatch.setattr(bet_sync_service, "resolve_user_id", lambda db, ident: 1)
+    monkeypatch.setattr(bet_sync_service, "Bet", SyncBet)
+    db = MagicMock()
+    db.query.return_value.filter.return_value.first.return_value = None
+    return db
+
+
+class TestBetSync:
+    """Tests for BetSyncService.apply_events"""
+
+    def test_uuid_is_deterministic(self):
+        assert betting_bet_uuid(7) == betting_bet_uuid(7)
+        assert betting_bet_uuid(7) != betting_bet_uuid(8)
+
+    def test_events_applied_in_order_and_duplicates_skipped(self, fake_db):
+        events = [
+            _event(2, "bet.settled", status="resolved", result="won", actual_win="185.00"),
+            _event(1, "bet.placed"),
+            _event(2, "bet.settled", status="resolved", result="won", actual_win="185.00"),
+        ]
+        result = BetSyncService.apply_events(fake_db, events)
+
+        bet = fake_db.add.call_args[0][0]
+        assert result == {"applied": 2, "skipped": 1}
+        assert bet.status == "won"
+        assert bet.stake == Decimal("100.00")
+        assert bet.bet_metadata["outbox_event_id"] == 2
+        fake_db.commit.assert_called_once()
+
+    def test_users_resolved_before_batch(self, fake_db, monkeypatch):
+        resolved = []
+
+        def resolve(db, identifier):
+            # Создание пользователя коммитит - до первой ставки пачки
+            assert not db.add.called
+            resolved.append(identifier)
+            return 1
+
+        monkeypatch.setattr(bet_sync_service, "resolve_user_id", resolve)
+        BetSyncService.apply_events(fake_db, [
+            _event(1, "bet.placed"),
+            _event(2, "bet.placed", user_id="user_456", bet_id=8),
+            _event(3, "bet.settled", status="resolved", result="won", actual_win="185.00"),
+        ])
+        assert sorted(resolved) == ["user_123", "user_456"]
+        fake_db.commit.assert_called_once()
+
+    def test_open_bet_is_pending(self, fake_db):
+        # Статус, по которому WalletService блокирует ставку в балансе
+        BetSyncService.apply_events(fake_db, [_event(4, "bet.placed")])
+        assert fake_db.add.call_args[0][0].status == "pending"
+
+    def test_cancelled_bet_becomes_void(self, fake_db):
+        BetSyncService.apply_events(fake_db, [_event(5, "bet.status_changed", status="cancelled")])
+        assert fake_db.add.call_args[0][0].status == "void"
+
+    def test_resolved_without_outcome_stays_pending(self, fake_db):
+        BetSyncService.apply_events(fake_db, [_event(5, "bet.settled", status="resolved")])
+        bet = fake_db.add.call_args[0][0]
+        assert (bet.status, bet.settled_at) == ("pending", None)
+
+    def test_coupon_events_skipped(self, fake_db):
+        coupon = {"id": 6, "type": "coupon.cashed_out", "aggregate_type": "coupon", "aggregate_id": 3,
+                  "occurred_at": "2025-12-20T12:00:00", "payload": {"coupon_id": 3, "user_id": "user_123"}}
+        result = BetSyncService.apply_events(fake_db, [_event(5, "bet.placed"), coupon])
+        assert result == {"applied": 1, "skipped": 1}
+        assert fake_db.add.call_count == 1
+
+
+class TestInternalToken:
+    """Tests for the internal API shared secret"""
+
+    @pytest.fixture
+    def verify(self):
+        # routes импортируются при выполнении, а не при сборке тестов:
+        # test_webhooks ждёт подменённые модели
+        from fastapi import HTTPException
+        from routes.internal import verify_internal_token
+
+        def verify(token):
+            try:
+                verify_internal_token(token)
+            except HTTPException as e:
+                return e.status_code
+            return 200
+        return verify
+
+    def test_rejected_when_token_not_configured(self, verify, monkeypatch):
+        monkeypatch.setattr(settings, "internal_api_token", "")
+        assert verify(None) == 503
+        assert verify("") == 503
+        assert verify("anything") == 503
+
+    def test_wrong_or_missing_token(self, verify, monkeypatch):
+        monkeypatch.setattr(settings, "internal_api_token", "s3cret")
+        assert verify(None) == 401
+        assert verify("wrong") == 401
+        assert verify("s3cret") == 200
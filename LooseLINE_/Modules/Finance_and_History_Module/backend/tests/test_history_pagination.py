@@ -0,0 +1,157 @@
+"""
+Tests for keyset pagination of WalletService.get_bet_history
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, Column, Integer, String, Numeric, Date, DateTime, Text
+from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
+
+from services import stats_service, wallet_service
+from services.wallet_service import WalletService, decode_cursor, encode_cursor
+
+HistoryBase = declarative_base()
+
+T0 = datetime(2025, 12, 1, 12, 0, 0)
+
+
+class HistoryBet(HistoryBase):
+    """Колонки production-модели Bet, которые читает история."""
+    __tablename__ = "bets"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    event_id = Column(String(100), default="1")
+    event_name = Column(String(255))
+    odds = Column(Numeric(10, 4), default=Decimal("2.0"))
+    stake = Column(Numeric(15, 2), default=Decimal("10.00"))
+    potential_win = Column(Numeric(15, 2), default=Decimal("20.00"))
+    actual_win = Column(Numeric(15, 2))
+    status = Column(String(20), default="pending")
+    result = Column(String(20))
+    placed_at = Column(DateTime)
+    settled_at = Column(DateTime)
+    expected_result_date = Column(DateTime)
+
+
+class HistoryTransaction(HistoryBase):
+    __tablename__ = "balance_transactions"
+    transaction_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    transaction_type = Column(String(50), default="deposit")
+    amount = Column(Numeric(15, 2), default=Decimal("5.00"))
+    balance_before = Column(Numeric(15, 2), default=Decimal("0"))
+    balance_after = Column(Numeric(15, 2), default=Decimal("5.00"))
+    status = Column(String(20), default="completed")
+    description = Column(Text)
+    created_at = Column(DateTime)
+
+
+class HistoryStats(HistoryBase):
+    __tablename__ = "user_bet_stats"
+    user_id = Column(Integer, primary_key=True)
+    period_type = Column(String(10), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    bets_settled = Column(Integer, default=0)
+    wins = Column(Integer, default=0)
+    losses = Column(Integer, default=0)
+    total_stake = Column(Numeric(15, 2), default=Decimal("0"))
+    total_won = Column(Numeric(15, 2), default=Decimal("0"))
+    updated_at = Column(DateTime)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    HistoryBase.metadata.create_all(engine)
+    monkeypatch.setattr(wallet_service, "Bet", HistoryBet)
+    monkeypatch.setattr(wallet_service, "BalanceTransaction", HistoryTransaction)
+    monkeypatch.setattr(wallet_service, "UserBetStats", HistoryStats)
+    monkeypatch.setattr(stats_service, "Bet", HistoryBet)
+    monkeypatch.setattr(stats_service, "UserBetStats", HistoryStats)
+    session = sessionmaker(bind=engine)()
+
+    # 25 ставок, по две на одну секунду (одинаковое время - разводит id)
+    for i in range(1, 26):
+        session.add(HistoryBet(
+            id=i, user_id=1, placed_at=T0 + timedelta(seconds=i // 2),
+            status="won" if i % 3 == 0 else "lost",
+            actual_win=Decimal("20.00") if i % 3 == 0 else None
+        ))
+    for i in range(1, 8):
+        session.add(HistoryTransaction(transaction_id=i, user_id=1, created_at=T0 + timedelta(seconds=2 * i)))
+    session.add(HistoryBet(id=100, user_id=2, placed_at=T0))
+    session.commit()
+    stats_service.rebuild_users(session, [1, 2])
+    yield session
+    session.close()
+
+
+def _walk(db, key, cursor_key, **kwargs):
+    ids, cursor, pages = [], None, 0
+    while True:
+        result = WalletService.get_bet_history(db, 1, limit=10, count="none", **{cursor_key: cursor}, **kwargs)
+        assert result["success"] is True
+        ids += result[key]
+        pages += 1
+        cursor = result["pagination"][f"next_{cursor_key}"]
+        if cursor is None:
+            return ids, pages
+
+
+class TestHistoryPagination:
+    """Tests for cursor pagination"""
+
+    def test_cursor_roundtrip(self):
+        assert decode_cursor(encode_cursor(T0, 5)) == (T0, 1, 5)
+        assert decode_cursor(None) is None
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
+
+    def test_bets_pages_cover_all_rows_once(self, db):
+        items, pages = _walk(db, "bets", "bets_cursor")
+        ids = [b["bet_id"] for b in items]
+        assert pages == 3
+        assert ids == sorted(range(1, 26), key=lambda i: (i // 2, i), reverse=True)
+
+    def test_transactions_paginate_independently(self, db):
+        first = WalletService.get_bet_history(db, 1, limit=5)
+        assert len(first["bets"]) == 5
+        assert len(first["transactions"]) == 5
+
+        cursor = first["pagination"]["next_transactions_cursor"]
+        second = WalletService.get_bet_history(db, 1, limit=5, transactions_cursor=cursor)
+        assert [t["transaction_id"] for t in second["transactions"]] == [2, 1]
+        assert second["pagination"]["has_more_transactions"] is False
+        # Ставки без своего курсора - снова первая страница
+        assert [b["bet_id"] for b in second["bets"]] == [b["bet_id"] for b in first["bets"]]
+
+    def test_timeline_merges_by_time(self, db):
+        items, _ = _walk(db, "timeline", "cursor", timeline=True)
+        keys = [(item["kind"], item.get("bet_id") or item["transaction_id"]) for item in items]
+        assert len(keys) == len(set(keys)) == 32
+        times = [item.get("placed_at") or item["created_at"] for item in items]
+        assert times == sorted(times, reverse=True)
+
+    def test_statistics_only_on_first_page(self, db):
+        first = WalletService.get_bet_history(db, 1, limit=10)
+        assert first["statistics"]["total_wins"] == 8
+        assert first["statistics"]["total_losses"] == 17
+
+        cursor = first["pagination"]["next_bets_cursor"]
+        assert WalletService.get_bet_history(db, 1, limit=10, bets_cursor=cursor)["statistics"] is None
+
+    def test_counts(self, db, monkeypatch):
+        exact = WalletService.get_bet_history(db, 1, limit=10, count="exact")["pagination"]
+        assert (exact["total_items"], exact["total_pages"], exact["total_is_estimate"]) == (25, 3, False)
+
+        monkeypatch.setattr(wallet_service, "HISTORY_COUNT_CAP", 20)
+        estimate = WalletService.get_bet_history(db, 1, limit=10)["pagination"]
+        assert (estimate["total_items"], estimate["total_is_estimate"]) == (20, True)
+
+        assert "total_items" not in WalletService.get_bet_history(db, 1, count="none")["pagination"]
+
+    def test_invalid_cursor(self, db):
+        result = WalletService.get_bet_history(db, 1, bets_cursor="garbage")
+        assert result == {"success": False, "error": "Invalid cursor"}
@@ -0,0 +1,111 @@
+"""
+Tests for the X-User-ID -> users.id identity cache
+"""
+import threading
+import time
+
+import pytest
+
+from services import identity_service
+from services.identity_service import IdentityCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Подменяет поход в БД: username -> id, 'ghost' - нет пользователя."""
+    calls = []
+
+    def load(db, user_identifier, create):
+        calls.append((user_identifier, create))
+        if user_identifier == "ghost" and not create:
+            return None
+        return 100 + len(calls)
+
+    monkeypatch.setattr(identity_service, "_load_user_id", load)
+    return calls
+
+
+class TestIdentityCache:
+    """Tests for IdentityCache.resolve"""
+
+    def test_hit_skips_database(self, loads):
+        cache = IdentityCache()
+        assert cache.resolve(None, "alice") == 101
+        assert cache.resolve(None, "alice") == 101
+        assert loads == [("alice", True)]
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_entries_expire(self, loads):
+        clock = FakeClock()
+        cache = IdentityCache(ttl=60, clock=clock)
+        cache.resolve(None, "alice")
+        clock.now = 61
+        assert cache.resolve(None, "alice") == 102
+        assert len(loads) == 2
+
+    def test_negative_result_cached_for_lookups_only(self, loads):
+        clock = FakeClock()
+        cache = IdentityCache(negative_ttl=5, clock=clock)
+        assert cache.resolve(None, "ghost", create=False) is None
+        assert cache.resolve(None, "ghost", create=False) is None
+        assert len(loads) == 1
+
+        # Создание не верит закэшированному "нет пользователя"
+        assert cache.resolve(None, "ghost") == 102
+        assert cache.resolve(None, "ghost", create=False) == 102
+        assert len(loads) == 2
+
+    def test_least_recently_used_evicted(self, loads):
+        cache = IdentityCache(max_size=2)
+        cache.resolve(None, "a")
+        cache.resolve(None, "b")
+        cache.resolve(None, "a")
+        cache.resolve(None, "c")
+        assert len(cache) == 2
+        cache.resolve(None, "a")
+        cache.resolve(None, "b")
+        assert [name for name, _ in loads] == ["a", "b", "c", "b"]
+
+    def test_concurrent_misses_load_once(self, monkeypatch):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow_load(db, user_identifier, create):
+            calls.append(user_identifier)
+            started.set()
+            release.wait(5)
+            return 7
+
+        monkeypatch.setattr(identity_service, "_load_user_id", slow_load)
+        cache = IdentityCache()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.resolve(None, "bob"))) for _ in range(8)]
+        threads[0].start()
+        started.wait(5)
+        for t in threads[1:]:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        assert calls == ["bob"]
+        assert results == [7] * 8
+
+    def test_load_error_propagates_to_waiters_and_is_not_cached(self, monkeypatch):
+        def failing_load(db, user_identifier, create):
+            raise RuntimeError("db down")
+
+        monkeypatch.setattr(identity_service, "_load_user_id", failing_load)
+        cache = IdentityCache()
+        with pytest.raises(RuntimeError):
+            cache.resolve(None, "carol")
+        assert len(cache) == 0
@@ -0,0 +1,310 @@
+"""
+Tests for background report jobs
+"""
+import csv
+import io
+import os
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import Column, Table
+from sqlalchemy.orm import declarative_base
+
+from models.orm_models import Bet as ProductionBet
+from services import report_service, wallet_service
+from services.report_service import ReportJobs, report_filename
+from services.wallet_service import WalletService
+from tests import conftest
+from tests.conftest import Bet, User
+
+# Колонки production-модели Bet (без JSONB metadata и внешних ключей - для SQLite)
+ProductionBase = declarative_base()
+
+
+class ProductionBetRow(ProductionBase):
+    __table__ = Table(
+        "production_bets", ProductionBase.metadata,
+        *[Column(c.name, c.type, primary_key=c.primary_key)
+          for c in ProductionBet.__table__.columns if c.name != "metadata"]
+    )
+
+
+@pytest.fixture
+def db(db_session, monkeypatch):
+    monkeypatch.setattr(report_service, "ReportJob", conftest.ReportJob)
+    for name in ("Bet", "BalanceTransaction", "UserBetStats", "AuditLog"):
+        monkeypatch.setattr(wallet_service, name, getattr(conftest, name))
+
+    db_session.add(User(id="user_1", email="u1@example.com", name="u1", password_hash="hash"))
+    for i in range(120):
+        db_session.add(Bet(
+            user_id="user_1", event_id=i, bet_amount=Decimal("10.00"),
+            coefficient=Decimal("1.90"), potential_win=Decimal("19.00"),
+            status="resolved", result="win" if i % 2 else "loss",
+            placed_at=datetime(2025, 12, 1) + timedelta(hours=i)
+        ))
+    db_session.commit()
+    return db_session
+
+
+@pytest.fixture
+def production_bets(db_session, monkeypatch):
+    ProductionBase.metadata.create_all(db_session.bind)
+    monkeypatch.setattr(wallet_service, "Bet", ProductionBetRow)
+    for i in range(3):
+        db_session.add(ProductionBetRow(
+            user_id=1, event_id=str(i), stake=Decimal("10.00"), odds=Decimal("1.9000"),
+            potential_win=Decimal("19.00"), status="won" if i else "lost",
+            actual_win=Decimal("19.00") if i else None,
+            placed_at=datetime(2025, 12, 1) + timedelta(hours=i),
+            settled_at=datetime(2025, 12, 2)
+        ))
+    db_session.commit()
+    return db_session
+
+
+def _submit(jobs, db, format="pdf", **params):
+    return jobs.submit(db, "user_1", format, date_from="2025-12-01", date_to="2025-12-31", **params)
+
+
+class TestReportJobs:
+    """Tests for ReportJobs"""
+
+    def test_pdf_rendered_inline_without_pool(self, db):
+        result = _submit(ReportJobs(), db)
+
+        report = result["report"]
+        assert result["success"] is True
+        assert report["status"] == "ready"
+        assert report["filename"] == "betting_report_2025_12_01_2025_12_31.pdf"
+        assert report["download_url"].endswith(f"/{report['report_id']}/download")
+
+        job = db.get(conftest.ReportJob, report["report_id"])
+        with open(job.file_path, "rb") as f:
+            assert f.read(5) == b"%PDF-"
+        assert job.file_size == os.path.getsize(job.file_path)
+
+    def test_csv_job(self, db):
+        report = _submit(ReportJobs(), db, format="csv", include_transactions=False)["report"]
+
+        job = db.get(conftest.ReportJob, report["report_id"])
+        with open(job.file_path, encoding="utf-8") as f:
+            content = f.read()
+        assert content.count("\n") > 120
+        assert "=== TRANSACTIONS ===" not in content
+
+    def test_parquet_job(self, db):
+        report = _submit(ReportJobs(), db, format="parquet")["report"]
+
+        assert report["status"] == "ready"
+        assert report["filename"] == "betting_report_2025_12_01_2025_12_31.parquet.zip"
+        job = db.get(conftest.ReportJob, report["report_id"])
+        with zipfile.ZipFile(job.file_path) as archive:
+            assert archive.namelist() == ["bets.parquet", "transactions.parquet", "statistics.parquet"]
+            bets_file = pq.ParquetFile(io.BytesIO(archive.read("bets.parquet")))
+            statistics = pq.read_table(io.BytesIO(archive.read("statistics.parquet"))).to_pydict()
+
+        assert bets_file.read().num_rows == 120
+        assert bets_file.metadata.row_group(0).column(0).compression == "ZSTD"
+        assert statistics["metric"][:3] == ["Total Bets", "Wins", "Losses"]
+
+    def test_parquet_row_groups(self, db, tmp_path):
+        from services.wallet_service import WalletService
+        path = tmp_path / "report.zip"
+        report_service.write_parquet(
+            path,
+            WalletService.report_tables(
+                db, "user_1", "2025-12-01", "2025-12-31",
+                include_transactions=False, include_statistics=False, chunk_rows=25
+            ),
+            row_group_rows=50
+        )
+        with zipfile.ZipFile(path) as archive:
+            metadata = pq.ParquetFile(io.BytesIO(archive.read("bets.parquet"))).metadata
+        # Выборки по 25 строк копятся до группы в 50
+        assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [50, 50, 20]
+
+    def test_failure_recorded(self, db, monkeypatch):
+        def broken(*args, **kwargs):
+            raise RuntimeError("renderer crashed")
+        monkeypatch.setattr(report_service, "write_pdf", broken)
+
+        report = _submit(ReportJobs(), db)["report"]
+        assert report["status"] == "failed"
+        assert report["error"] == "renderer crashed"
+        assert os.listdir(report_service.settings.reports_dir) == []
+
+    def test_pending_limit(self, db):
+        jobs = ReportJobs(max_pending_per_user=1)
+        # Пул "запущен", но задания не выполняет
+        jobs._dispatch = lambda report_id: True
+
+        assert _submit(jobs, db)["report"]["status"] == "queued"
+        assert _submit(jobs, db) == {"success": False, "error": "Too many reports in progress"}
+
+    def test_stale_jobs_failed_and_not_counted(self, db):
+        jobs = ReportJobs(max_pending_per_user=1, stale_after_seconds=600)
+        # Пул "запущен", но задание так и не выполнено (воркер упал, рестарт)
+        jobs._dispatch = lambda report_id: True
+        lost = _submit(jobs, db)["report"]
+        job = db.get(conftest.ReportJob, lost["report_id"])
+        job.created_at = datetime.utcnow() - timedelta(minutes=11)
+        db.commit()
+
+        # Потерянное задание не держит лимит
+        assert _submit(jobs, db)["report"]["status"] == "queued"
+
+        assert jobs.fail_stale(db) == 1
+        db.refresh(job)
+        assert job.status == "failed"
+        assert job.error == "Report generation interrupted"
+        assert jobs.fail_stale(db) == 0
+
+    def test_cleanup_removes_expired_files(self, db):
+        jobs = ReportJobs(ttl_days=1)
+        fresh = _submit(jobs, db)["report"]
+        old = _submit(jobs, db)["report"]
+        old_job = db.get(conftest.ReportJob, old["report_id"])
+        old_job.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        old_path = old_job.file_path
+        db.commit()
+
+        assert jobs.cleanup(db) == 1
+        assert not os.path.exists(old_path)
+        assert old_job.status == "expired" and old_job.file_path is None
+        assert db.get(conftest.ReportJob, fresh["report_id"]).status == "ready"
+        assert jobs.cleanup(db) == 0
+
+    def test_report_filename(self):
+        job = conftest.ReportJob(format="csv", params='{"date_from": "2025-01-01", "date_to": "2025-01-31"}')
+        assert report_filename(job) == "betting_report_2025_01_01_2025_01_31.csv"
+        job.format = "parquet"
+        assert report_filename(job) == "betting_report_2025_01_01_2025_01_31.parquet.zip"
+
+
+class TestProductionBetColumns:
+    """Reports read the columns of the production Bet model"""
+
+    def test_csv_rows(self, production_bets):
+        content = "".join(WalletService.iter_csv_report(
+            production_bets, 1, "2025-12-01", "2025-12-31",
+            include_transactions=False, include_statistics=False
+        ))
+        rows = list(csv.reader(io.StringIO(content)))
+        start = rows.index(["=== BETS ==="])
+
+        assert rows[start + 1][0] == "Bet ID"
+        assert rows[start + 2] == [
+            "3", "2", "10.0", "1.9", "19.0", "won", "won", "19.0",
+            "2025-12-01T02:00:00", "2025-12-02T00:00:00"
+        ]
+        assert rows[start + 4][5:8] == ["lost", "lost", ""]
+
+
+    def test_parquet_types(self, production_bets, tmp_path):
+        path = tmp_path / "report.zip"
+        report_service.write_parquet(path, WalletService.report_tables(
+            production_bets, 1, "2025-12-01", "2025-12-31",
+            include_transactions=False, include_statistics=False
+        ))
+        with zipfile.ZipFile(path) as archive:
+            bets = pq.read_table(io.BytesIO(archive.read("bets.parquet")))
+
+        assert bets.num_rows == 3
+        assert bets.schema.field("bet_amount").type == pa.decimal128(15, 2)
+        assert bets.schema.field("coefficient").type == pa.decimal128(10, 4)
+        assert bets.schema.field("placed_at").type == pa.timestamp("us")
+        first = bets.slice(0, 1).to_pylist()[0]
+        assert first["bet_id"] == 3
+        assert first["bet_amount"] == Decimal("10.00")
+        assert first["settled_at"] == datetime(2025, 12, 2)
+
+
+class TestReportCache:
+    """Tests for the report cache"""
+
+    def _export(self, db, **kwargs):
+        return WalletService.export_report(
+            db, "user_1", date_from="2025-12-01", date_to="2025-12-31", **kwargs
+        )
+
+    def test_identical_request_served_from_cache(self, db):
+        first = self._export(db)["report"]
+        second = self._export(db)["report"]
+
+        assert second["cached"] is True
+        assert second["report_id"] == first["report_id"]
+        assert second["content"] == first["content"]
+        # Другие параметры - другой отчёт
+        assert self._export(db, include_statistics=False)["report"]["report_id"] != first["report_id"]
+        assert self._export(db, format="pdf")["report"]["report_id"] != first["report_id"]
+
+    def test_new_data_in_range_invalidates(self, db):
+        first = self._export(db)["report"]
+        db.add(Bet(
+            user_id="user_1", event_id=999, bet_amount=Decimal("5.00"),
+            coefficient=Decimal("2.00"), potential_win=Decimal("10.00"),
+            placed_at=datetime(2025, 12, 20)
+        ))
+        db.commit()
+
+        second = self._export(db)["report"]
+        assert second["report_id"] != first["report_id"]
+        assert second["content"].count("\n") == first["content"].count("\n") + 1
+
+        # Изменение ставки вне периода кэш не сбрасывает
+        db.add(Bet(
+            user_id="user_1", event_id=1000, bet_amount=Decimal("5.00"),
+            coefficient=Decimal("2.00"), potential_win=Decimal("10.00"),
+            placed_at=datetime(2026, 1, 5)
+        ))
+        db.commit()
+        assert self._export(db)["report"]["report_id"] == second["report_id"]
+
+    def test_stale_active_job_not_reused(self, db):
+        jobs = ReportJobs(stale_after_seconds=600)
+        jobs._dispatch = lambda report_id: True
+        queued = _submit(jobs, db, cache_key="key")["report"]
+        assert jobs.lookup(db, "user_1", "key").report_id == queued["report_id"]
+
+        db.get(conftest.ReportJob, queued["report_id"]).created_at = datetime.utcnow() - timedelta(minutes=11)
+        db.commit()
+        assert jobs.lookup(db, "user_1", "key") is None
+
+    def test_sync_csv_does_not_reuse_queued_job(self, db, monkeypatch):
+        monkeypatch.setattr(wallet_service.report_jobs, "_dispatch", lambda report_id: True)
+        queued = self._export(db, background=True)["report"]
+        assert queued["status"] == "queued"
+
+        report = self._export(db)["report"]
+        assert not report.get("cached")
+        assert report["report_id"] != queued["report_id"]
+        assert "=== BETS ===" in report["content"]
+
+    def test_missing_file_is_a_miss(self, db):
+        first = self._export(db)["report"]
+        os.remove(db.get(conftest.ReportJob, first["report_id"]).file_path)
+
+        assert self._export(db)["report"]["report_id"] != first["report_id"]
+
+    def test_lru_eviction_by_disk_budget(self, db):
+        jobs = ReportJobs()
+        ids = [
+            jobs.store(db, "user_1", "csv", "x" * 400, cache_key=f"key{i}", date_from="2025-12-0{i}")["report_id"]
+            for i in range(1, 4)
+        ]
+        # key1 запрошен последним - вытесняется key2
+        db.get(conftest.ReportJob, ids[1]).last_accessed_at = datetime.utcnow() - timedelta(hours=1)
+        db.get(conftest.ReportJob, ids[2]).last_accessed_at = datetime.utcnow() - timedelta(minutes=1)
+        db.commit()
+        assert jobs.lookup(db, "user_1", "key1").report_id == ids[0]
+
+        jobs.cache_max_bytes = 1000
+        assert jobs.evict(db) == 1
+        statuses = [db.get(conftest.ReportJob, report_id).status for report_id in ids]
+        assert statuses == ["ready", "expired", "ready"]
+        assert jobs.lookup(db, "user_1", "key2") is None
@@ -0,0 +1,174 @@
+"""
+Tests for the monthly statement generator
+"""
+import csv
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, Boolean, Column, Integer, String, Numeric, Date, DateTime, Index
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+from services import statement_service
+from services.statement_service import generate_month, month_start, next_month, statement_path
+
+StatementBase = declarative_base()
+
+
+class StatementUser(StatementBase):
+    __tablename__ = "users"
+    id = Column(Integer, primary_key=True)
+    is_active = Column(Boolean, default=True)
+
+
+class StatementTransaction(StatementBase):
+    __tablename__ = "balance_transactions"
+    transaction_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    transaction_type = Column(String(50))
+    amount = Column(Numeric(15, 2))
+    balance_before = Column(Numeric(15, 2))
+    balance_after = Column(Numeric(15, 2))
+    status = Column(String(20), default="completed")
+    description = Column(String(500))
+    created_at = Column(DateTime)
+
+
+class StatementRow(StatementBase):
+    __tablename__ = "monthly_statements"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    period_date = Column(Date, nullable=False)
+    file_path = Column(String(500))
+    status = Column(String(20))
+    generated_at = Column(DateTime)
+    __table_args__ = (Index("uq_test_statements_user_period", "user_id", "period_date", unique=True),)
+
+
+PERIOD = date(2025, 12, 1)
+
+
+@pytest.fixture
+def factory(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'statements.db'}")
+    StatementBase.metadata.create_all(engine)
+    monkeypatch.setattr(statement_service, "User", StatementUser)
+    monkeypatch.setattr(statement_service, "BalanceTransaction", StatementTransaction)
+    monkeypatch.setattr(statement_service, "MonthlyStatement", StatementRow)
+    monkeypatch.setattr(statement_service.settings, "statements_dir", str(tmp_path / "statements"))
+
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        for user_id in range(1, 6):
+            db.add(StatementUser(id=user_id, is_active=user_id != 5))
+        balance = {user_id: Decimal("0") for user_id in range(1, 5)}
+
+        def add(user_id, type, amount, created_at):
+            before = balance[user_id]
+            balance[user_id] = before + amount
+            db.add(StatementTransaction(
+                user_id=user_id, transaction_type=type, amount=amount,
+                balance_before=before, balance_after=balance[user_id], created_at=created_at
+            ))
+
+        # user 1: остаток с ноября и движения в декабре; user 2: только ноябрь
+        add(1, "deposit", Decimal("100.00"), datetime(2025, 11, 20))
+        add(2, "deposit", Decimal("40.00"), datetime(2025, 11, 25))
+        add(1, "bet_placed", Decimal("-30.00"), datetime(2025, 12, 3))
+        add(1, "bet_won", Decimal("57.00"), datetime(2025, 12, 5))
+        add(3, "deposit", Decimal("10.00"), datetime(2025, 12, 31, 23, 59))
+        add(1, "withdrawal", Decimal("-20.00"), datetime(2026, 1, 1))
+        db.commit()
+    return factory
+
+
+def _read(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row[0]: row[1:] for row in csv.reader(f) if row}
+
+
+def _statuses(factory):
+    with factory() as db:
+        return {r.user_id: r.status for r in db.query(StatementRow).all()}
+
+
+class TestStatementGenerator:
+    """Tests for generate_month"""
+
+    def test_generates_active_users_in_chunks(self, factory):
+        summary = generate_month(PERIOD, workers=0, chunk_size=2, session_factory=factory)
+
+        assert summary["users"] == 4
+        assert summary["transactions"] == 3
+        assert summary["failed"] == 0
+        assert _statuses(factory) == {1: "generated", 2: "generated", 3: "generated", 4: "generated"}
+
+        first = _read(statement_path(PERIOD, 1))
+        assert first["Opening Balance"] == ["100.0"]
+        assert first["Transactions"] == ["2"]
+        assert first["Total Bets"] == ["-30.0"]
+        assert first["Total Wins"] == ["57.0"]
+        assert first["Closing Balance"] == ["127.0"]
+
+        no_activity = _read(statement_path(PERIOD, 2))
+        assert no_activity["Transactions"] == ["0"]
+        assert no_activity["Closing Balance"] == ["40.0"]
+        assert not statement_path(PERIOD, 5).exists()
+
+    def test_rerun_skips_generated_and_retries_failed(self, factory, monkeypatch):
+        original = statement_service._write_statement
+
+        def flaky(period, user_id, opening, transactions):
+            if user_id == 3:
+                raise OSError("disk full")
+            return original(period, user_id, opening, transactions)
+
+        monkeypatch.setattr(statement_service, "_write_statement", flaky)
+        summary = generate_month(PERIOD, workers=0, chunk_size=2, session_factory=factory)
+        # Падает вся пачка [3, 4]
+        assert summary["failed"] == 2
+        assert _statuses(factory) == {1: "generated", 2: "generated", 3: "failed", 4: "failed"}
+
+        monkeypatch.setattr(statement_service, "_write_statement", original)
+        summary = generate_month(PERIOD, workers=0, chunk_size=2, session_factory=factory)
+        assert summary["users"] == 2
+        assert summary["failed"] == 0
+        assert set(_statuses(factory).values()) == {"generated"}
+        with factory() as db:
+            assert db.query(StatementRow).count() == 4
+
+        assert generate_month(PERIOD, workers=0, session_factory=factory)["users"] == 0
+
+    def test_opening_balance_follows_created_at(self, factory):
+        # Поздняя по времени транзакция вставлена раньше (меньший transaction_id)
+        with factory() as db:
+            db.add(StatementTransaction(
+                user_id=4, transaction_type="deposit", amount=Decimal("70.00"),
+                balance_before=Decimal("0"), balance_after=Decimal("70.00"), created_at=datetime(2025, 11, 28)
+            ))
+            db.add(StatementTransaction(
+                user_id=4, transaction_type="deposit", amount=Decimal("50.00"),
+                balance_before=Decimal("0"), balance_after=Decimal("50.00"), created_at=datetime(2025, 11, 10)
+            ))
+            db.commit()
+
+        generate_month(PERIOD, workers=0, session_factory=factory)
+        assert _read(statement_path(PERIOD, 4))["Opening Balance"] == ["70.0"]
+
+    def test_failure_when_database_is_down(self, factory, monkeypatch):
+        def broken(*args, **kwargs):
+            raise OSError("database is gone")
+
+        monkeypatch.setattr(statement_service, "_write_statement", broken)
+        monkeypatch.setattr(statement_service, "_upsert_statements", broken)
+        summary = generate_month(PERIOD, workers=0, chunk_size=2, session_factory=factory)
+
+        # Пачки отмечены в итоге, запуск не прерван; строк failed нет - подхватит следующий запуск
+        assert summary["failed"] == 4
+        assert _statuses(factory) == {}
+
+    def test_month_helpers(self):
+        assert month_start("2025-12") == date(2025, 12, 1)
+        assert next_month(date(2025, 12, 1)) == date(2026, 1, 1)
+        assert next_month(date(2026, 1, 1)) == date(2026, 2, 1)
+        assert statement_path(PERIOD, 12345).parts[-3:] == ("2025-12", "12", "statement_12345_2025_12.csv")
@@ -0,0 +1,136 @@
+"""
+Tests for incrementally maintained user_bet_stats
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, Column, Integer, String, Numeric, Date, DateTime
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+from services import stats_service
+from services.stats_service import ALL_TIME, StatsDelta, bet_contribution
+
+StatsBase = declarative_base()
+
+
+class StatsBet(StatsBase):
+    __tablename__ = "bets"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    stake = Column(Numeric(15, 2))
+    actual_win = Column(Numeric(15, 2))
+    status = Column(String(20), default="pending")
+    placed_at = Column(DateTime)
+
+
+class StatsRow(StatsBase):
+    __tablename__ = "user_bet_stats"
+    user_id = Column(Integer, primary_key=True)
+    period_type = Column(String(10), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    bets_settled = Column(Integer, default=0)
+    wins = Column(Integer, default=0)
+    losses = Column(Integer, default=0)
+    total_stake = Column(Numeric(15, 2), default=Decimal("0"))
+    total_won = Column(Numeric(15, 2), default=Decimal("0"))
+    updated_at = Column(DateTime)
+
+
+@pytest.fixture
+def factory(monkeypatch, tmp_path):
+    # Файл, а не :memory: - у потоков пересчёта свои соединения
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    StatsBase.metadata.create_all(engine)
+    monkeypatch.setattr(stats_service, "Bet", StatsBet)
+    monkeypatch.setattr(stats_service, "UserBetStats", StatsRow)
+    return sessionmaker(bind=engine)
+
+
+def _stats(db):
+    return {
+        (r.user_id, r.period_type, r.period_start): (
+            r.bets_settled, r.wins, r.losses, Decimal(r.total_stake), Decimal(r.total_won)
+        )
+        for r in db.query(StatsRow).all()
+    }
+
+
+def _apply(db, bet, status, actual_win=None):
+    """Смена статуса ставки так же, как в BetSyncService."""
+    stats = StatsDelta()
+    before = bet_contribution(bet.status, bet.stake, bet.actual_win)
+    bet.status, bet.actual_win = status, actual_win
+    stats.add(bet.user_id, bet.placed_at, before, bet_contribution(status, bet.stake, actual_win))
+    stats.flush(db)
+    db.commit()
+
+
+class TestStatsService:
+    """Tests for StatsDelta and rebuild"""
+
+    def test_contribution(self):
+        assert bet_contribution("pending", 10, None) is None
+        assert bet_contribution("won", 10, 25) == (1, 1, 0, Decimal("10"), Decimal("25"))
+        assert bet_contribution("lost", 10, 25) == (1, 0, 1, Decimal("10"), Decimal("0"))
+
+    def test_settle_and_resettle(self, factory):
+        db = factory()
+        bet = StatsBet(id=1, user_id=1, stake=Decimal("10.00"), placed_at=datetime(2025, 12, 5, 10))
+        db.add(bet)
+        db.commit()
+
+        _apply(db, bet, "won", Decimal("25.00"))
+        day = (1, "day", date(2025, 12, 5))
+        assert _stats(db)[(1, "all", ALL_TIME)] == (1, 1, 0, Decimal("10"), Decimal("25"))
+        assert _stats(db)[(1, "month", date(2025, 12, 1))] == _stats(db)[day]
+
+        # Исправление результата: выигрыш -> проигрыш
+        _apply(db, bet, "lost")
+        assert _stats(db)[day] == (1, 0, 1, Decimal("10"), Decimal("0"))
+
+        # Отмена: ставка больше не учитывается
+        _apply(db, bet, "cancelled")
+        assert _stats(db)[day] == (0, 0, 0, Decimal("0"), Decimal("0"))
+
+    def test_unchanged_contribution_writes_nothing(self, factory):
+        stats = StatsDelta()
+        stats.add(1, datetime(2025, 12, 5), None, None)
+        assert not stats
+        assert stats.flush(factory()) == 0
+
+    def test_rebuild_matches_incremental(self, factory):
+        db = factory()
+        bets = []
+        for i in range(1, 31):
+            bet = StatsBet(
+                id=i, user_id=i % 4 + 1, stake=Decimal(i),
+                placed_at=datetime(2025, 11 + i % 2, i % 28 + 1, 12)
+            )
+            db.add(bet)
+            bets.append(bet)
+        db.commit()
+        for bet in bets:
+            if bet.id % 5:
+                _apply(db, bet, "won" if bet.id % 3 == 0 else "lost",
+                       Decimal(bet.id * 2) if bet.id % 3 == 0 else None)
+        incremental = _stats(db)
+
+        db.query(StatsRow).delete()
+        db.add(StatsRow(user_id=99, period_type="all", period_start=ALL_TIME, bets_settled=1))
+        db.commit()
+        assert stats_service.rebuild(factory, workers=2, chunk_size=1) == 4
+
+        assert _stats(factory()) == {key: value for key, value in incremental.items() if value[0]}
+
+    def test_lock_users(self, factory):
+        # SQLite - без блокировок
+        stats_service.lock_users(factory(), [2, 1])
+
+        db = MagicMock()
+        db.get_bind.return_value.dialect.name = "postgresql"
+        stats_service.lock_users(db, [3, 1, 3])
+        statement, params = db.execute.call_args.args
+        assert "pg_advisory_xact_lock" in str(statement)
+        assert params == {"namespace": stats_service.STATS_LOCK_NAMESPACE, "ids": [1, 3]}
@@ -23,7 +23,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from tests.conftest import (
     User, UserBalance, BalanceTransaction, 
-    WalletOperation, Bet, WithdrawalMethod,
+    WalletOperation, Bet, WithdrawalMethod, UserBetStats, ReportJob,
     engine, db_session, TestBase
 )
 
@@ -42,6 +42,8 @@ class MockORMModelsModule:
     Bet = Bet
     AuditLog = None  # Будет импортирован при необходимости
     MonthlyStatement = None
+    UserBetStats = UserBetStats
+    ReportJob = ReportJob
 
 # Подменяем модули
 sys.modules['models.orm_models'] = MockORMModelsModule()
@@ -51,6 +53,10 @@ from tests.conftest import PaymentMethod, AuditLog
 MockORMModelsModule.PaymentMethod = PaymentMethod
 MockORMModelsModule.AuditLog = AuditLog
 
+# Задания на отчёты - в тестовой таблице
+import services.report_service as report_module
+report_module.ReportJob = ReportJob
+
 # Импортируем WalletService
 import services.wallet_service as ws_module
 
@@ -72,8 +78,12 @@ from services.wallet_service import WalletService
 
 # Используем фикстуры из conftest
 @pytest.fixture
-def db(db_session):
+def db(db_session, monkeypatch):
     """Алиас для db_session из conftest."""
+    # username/email -> users.id ищется по тестовой модели, кэш - свой на тест
+    import services.identity_service as identity_module
+    monkeypatch.setattr(identity_module, "User", User)
+    monkeypatch.setattr(identity_module, "identity_cache", identity_module.IdentityCache())
     return db_session
 
 
@@ -603,6 +613,32 @@ class TestExportReport:
         )
         assert result3['success'] is True
 
+    def test_iter_csv_report_in_chunks(self, db, test_user, test_bets):
+        """Тест 7: Потоковый CSV отдаётся кусками по chunk_rows строк."""
+        date_to = datetime.utcnow().date().isoformat()
+        date_from = (datetime.utcnow().date() - timedelta(days=30)).isoformat()
+
+        chunks = list(WalletService.iter_csv_report(
+            db, "user_123", date_from, date_to, chunk_rows=10
+        ))
+        content = "".join(chunks)
+
+        # 25 ставок по 10 строк + хвост
+        assert len(chunks) == 3
+        assert content.count("\n=== BETS ===") == 1
+        # Заголовок колонок + 25 ставок
+        assert len(content.split("=== BETS ===\r\n")[1].split("\r\n\r\n")[0].splitlines()) == 26
+        assert "=== STATISTICS ===" in content
+
+    def test_prepare_csv_export(self, db, test_user):
+        """Тест 8: Проверка параметров потокового экспорта."""
+        result = WalletService.prepare_csv_export(db, "user_123", "2025-12-01", "2025-12-15")
+        assert result['success'] is True
+        assert result['filename'] == "betting_report_2025_12_01_2025_12_15.csv"
+
+        result = WalletService.prepare_csv_export(db, "user_123", "01.12.2025")
+        assert result['success'] is False
+
 
 # ============================================================================
 # ЗАПУСК ТЕСТОВ
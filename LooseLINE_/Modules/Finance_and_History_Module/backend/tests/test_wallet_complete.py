@@ -52,6 +52,8 @@ class MockORMModels:
     WithdrawalMethod = WithdrawalMethod
     Bet = Bet
     AuditLog = AuditLog
+    UserBetStats = conftest.UserBetStats
+    ReportJob = conftest.ReportJob
 
 # Подменяем models.orm_models в sys.modules ПЕРЕД любым импортом
 # Удаляем из кэша, если уже был импортирован
@@ -73,6 +75,8 @@ class MockORMModelsModule:
     WithdrawalMethod = WithdrawalMethod
     Bet = Bet
     AuditLog = AuditLog
+    UserBetStats = conftest.UserBetStats
+    ReportJob = conftest.ReportJob
     MonthlyStatement = MonthlyStatement
 
 # Создаем мок-модуль для models
@@ -85,12 +89,18 @@ class MockModelsModule:
     WithdrawalMethod = WithdrawalMethod
     Bet = Bet
     AuditLog = AuditLog
+    UserBetStats = conftest.UserBetStats
+    ReportJob = conftest.ReportJob
     MonthlyStatement = MonthlyStatement
 
 # Подменяем модули
 sys.modules['models.orm_models'] = MockORMModelsModule()
 sys.modules['models'] = MockModelsModule()
 
+# Задания на отчёты - в тестовой таблице
+import services.report_service as report_module
+report_module.ReportJob = conftest.ReportJob
+
 # Импортируем WalletService после подмены
 WalletService = None
 
@@ -1,7 +1,7 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from api import get_events
-from services import manageSportEvents
+from services import manageSportEvents, loadOddsChanges
 
 app = Flask(__name__)
 CORS(app)
@@ -36,6 +36,17 @@ def create_event():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/odds/changes", methods=["GET"])
+def odds_changes():
+    """Дельта-фид коэффициентов (для кэша в модуле ставок)"""
+    try:
+        since = request.args.get("since")
+        after_id = int(request.args.get("after_id", 0))
+        limit = min(int(request.args.get("limit", 5000)), 20000)
+        return jsonify(loadOddsChanges(since=since, after_id=after_id, limit=limit))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/events/cleanup", methods=["POST"])
 def cleanup_old_events():
     """Удаляет старые события без home_team и away_team"""
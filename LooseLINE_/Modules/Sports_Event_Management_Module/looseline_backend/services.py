@@ -239,6 +239,64 @@ def updateCoefficients(odds_id, new_coefficient, admin_id, reason=None):
         "message": f"Коэффициент обновлён с {old} на {new_coefficient}"
     }
 
+# дельта-фид коэффициентов для модуля ставок
+
+def loadOddsChanges(since=None, after_id=None, limit=5000):
+    """Коэффициенты после курсора (updated_at, odds_id), по возрастанию курсора.
+
+    Модуль ставок держит локальный кэш коэффициентов и периодически
+    дотягивает изменения отсюда, а не ходит в этот сервис на каждую ставку.
+    Курсор составной: страница из строк с одним updated_at не останавливает
+    опрос. Строки без updated_at идут первыми ('-infinity') и приходят при
+    первой загрузке; новые коэффициенты пишутся уже с updated_at.
+
+    updated_at = NOW() - время начала транзакции, строка может закоммититься
+    позже строк с большим updated_at. Клиент фида перечитывает окно перед
+    курсором (ODDS_FEED_OVERLAP_SECONDS в модуле ставок). Удалённые строки
+    фид не отдаёт - клиент периодически перечитывает его целиком.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("SELECT NOW()")
+    server_time = cur.fetchone()[0]
+
+    if since:
+        cur.execute("""
+            SELECT odds_id, event_id, bet_type, coefficient, is_active, updated_at
+            FROM odds
+            WHERE (COALESCE(updated_at, '-infinity'), odds_id) > (%s::timestamp, %s)
+            ORDER BY COALESCE(updated_at, '-infinity'), odds_id
+            LIMIT %s
+        """, (since, after_id or 0, limit))
+    else:
+        cur.execute("""
+            SELECT odds_id, event_id, bet_type, coefficient, is_active, updated_at
+            FROM odds
+            ORDER BY COALESCE(updated_at, '-infinity'), odds_id
+            LIMIT %s
+        """, (limit,))
+    rows = cur.fetchall()
+
+    cur.close()
+    conn.close()
+
+    return {
+        "server_time": server_time.isoformat(),
+        "has_more": len(rows) == limit,
+        "odds": [
+            {
+                "odds_id": odds_id,
+                "event_id": event_id,
+                "bet_type": bet_type,
+                "coefficient": str(coefficient),
+                "is_active": bool(is_active) if is_active is not None else True,
+                "updated_at": updated_at.isoformat() if updated_at else None,
+            }
+            for odds_id, event_id, bet_type, coefficient, is_active, updated_at in rows
+        ],
+    }
+
 # 5 метод 
 
 from datetime import datetime
@@ -323,8 +381,8 @@ def manageSportEvents(action: str, admin_id: str = None, event_id: int = None, *
             created_odds = []
             for o in odds_data:
                 cur.execute("""
-                    INSERT INTO odds (event_id, bet_type, coefficient, is_active)
-                    VALUES (%s, %s, %s, TRUE)
+                    INSERT INTO odds (event_id, bet_type, coefficient, is_active, updated_at)
+                    VALUES (%s, %s, %s, TRUE, NOW())
                     RETURNING odds_id
                 """, (new_event_id, o["bet_type"], o["coefficient"]))
                 odds_id = cur.fetchone()[0]
@@ -0,0 +1,165 @@
+"""Initial betting schema (IDEMPOTENT)
+
+Baseline for databases created by init.sql or by the old startup
+create_all()/ALTER TABLE code: every statement is IF NOT EXISTS.
+
+Revision ID: 20251220_000001
+Revises:
+Create Date: 2025-12-20
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251220_000001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # === users ===
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id VARCHAR(50) PRIMARY KEY,
+            username VARCHAR(100),
+            email VARCHAR(255),
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+    # === users_balance ===
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS users_balance (
+            user_id VARCHAR(50) PRIMARY KEY REFERENCES users(id),
+            balance NUMERIC(15, 2) NOT NULL DEFAULT 0.00,
+            total_deposited NUMERIC(15, 2) DEFAULT 0.00,
+            total_withdrawn NUMERIC(15, 2) DEFAULT 0.00,
+            currency VARCHAR(3) DEFAULT 'USD',
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+    # === events / odds (локальная копия, основная в модуле Sports) ===
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            event_id SERIAL PRIMARY KEY,
+            event_name VARCHAR(255) NOT NULL,
+            event_date TIMESTAMP,
+            status VARCHAR(20) DEFAULT 'scheduled',
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS odds (
+            odds_id SERIAL PRIMARY KEY,
+            event_id INTEGER NOT NULL REFERENCES events(event_id),
+            bet_type VARCHAR(10) NOT NULL,
+            coefficient NUMERIC(10, 2) NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+    # === bets (без FK на users/events/odds - они живут в других модулях) ===
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS bets (
+            bet_id SERIAL PRIMARY KEY,
+            user_id VARCHAR(50) NOT NULL,
+            event_id INTEGER NOT NULL,
+            event_name VARCHAR(255),
+            event_end_date TIMESTAMP,
+            expected_result VARCHAR(10),
+            odds_id INTEGER,
+            bet_type VARCHAR(10),
+            bet_amount NUMERIC(15, 2) NOT NULL,
+            coefficient NUMERIC(10, 2) NOT NULL,
+            potential_win NUMERIC(15, 2) NOT NULL,
+            status VARCHAR(20) DEFAULT 'open',
+            result VARCHAR(20),
+            actual_win NUMERIC(15, 2),
+            placed_at TIMESTAMP DEFAULT NOW(),
+            resolved_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    # Колонки, которые раньше добавлялись ALTER TABLE при каждом старте приложения.
+    # Nullable без DEFAULT - в PostgreSQL это изменение только метаданных.
+    op.execute("ALTER TABLE bets ADD COLUMN IF NOT EXISTS event_name VARCHAR(255)")
+    op.execute("ALTER TABLE bets ADD COLUMN IF NOT EXISTS event_end_date TIMESTAMP")
+    op.execute("ALTER TABLE bets ADD COLUMN IF NOT EXISTS expected_result VARCHAR(10)")
+    op.execute('CREATE INDEX IF NOT EXISTS idx_bets_user_id ON bets (user_id)')
+    op.execute('CREATE INDEX IF NOT EXISTS idx_bets_event_id ON bets (event_id)')
+    op.execute('CREATE INDEX IF NOT EXISTS idx_bets_status ON bets (status)')
+
+    # === coupons ===
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS coupons (
+            coupon_id SERIAL PRIMARY KEY,
+            user_id VARCHAR(50) NOT NULL REFERENCES users(id),
+            coupon_code VARCHAR(20) UNIQUE NOT NULL,
+            total_bet_amount NUMERIC(15, 2) NOT NULL,
+            total_potential_win NUMERIC(15, 2) NOT NULL,
+            status VARCHAR(20) DEFAULT 'open',
+            result VARCHAR(20),
+            actual_win NUMERIC(15, 2),
+            number_of_bets INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            resolved_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    op.execute('CREATE INDEX IF NOT EXISTS idx_coupons_user_id ON coupons (user_id)')
+
+    # === coupon_bets ===
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS coupon_bets (
+            coupon_bet_id SERIAL PRIMARY KEY,
+            coupon_id INTEGER NOT NULL REFERENCES coupons(coupon_id),
+            bet_id INTEGER NOT NULL REFERENCES bets(bet_id)
+        )
+    """)
+    op.execute('CREATE INDEX IF NOT EXISTS idx_coupon_bets_coupon_id ON coupon_bets (coupon_id)')
+
+    # === bet_transactions ===
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS bet_transactions (
+            transaction_id SERIAL PRIMARY KEY,
+            user_id VARCHAR(50) NOT NULL REFERENCES users(id),
+            bet_id INTEGER REFERENCES bets(bet_id),
+            transaction_type VARCHAR(20) NOT NULL,
+            amount NUMERIC(15, 2) NOT NULL,
+            balance_before NUMERIC(15, 2),
+            balance_after NUMERIC(15, 2),
+            description TEXT,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    op.execute('CREATE INDEX IF NOT EXISTS idx_bet_transactions_user_id ON bet_transactions (user_id)')
+    op.execute('CREATE INDEX IF NOT EXISTS idx_bet_transactions_bet_id ON bet_transactions (bet_id)')
+
+    # === bet_results ===
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS bet_results (
+            result_id SERIAL PRIMARY KEY,
+            event_id INTEGER NOT NULL REFERENCES events(event_id),
+            winning_bet_type VARCHAR(10),
+            home_score INTEGER,
+            away_score INTEGER,
+            resolved_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP TABLE IF EXISTS bet_results CASCADE')
+    op.execute('DROP TABLE IF EXISTS bet_transactions CASCADE')
+    op.execute('DROP TABLE IF EXISTS coupon_bets CASCADE')
+    op.execute('DROP TABLE IF EXISTS coupons CASCADE')
+    op.execute('DROP TABLE IF EXISTS bets CASCADE')
+    op.execute('DROP TABLE IF EXISTS odds CASCADE')
+    op.execute('DROP TABLE IF EXISTS events CASCADE')
+    op.execute('DROP TABLE IF EXISTS users_balance CASCADE')
+    op.execute('DROP TABLE IF EXISTS users CASCADE')
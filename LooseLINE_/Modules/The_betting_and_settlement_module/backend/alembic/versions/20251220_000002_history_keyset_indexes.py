@@ -0,0 +1,49 @@
+"""Composite indexes for keyset-paginated history (CONCURRENTLY)
+
+Revision ID: 20251220_000002
+Revises: 20251220_000001
+Create Date: 2025-12-20
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251220_000002'
+down_revision = '20251220_000001'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("idx_bets_user_placed", "bets (user_id, placed_at DESC, bet_id DESC)"),
+    ("idx_coupons_user_created", "coupons (user_id, created_at DESC, coupon_id DESC)"),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY не блокирует запись в bets, но не может
+    # выполняться внутри транзакции - поэтому autocommit_block.
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            # Прерванный CONCURRENTLY оставляет невалидный индекс - удаляем его,
+            # иначе IF NOT EXISTS молча оставит сломанный индекс.
+            op.execute(f"""
+                DO $$
+                BEGIN
+                    IF EXISTS (
+                        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                        WHERE c.relname = '{name}' AND NOT i.indisvalid
+                    ) THEN
+                        EXECUTE 'DROP INDEX {name}';
+                    END IF;
+                END $$;
+            """)
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
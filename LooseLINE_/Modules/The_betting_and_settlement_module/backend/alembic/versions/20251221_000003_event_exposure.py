@@ -0,0 +1,36 @@
+"""Per-event/outcome exposure counters
+
+Revision ID: 20251221_000003
+Revises: 20251220_000002
+Create Date: 2025-12-21
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251221_000003'
+down_revision = '20251220_000002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS event_exposure (
+            event_id INTEGER NOT NULL,
+            bet_type VARCHAR(10) NOT NULL,
+            open_bets INTEGER NOT NULL DEFAULT 0,
+            total_stake NUMERIC(15, 2) NOT NULL DEFAULT 0,
+            total_payout NUMERIC(15, 2) NOT NULL DEFAULT 0,
+            coupon_payout NUMERIC(15, 2) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (event_id, bet_type)
+        )
+    """)
+    # Счётчики заполняются из открытых ставок: python -m app.exposure rebuild
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS event_exposure")
@@ -0,0 +1,36 @@
+"""Idempotency keys for bet/coupon creation
+
+Revision ID: 20251222_000004
+Revises: 20251221_000003
+Create Date: 2025-12-22
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251222_000004'
+down_revision = '20251221_000003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            scope VARCHAR(20) NOT NULL,
+            idem_key VARCHAR(100) NOT NULL,
+            request_hash VARCHAR(64) NOT NULL,
+            status_code INTEGER,
+            response_body TEXT,
+            created_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (scope, idem_key)
+        )
+    """)
+    # Для периодической очистки старых ключей
+    op.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys(created_at)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS idempotency_keys")
@@ -0,0 +1,25 @@
+"""Node-id sequence for the coupon code generator
+
+Revision ID: 20251223_000005
+Revises: 20251222_000004
+Create Date: 2025-12-23
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251223_000005'
+down_revision = '20251222_000004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Каждый процесс API берёт отсюда номер узла один раз при первом коде
+    op.execute("CREATE SEQUENCE IF NOT EXISTS reference_node_seq")
+
+
+def downgrade() -> None:
+    op.execute("DROP SEQUENCE IF EXISTS reference_node_seq")
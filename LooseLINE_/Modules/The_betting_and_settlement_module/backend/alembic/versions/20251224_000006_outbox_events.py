@@ -0,0 +1,39 @@
+"""Transactional outbox for bet lifecycle events
+
+Revision ID: 20251224_000006
+Revises: 20251223_000005
+Create Date: 2025-12-24
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251224_000006'
+down_revision = '20251223_000005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS outbox_events (
+            id BIGSERIAL PRIMARY KEY,
+            aggregate_type VARCHAR(20) NOT NULL DEFAULT 'bet',
+            aggregate_id INTEGER NOT NULL,
+            event_type VARCHAR(50) NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            published_at TIMESTAMP
+        )
+    """)
+    # Частичный индекс: остаётся маленьким, сколько бы событий ни было опубликовано
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_unpublished
+        ON outbox_events (id) WHERE published_at IS NULL
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS outbox_events")
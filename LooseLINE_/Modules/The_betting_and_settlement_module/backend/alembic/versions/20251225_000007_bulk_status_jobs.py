@@ -0,0 +1,59 @@
+"""Bulk bet status jobs and bets(event_id, status) index
+
+Revision ID: 20251225_000007
+Revises: 20251224_000006
+Create Date: 2025-12-25
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251225_000007'
+down_revision = '20251224_000006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS bulk_status_jobs (
+            job_id VARCHAR(36) PRIMARY KEY,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            event_id INTEGER,
+            bet_ids TEXT,
+            new_status VARCHAR(20) NOT NULL,
+            reason TEXT,
+            total INTEGER NOT NULL DEFAULT 0,
+            updated INTEGER NOT NULL DEFAULT 0,
+            refunded INTEGER NOT NULL DEFAULT 0,
+            refunded_amount NUMERIC(15, 2) NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT NOW(),
+            finished_at TIMESTAMP
+        )
+    """)
+    # Выбор ставок события для void без полного скана bets. CONCURRENTLY не
+    # блокирует запись в bets, но не работает в транзакции - autocommit_block.
+    with op.get_context().autocommit_block():
+        # Прерванный CONCURRENTLY оставляет невалидный индекс - удаляем его,
+        # иначе IF NOT EXISTS молча оставит сломанный индекс.
+        op.execute("""
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = 'idx_bets_event_status' AND NOT i.indisvalid
+                ) THEN
+                    EXECUTE 'DROP INDEX idx_bets_event_status';
+                END IF;
+            END $$;
+        """)
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bets_event_status ON bets(event_id, status, bet_id)")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_bets_event_status")
+    op.execute("DROP TABLE IF EXISTS bulk_status_jobs")
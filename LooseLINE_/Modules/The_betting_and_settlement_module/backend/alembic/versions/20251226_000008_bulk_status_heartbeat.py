@@ -0,0 +1,26 @@
+"""Heartbeat of bulk status jobs (resume after restart)
+
+Revision ID: 20251226_000008
+Revises: 20251225_000007
+Create Date: 2025-12-26
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251226_000008'
+down_revision = '20251225_000007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Время последней пачки: задание без движения дольше BULK_STATUS_STALE_SECONDS
+    # потеряло исполнителя и подхватывается при старте
+    op.execute("ALTER TABLE bulk_status_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE bulk_status_jobs DROP COLUMN IF EXISTS heartbeat_at")
@@ -0,0 +1,26 @@
+"""Skipped counter of bulk status jobs
+
+Revision ID: 20251227_000009
+Revises: 20251226_000008
+Create Date: 2025-12-27
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251227_000009'
+down_revision = '20251226_000008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Ставки выбора не в исходном статусе (рассчитанные, выкупленные и т.п.) -
+    # задание их не меняет, а показывает количество
+    op.execute("ALTER TABLE bulk_status_jobs ADD COLUMN IF NOT EXISTS skipped INTEGER NOT NULL DEFAULT 0")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE bulk_status_jobs DROP COLUMN IF EXISTS skipped")
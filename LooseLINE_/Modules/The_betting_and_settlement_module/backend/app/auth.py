@@ -0,0 +1,21 @@
+"""
+Служебные эндпоинты (массовая смена статусов и т.п.): общий секрет в заголовке
+X-Admin-Token.
+
+Настройки:
+  ADMIN_API_TOKEN  - секрет; пусто - служебные эндпоинты закрыты (503)
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException, status
+
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+  if not ADMIN_API_TOKEN:
+    raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Admin API is not configured")
+  if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
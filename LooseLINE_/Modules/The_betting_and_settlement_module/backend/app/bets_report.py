@@ -0,0 +1,244 @@
+"""
+Операционные отчёты по таблице bets (замена view_bets.py).
+
+  python -m app.bets_report rows [фильтры] [--limit N] [--format table|csv|ndjson]
+  python -m app.bets_report agg --by event|outcome|hour [фильтры] [--format ...]
+
+Фильтры: --user, --event, --status, --from, --to (по placed_at, ISO-дата/время).
+
+Строки читаются курсором на стороне сервера (stream_results + yield_per:
+в PostgreSQL это именованный курсор psycopg2) и сразу пишутся в вывод -
+память не зависит от размера выборки. Агрегаты считает GROUP BY в базе,
+их результат тоже стримится. Формат table печатает колонки фиксированной
+ширины, чтобы не держать строки ради выравнивания; итог (COUNT/SUM)
+накапливается по ходу вывода.
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterator, List, Optional, Sequence, TextIO
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+
+from . import models
+
+STREAM_CHUNK = 5000
+
+ROW_COLUMNS = (
+  "bet_id", "user_id", "event_id", "event_name", "event_end_date", "bet_type",
+  "bet_amount", "coefficient", "potential_win", "status", "result", "actual_win", "placed_at",
+)
+
+AGGREGATES = ("bets", "total_stake", "avg_coefficient", "total_potential_win", "total_actual_win")
+
+# Ширина колонок формата table; длинные значения обрезаются
+TABLE_WIDTHS = {
+  "bet_id": 10, "user_id": 20, "event_id": 9, "event_name": 30, "event_end_date": 19,
+  "bet_type": 4, "bet_amount": 12, "coefficient": 7, "potential_win": 13, "status": 9,
+  "result": 8, "actual_win": 12, "placed_at": 19, "hour": 19, "bets": 10,
+  "total_stake": 16, "avg_coefficient": 8, "total_potential_win": 16, "total_actual_win": 16,
+}
+
+
+def _filters(stmt, args):
+  bet = models.Bet
+  if args.user:
+    stmt = stmt.where(bet.user_id == args.user)
+  if args.event is not None:
+    stmt = stmt.where(bet.event_id == args.event)
+  if args.status:
+    stmt = stmt.where(bet.status == args.status)
+  if args.date_from:
+    stmt = stmt.where(bet.placed_at >= args.date_from)
+  if args.date_to:
+    stmt = stmt.where(bet.placed_at <= args.date_to)
+  return stmt
+
+
+def _hour_bucket(conn: Connection):
+  if conn.dialect.name == "postgresql":
+    return func.date_trunc("hour", models.Bet.placed_at)
+  return func.strftime("%Y-%m-%d %H:00:00", models.Bet.placed_at)
+
+
+def rows_query(args):
+  bet = models.Bet
+  order = bet.placed_at.desc() if args.order == "desc" else bet.placed_at.asc()
+  stmt = _filters(select(*(getattr(bet, c) for c in ROW_COLUMNS)), args)
+  stmt = stmt.order_by(order, bet.bet_id.desc() if args.order == "desc" else bet.bet_id.asc())
+  if args.limit:
+    stmt = stmt.limit(args.limit)
+  return ROW_COLUMNS, stmt
+
+
+def agg_query(args, conn: Connection):
+  bet = models.Bet
+  if args.by == "event":
+    keys = ("event_id", "event_name")
+    group = [bet.event_id]
+    key_exprs = [bet.event_id, func.max(bet.event_name)]
+  elif args.by == "outcome":
+    keys = ("event_id", "bet_type")
+    group = [bet.event_id, bet.bet_type]
+    key_exprs = group
+  else:
+    keys = ("hour",)
+    group = [_hour_bucket(conn)]
+    key_exprs = group
+
+  stmt = _filters(select(
+    *key_exprs,
+    func.count(bet.bet_id),
+    func.coalesce(func.sum(bet.bet_amount), 0),
+    func.avg(bet.coefficient),
+    func.coalesce(func.sum(bet.potential_win), 0),
+    func.coalesce(func.sum(bet.actual_win), 0),
+  ), args).group_by(*group).order_by(*group)
+  return keys + AGGREGATES, stmt
+
+
+def stream(conn: Connection, stmt, chunk_size: int = STREAM_CHUNK) -> Iterator[tuple]:
+  """Строки по одной, без полной выборки: курсор на стороне сервера, пачками chunk_size."""
+  result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+  try:
+    for row in result:
+      yield tuple(row)
+  finally:
+    result.close()
+
+
+# ---------- вывод ----------
+
+def _text(value) -> str:
+  if value is None:
+    return ""
+  if isinstance(value, datetime):
+    return value.isoformat(sep=" ", timespec="seconds")
+  if isinstance(value, Decimal):
+    return str(value.quantize(Decimal("0.01")) if value.as_tuple().exponent < -2 else value)
+  if isinstance(value, float):
+    return f"{value:.2f}"
+  return str(value)
+
+
+def _json_value(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  if isinstance(value, (Decimal, float)):
+    return _text(value)
+  return value
+
+
+def write_table(out: TextIO, columns: Sequence[str], rows: Iterator[tuple]) -> int:
+  widths = [TABLE_WIDTHS.get(c, 12) for c in columns]
+  fmt = lambda values: " ".join(v[:w].ljust(w) for v, w in zip(values, widths)).rstrip()
+  out.write(fmt(columns) + "\n")
+  out.write(" ".join("-" * w for w in widths) + "\n")
+  count = 0
+  for row in rows:
+    out.write(fmt([_text(v) for v in row]) + "\n")
+    count += 1
+  return count
+
+
+def write_csv(out: TextIO, columns: Sequence[str], rows: Iterator[tuple]) -> int:
+  writer = csv.writer(out)
+  writer.writerow(columns)
+  count = 0
+  for row in rows:
+    writer.writerow([_text(v) for v in row])
+    count += 1
+  return count
+
+
+def write_ndjson(out: TextIO, columns: Sequence[str], rows: Iterator[tuple]) -> int:
+  count = 0
+  for row in rows:
+    out.write(json.dumps({c: _json_value(v) for c, v in zip(columns, row)}, ensure_ascii=False) + "\n")
+    count += 1
+  return count
+
+
+WRITERS = {"table": write_table, "csv": write_csv, "ndjson": write_ndjson}
+
+
+class _Totals:
+  """COUNT/SUM(bet_amount) по ходу вывода строк - без второго запроса."""
+
+  def __init__(self, rows: Iterator[tuple], amount_index: int):
+    self.rows = rows
+    self.amount_index = amount_index
+    self.count = 0
+    self.amount = Decimal("0")
+
+  def __iter__(self):
+    for row in self.rows:
+      self.count += 1
+      self.amount += Decimal(row[self.amount_index] or 0)
+      yield row
+
+
+def run(conn: Connection, args, out: TextIO = sys.stdout, err: TextIO = sys.stderr) -> int:
+  if args.command == "rows":
+    columns, stmt = rows_query(args)
+  else:
+    columns, stmt = agg_query(args, conn)
+
+  rows = stream(conn, stmt, args.chunk_size)
+  totals = None
+  if args.command == "rows":
+    totals = _Totals(rows, columns.index("bet_amount"))
+    rows = iter(totals)
+
+  written = WRITERS[args.format](out, columns, rows)
+  if totals is not None and args.format == "table":
+    err.write(f"bets: {totals.count}  total stake: {totals.amount}\n")
+  return written
+
+
+# ---------- CLI ----------
+
+def _datetime(value: str) -> datetime:
+  return datetime.fromisoformat(value)
+
+
+def build_parser() -> argparse.ArgumentParser:
+  common = argparse.ArgumentParser(add_help=False)
+  common.add_argument("--user", help="user_id")
+  common.add_argument("--event", type=int, help="event_id")
+  common.add_argument("--status", choices=("open", "cancelled", "resolved", "cashout"))
+  common.add_argument("--from", dest="date_from", type=_datetime, help="placed_at >= (ISO)")
+  common.add_argument("--to", dest="date_to", type=_datetime, help="placed_at <= (ISO)")
+  common.add_argument("--format", choices=tuple(WRITERS), default="table")
+  common.add_argument("--chunk-size", type=int, default=STREAM_CHUNK, help="rows per server-side fetch")
+
+  parser = argparse.ArgumentParser(prog="python -m app.bets_report", description="Betting DB reports")
+  sub = parser.add_subparsers(dest="command", required=True)
+
+  rows = sub.add_parser("rows", parents=[common], help="stream bets")
+  rows.add_argument("--limit", type=int, help="at most N rows (default: all)")
+  rows.add_argument("--order", choices=("desc", "asc"), default="desc", help="by placed_at")
+
+  agg = sub.add_parser("agg", parents=[common], help="aggregates")
+  agg.add_argument("--by", choices=("event", "outcome", "hour"), required=True)
+  return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+  from .db import engine
+
+  args = build_parser().parse_args(argv)
+  try:
+    with engine.connect() as conn:
+      run(conn, args)
+  except BrokenPipeError:
+    # | head - читатель закрыл pipe, это не ошибка
+    sys.stderr.close()
+
+
+if __name__ == "__main__":
+  main()
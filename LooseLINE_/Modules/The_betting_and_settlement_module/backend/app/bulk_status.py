@@ -0,0 +1,269 @@
+"""
+Массовая смена статуса ставок: void отменённого или перенесённого события,
+отмена списка ставок и т.п.
+
+Выбор - ставки события (event_id) либо список bet_id, но только в исходных
+статусах целевого (SOURCE_STATUSES): void снимает лишь открытые ставки,
+возврат в open - лишь отменённые; рассчитанные и выкупленные ставки не
+трогаются и попадают в счётчик skipped задания. Ставки обрабатываются пачками по BULK_STATUS_CHUNK_SIZE по
+возрастанию bet_id, каждая пачка - своя транзакция:
+  - SELECT ... FOR UPDATE пачки и один UPDATE bets SET status на всю пачку;
+  - exposure снимается/возвращается агрегатом по исходам (exposure.track_bets);
+  - при void (cancelled) открытой ставки - возврат ставки: проводка 'refund'
+    в bet_transactions и зачисление на баланс, только если ставка была
+    списана (проводка 'bet_placed') и ещё не возвращена. В DEMO MODE
+    create_bet ставки не списывает - возвратов нет;
+  - события в outbox одним INSERT;
+  - счётчики задания (bulk_status_jobs) - в той же транзакции, поэтому
+    прогресс всегда соответствует закоммиченным ставкам.
+
+До BULK_STATUS_SYNC_LIMIT ставок задание выполняется прямо в запросе,
+больше - в фоне, а клиент опрашивает GET /bets/status/bulk/{job_id}.
+
+Каждая пачка обновляет heartbeat_at. Задание queued/running без движения
+дольше BULK_STATUS_STALE_SECONDS (процесс упал или перезапустился)
+подхватывается при старте приложения (resume_stale_jobs) и проходит выбор
+заново: ставки с целевым статусом уже не в исходном, повтор безопасен.
+"""
+import json
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import List, Optional
+
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import exposure, models, outbox
+
+logger = logging.getLogger(__name__)
+
+BULK_STATUS_CHUNK_SIZE = int(os.getenv("BULK_STATUS_CHUNK_SIZE", "1000"))
+BULK_STATUS_SYNC_LIMIT = int(os.getenv("BULK_STATUS_SYNC_LIMIT", "1000"))
+BULK_STATUS_STALE_SECONDS = int(os.getenv("BULK_STATUS_STALE_SECONDS", "300"))
+
+ACTIVE_STATUSES = ("queued", "running")
+# Целевой статус -> статусы, из которых в него переводятся ставки
+SOURCE_STATUSES = {
+  "cancelled": ("open",),
+  "open": ("cancelled",),
+}
+BULK_STATUSES = tuple(SOURCE_STATUSES)
+STAKE_TYPE = "bet_placed"
+REFUND_TYPE = "refund"
+ZERO = Decimal("0")
+
+
+def _selection(stmt, job: models.BulkStatusJob, bet_ids: Optional[List[int]] = None):
+  bet = models.Bet
+  if job.event_id is not None:
+    return stmt.where(bet.event_id == job.event_id)
+  return stmt.where(bet.bet_id.in_(bet_ids if bet_ids is not None else json.loads(job.bet_ids)))
+
+
+def _targets(stmt, job: models.BulkStatusJob, bet_ids: Optional[List[int]] = None):
+  return _selection(stmt, job, bet_ids).where(models.Bet.status.in_(SOURCE_STATUSES[job.new_status]))
+
+
+def create_job(db: Session, *, event_id: Optional[int], bet_ids: Optional[List[int]],
+               new_status: str, reason: Optional[str]) -> models.BulkStatusJob:
+  if new_status not in BULK_STATUSES:
+    # Расчёт (resolved) требует исхода каждой ставки - см. crud.update_bet_status
+    raise ValueError(f"Bulk status change supports only {BULK_STATUSES}")
+  job = models.BulkStatusJob(
+    job_id=str(uuid.uuid4()),
+    event_id=event_id,
+    bet_ids=json.dumps(sorted(set(bet_ids))) if bet_ids else None,
+    new_status=new_status,
+    reason=reason,
+  )
+  bet = models.Bet
+  job.total, job.skipped = db.execute(_selection(select(
+    func.count(case((bet.status.in_(SOURCE_STATUSES[new_status]), 1))),
+    func.count(case((bet.status.notin_(SOURCE_STATUSES[new_status]), 1))),
+  ), job)).one()
+  db.add(job)
+  db.commit()
+  db.refresh(job)
+  return job
+
+
+def get_job(db: Session, job_id: str) -> Optional[models.BulkStatusJob]:
+  return db.get(models.BulkStatusJob, job_id, populate_existing=True)
+
+
+def _refundable(db: Session, bets: list) -> list:
+  """Ставки, списанные с баланса (bet_placed) и ещё не возвращённые."""
+  tx = models.BetTransaction
+  net = (
+    func.sum(case((tx.transaction_type == STAKE_TYPE, 1), else_=0))
+    - func.sum(case((tx.transaction_type == REFUND_TYPE, 1), else_=0))
+  )
+  debited = set(db.scalars(
+    select(tx.bet_id)
+    .where(tx.bet_id.in_([bet.bet_id for bet in bets]), tx.transaction_type.in_((STAKE_TYPE, REFUND_TYPE)))
+    .group_by(tx.bet_id)
+    .having(net > 0)
+  ))
+  return [bet for bet in bets if bet.bet_id in debited]
+
+
+def _refund(db: Session, bets: list, reason: Optional[str], now: datetime) -> Decimal:
+  by_user = defaultdict(list)
+  for bet in bets:
+    by_user[bet.user_id].append(bet)
+  balances = {
+    b.user_id: b for b in db.scalars(
+      select(models.UserBalance).where(models.UserBalance.user_id.in_(list(by_user))).with_for_update()
+    )
+  }
+
+  ledger, total = [], ZERO
+  for user_id, user_bets in by_user.items():
+    balance = balances.get(user_id)
+    current = Decimal(balance.balance) if balance else ZERO
+    for bet in user_bets:
+      amount = Decimal(bet.bet_amount)
+      ledger.append({
+        "user_id": user_id,
+        "bet_id": bet.bet_id,
+        "transaction_type": REFUND_TYPE,
+        "amount": amount,
+        "balance_before": current,
+        "balance_after": current + amount,
+        "description": f"Refund of voided bet #{bet.bet_id}" + (f": {reason}" if reason else ""),
+        "created_at": now,
+      })
+      current += amount
+      total += amount
+    if balance:
+      balance.balance = current
+      balance.updated_at = now
+
+  db.execute(insert(models.BetTransaction), ledger)
+  return total
+
+
+def _apply_chunk(db: Session, job: models.BulkStatusJob, after_id: int, chunk_size: int,
+                 bet_ids: Optional[List[int]] = None) -> Optional[int]:
+  """
+  Одна пачка в одной транзакции; возвращает bet_id, после которого брать
+  следующую, или None, если ставок не осталось. Для выбора по списку пачка -
+  очередной срез списка (часть ставок в нём может быть не в исходном статусе).
+  """
+  bet = models.Bet
+  window = None
+  if bet_ids is not None:
+    window = [i for i in bet_ids if i > after_id][:chunk_size]
+    if not window:
+      return None
+  rows = db.execute(
+    _targets(select(bet.__table__), job, window)
+    .where(bet.bet_id > after_id)
+    .order_by(bet.bet_id)
+    .limit(chunk_size)
+    .with_for_update()
+  ).all()
+  if not rows:
+    return window[-1] if window else None
+
+  new_status, now = job.new_status, datetime.utcnow()
+  db.execute(
+    update(bet)
+    .where(bet.bet_id.in_([r.bet_id for r in rows]))
+    .values(status=new_status, updated_at=now)
+    .execution_options(synchronize_session=False)
+  )
+
+  if new_status == "open":
+    exposure.track_bets(db, rows, sign=1)
+  else:
+    was_open = [r for r in rows if r.status == "open"]
+    exposure.track_bets(db, was_open, sign=-1)
+    refundable = _refundable(db, was_open) if new_status == "cancelled" and was_open else []
+    if refundable:
+      job.refunded_amount = Decimal(job.refunded_amount or 0) + _refund(db, refundable, job.reason, now)
+      job.refunded = (job.refunded or 0) + len(refundable)
+
+  outbox.record_bet_events(
+    db,
+    outbox.status_event_type(new_status),
+    [SimpleNamespace(**{**r._mapping, "status": new_status}) for r in rows],
+    [{"previous_status": r.status, "reason": job.reason} for r in rows],
+  )
+
+  job.updated = (job.updated or 0) + len(rows)
+  job.heartbeat_at = now
+  db.commit()
+  return window[-1] if window else rows[-1].bet_id
+
+
+def run_job(db: Session, job_id: str, chunk_size: int = BULK_STATUS_CHUNK_SIZE) -> models.BulkStatusJob:
+  job = get_job(db, job_id)
+  job.status = "running"
+  job.heartbeat_at = datetime.utcnow()
+  db.commit()
+  bet_ids = json.loads(job.bet_ids) if job.bet_ids else None
+  try:
+    after_id = 0
+    while after_id is not None:
+      after_id = _apply_chunk(db, job, after_id, chunk_size, bet_ids)
+    job.status = "done"
+  except Exception as e:
+    # Закоммиченные пачки остаются применёнными; повторный запрос с тем же
+    # выбором обработает оставшиеся ставки
+    db.rollback()
+    logger.exception("bulk status job %s failed", job_id)
+    job.status = "failed"
+    job.error = str(e)
+  job.finished_at = datetime.utcnow()
+  db.commit()
+  db.refresh(job)
+  return job
+
+
+def run_job_in_background(job_id: str) -> None:
+  from .db import SessionLocal
+
+  with SessionLocal() as db:
+    run_job(db, job_id)
+
+
+def claim_stale_jobs(db: Session, now: Optional[datetime] = None) -> List[str]:
+  """
+  Забирает брошенные задания: queued/running, последняя пачка (или создание)
+  раньше BULK_STATUS_STALE_SECONDS. Условный UPDATE heartbeat_at - при
+  нескольких воркерах каждое задание достаётся одному.
+  """
+  now = now or datetime.utcnow()
+  job = models.BulkStatusJob
+  stale = (
+    job.status.in_(ACTIVE_STATUSES),
+    func.coalesce(job.heartbeat_at, job.created_at) < now - timedelta(seconds=BULK_STATUS_STALE_SECONDS),
+  )
+  claimed = []
+  for job_id in db.scalars(select(job.job_id).where(*stale).order_by(job.created_at)).all():
+    if db.execute(update(job).where(job.job_id == job_id, *stale).values(heartbeat_at=now)).rowcount:
+      claimed.append(job_id)
+  db.commit()
+  return claimed
+
+
+def resume_stale_jobs() -> int:
+  """Дорабатывает брошенные задания (вызывается при старте приложения)."""
+  from .db import SessionLocal
+
+  try:
+    with SessionLocal() as db:
+      job_ids = claim_stale_jobs(db)
+  except Exception as e:
+    logger.warning("bulk status: stale jobs check failed: %s", e)
+    return 0
+  for job_id in job_ids:
+    logger.warning("bulk status job %s: resuming after restart", job_id)
+    run_job_in_background(job_id)
+  return len(job_ids)
@@ -0,0 +1,293 @@
+"""
+Cash-out: досрочный расчёт открытых ставок и купонов по текущим коэффициентам.
+
+Цена берётся из локального кэша коэффициентов (odds_cache), без запросов в
+sports-модуль:
+  ставка  - bet_amount * коэффициент_при_приёме / текущий_коэффициент
+  купон   - total_bet_amount * П(коэф. при приёме) / П(текущие коэф. открытых ног);
+            сыгравшая нога входит с текущим коэффициентом 1, возвращённая
+            (cancelled) выпадает из обоих произведений, проигравшая - cash-out нет
+  затем минус маржа CASHOUT_MARGIN, вниз до копеек и не больше потенциального выигрыша.
+
+Котировка пользователя - два запроса колонок (открытые ставки, ноги открытых
+купонов) и один проход по ним: текущий коэффициент каждого odds_id ищется в
+кэше один раз на котировку. Версия кэша (odds_cache.version) отдаётся клиенту:
+сменилась - коэффициенты сдвинулись, котировку пора запросить заново.
+
+Ставка-нога открытого купона отдельно не выкупается: её статус cashout купон
+считал бы проигравшей ногой. Такие ставки не котируются, принятие - ошибка
+coupon_leg; выкупить можно только купон целиком.
+
+Принятие (accept_*) пересчитывает цену под блокировкой строки и в одной
+транзакции закрывает ставку/купон, пишет проводку в bet_transactions,
+зачисляет баланс (строки user_balances нет - cash-out отклоняется), снимает
+exposure и пишет событие в outbox (bet.cashed_out / coupon.cashed_out).
+
+DEMO MODE: create_bet не списывает ставку с баланса (см. crud.create_bet),
+поэтому сумма cash-out зачисляется на баланс, с которого ставка не
+уходила. Зачисление от этого не зависит и останется верным, когда списание
+ставок включат.
+
+Настройки:
+  CASHOUT_MARGIN  - доля, удерживаемая с честной цены (по умолчанию 0.05)
+"""
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import ROUND_DOWN, Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from . import exposure, models, outbox
+from .odds_cache import OddsCache, odds_cache
+
+CASHOUT_MARGIN = Decimal(os.getenv("CASHOUT_MARGIN", "0.05"))
+
+CENT = Decimal("0.01")
+ONE = Decimal("1")
+ZERO = Decimal("0")
+
+CASHOUT_STATUS = "cashout"
+
+# Причины, по которым cash-out сейчас недоступен
+ODDS_UNAVAILABLE = "odds_unavailable"
+ODDS_SUSPENDED = "odds_suspended"
+LEG_LOST = "leg_lost"
+COUPON_LEG = "coupon_leg"
+
+
+class CashoutError(ValueError):
+  """Cash-out отклонён: ставка недоступна или цена изменилась."""
+
+  def __init__(self, code: str, message: str, *, current: Optional[Decimal] = None):
+    super().__init__(message)
+    self.code = code
+    self.current = current
+
+  def to_detail(self) -> dict:
+    return {
+      "code": self.code,
+      "message": str(self),
+      "current_amount": str(self.current) if self.current is not None else None,
+    }
+
+
+@dataclass
+class Quote:
+  kind: str  # 'bet' | 'coupon'
+  id: int
+  stake: Decimal
+  potential_win: Decimal
+  amount: Optional[Decimal]  # None - cash-out недоступен
+  reason: Optional[str] = None
+  legs: List[int] = field(default_factory=list)  # odds_id, по которым посчитана цена
+
+
+class _OddsLookup:
+  """Текущие коэффициенты для одной котировки: каждый odds_id - один поиск в кэше."""
+
+  def __init__(self, cache: OddsCache):
+    self.cache = cache
+    self.fresh = cache.is_fresh()
+    self._seen: Dict[int, Tuple[Optional[Decimal], Optional[str]]] = {}
+
+  def __call__(self, odds_id: Optional[int]) -> Tuple[Optional[Decimal], Optional[str]]:
+    hit = self._seen.get(odds_id)
+    if hit is None:
+      snap = self.cache.get(odds_id) if self.fresh and odds_id is not None else None
+      if self.fresh and self.cache.is_suspended(odds_id):
+        hit = (None, ODDS_SUSPENDED)
+      elif snap is None:
+        hit = (None, ODDS_UNAVAILABLE)
+      else:
+        hit = (snap.coefficient, None)
+      self._seen[odds_id] = hit
+    return hit
+
+
+def _apply_margin(fair: Decimal, cap: Decimal, margin: Decimal) -> Decimal:
+  return min(fair * (ONE - margin), cap).quantize(CENT, rounding=ROUND_DOWN)
+
+
+# ---------- цены ----------
+
+def price_bets(rows: Iterable[tuple], lookup: _OddsLookup, margin: Decimal = CASHOUT_MARGIN) -> List[Quote]:
+  """rows: (bet_id, odds_id, bet_amount, coefficient, potential_win)."""
+  quotes = []
+  for bet_id, odds_id, stake, placed, payout in rows:
+    stake, payout = Decimal(stake), Decimal(payout)
+    current, reason = lookup(odds_id)
+    amount = None
+    if current is not None:
+      amount = _apply_margin(stake * Decimal(placed) / current, payout, margin)
+    quotes.append(Quote("bet", bet_id, stake, payout, amount, reason, [odds_id]))
+  return quotes
+
+
+def price_coupons(rows: Iterable[tuple], lookup: _OddsLookup, margin: Decimal = CASHOUT_MARGIN) -> List[Quote]:
+  """rows: (coupon_id, total_bet_amount, total_potential_win, odds_id, coefficient, status, result), по ногам."""
+  legs: Dict[int, list] = defaultdict(list)
+  heads: Dict[int, Tuple[Decimal, Decimal]] = {}
+  for coupon_id, stake, payout, *leg in rows:
+    heads[coupon_id] = (Decimal(stake), Decimal(payout))
+    legs[coupon_id].append(leg)
+
+  quotes = []
+  for coupon_id, (stake, payout) in heads.items():
+    placed_product, current_product, reason, priced = ONE, ONE, None, []
+    for odds_id, placed, status, result in legs[coupon_id]:
+      if status == "cancelled":
+        continue
+      if status == "open":
+        current, reason = lookup(odds_id)
+        if current is None:
+          break
+        current_product *= current
+        priced.append(odds_id)
+      elif result != "won":
+        reason = LEG_LOST
+        break
+      placed_product *= Decimal(placed)
+
+    amount = None
+    if reason is None:
+      amount = _apply_margin(stake * placed_product / current_product, payout, margin)
+    quotes.append(Quote("coupon", coupon_id, stake, payout, amount, reason, priced))
+  return quotes
+
+
+def _in_open_coupon(bet_id):
+  return exists().where(
+    models.CouponBet.bet_id == bet_id,
+    models.CouponBet.coupon_id == models.Coupon.coupon_id,
+    models.Coupon.status == "open",
+  )
+
+
+def _open_bet_rows(db: Session, user_id: str, bet_id: Optional[int] = None) -> list:
+  # Ноги открытых купонов выкупаются только вместе с купоном
+  stmt = select(
+    models.Bet.bet_id, models.Bet.odds_id, models.Bet.bet_amount, models.Bet.coefficient, models.Bet.potential_win,
+  ).where(models.Bet.user_id == user_id, models.Bet.status == "open", ~_in_open_coupon(models.Bet.bet_id))
+  if bet_id is not None:
+    stmt = stmt.where(models.Bet.bet_id == bet_id)
+  return db.execute(stmt).all()
+
+
+def _open_coupon_rows(db: Session, user_id: str, coupon_id: Optional[int] = None) -> list:
+  stmt = (
+    select(
+      models.Coupon.coupon_id, models.Coupon.total_bet_amount, models.Coupon.total_potential_win,
+      models.Bet.odds_id, models.Bet.coefficient, models.Bet.status, models.Bet.result,
+    )
+    .join(models.CouponBet, models.CouponBet.coupon_id == models.Coupon.coupon_id)
+    .join(models.Bet, models.Bet.bet_id == models.CouponBet.bet_id)
+    .where(models.Coupon.user_id == user_id, models.Coupon.status == "open")
+  )
+  if coupon_id is not None:
+    stmt = stmt.where(models.Coupon.coupon_id == coupon_id)
+  return db.execute(stmt).all()
+
+
+def quote_user(db: Session, user_id: str, cache: OddsCache = odds_cache) -> dict:
+  """Котировки cash-out по всем открытым ставкам и купонам пользователя."""
+  lookup = _OddsLookup(cache)
+  bets = price_bets(_open_bet_rows(db, user_id), lookup)
+  coupons = price_coupons(_open_coupon_rows(db, user_id), lookup)
+  available = [q.amount for q in bets + coupons if q.amount is not None]
+  return {
+    "user_id": user_id,
+    "odds_version": cache.version,
+    "priced_at": datetime.utcnow(),
+    "bets": bets,
+    "coupons": coupons,
+    "total_available": sum(available, ZERO),
+  }
+
+
+# ---------- принятие ----------
+
+def _check_price(quote: Optional[Quote], quoted_amount: Decimal) -> Decimal:
+  if quote is None:
+    raise CashoutError("not_open", "Cash-out is only available for open positions")
+  if quote.amount is None:
+    raise CashoutError(quote.reason, "Cash-out is not available right now")
+  # Цена могла сдвинуться с момента котировки: вниз - клиент должен подтвердить заново
+  if quote.amount < quoted_amount:
+    raise CashoutError("price_changed", "Cash-out amount has changed", current=quote.amount)
+  return quote.amount
+
+
+def _credit(db: Session, user_id: str, amount: Decimal, *, bet_id: Optional[int], description: str) -> None:
+  balance = db.get(models.UserBalance, user_id, with_for_update=True)
+  if balance is None:
+    # Проводка без зачисления разошлась бы с балансом
+    raise CashoutError("no_balance", "User balance not found")
+  before = Decimal(balance.balance)
+  balance.balance = before + amount
+  balance.updated_at = datetime.utcnow()
+  db.add(models.BetTransaction(
+    user_id=user_id,
+    bet_id=bet_id,
+    transaction_type=CASHOUT_STATUS,
+    amount=amount,
+    balance_before=before,
+    balance_after=before + amount,
+    description=description,
+  ))
+
+
+def accept_bet_cashout(db: Session, *, bet_id: int, user_id: str, quoted_amount: Decimal,
+                       cache: OddsCache = odds_cache) -> models.Bet:
+  bet = db.get(models.Bet, bet_id, with_for_update=True)
+  if bet is None or bet.user_id != user_id:
+    raise LookupError("Bet not found")
+  if bet.status == "open" and db.scalar(select(_in_open_coupon(bet_id))):
+    raise CashoutError(COUPON_LEG, "Bet is part of an open coupon; cash out the coupon instead")
+
+  quotes = price_bets(_open_bet_rows(db, user_id, bet_id), _OddsLookup(cache))
+  amount = _check_price(quotes[0] if quotes else None, quoted_amount)
+
+  bet.status = CASHOUT_STATUS
+  bet.result = CASHOUT_STATUS
+  bet.actual_win = amount
+  bet.resolved_at = bet.updated_at = datetime.utcnow()
+  exposure.track_bet(db, bet, sign=-1)
+  _credit(db, user_id, amount, bet_id=bet.bet_id, description=f"Cash-out of bet #{bet.bet_id}")
+  outbox.record_bet_event(db, "bet.cashed_out", bet, previous_status="open")
+  db.commit()
+  db.refresh(bet)
+  return bet
+
+
+def accept_coupon_cashout(db: Session, *, coupon_id: int, user_id: str, quoted_amount: Decimal,
+                          cache: OddsCache = odds_cache) -> models.Coupon:
+  # Ноги купона - одним запросом (selectinload + join ставок), а не по ставке на ногу
+  coupon = db.get(models.Coupon, coupon_id, with_for_update=True,
+                  options=[selectinload(models.Coupon.bets).joinedload(models.CouponBet.bet)])
+  if coupon is None or coupon.user_id != user_id:
+    raise LookupError("Coupon not found")
+
+  legs = [link.bet for link in coupon.bets]
+  rows = [
+    (coupon.coupon_id, coupon.total_bet_amount, coupon.total_potential_win,
+     leg.odds_id, leg.coefficient, leg.status, leg.result)
+    for leg in legs
+  ] if coupon.status == "open" else []
+  quotes = price_coupons(rows, _OddsLookup(cache))
+  amount = _check_price(quotes[0] if quotes else None, quoted_amount)
+
+  # Снимаем выплату купона с открытых исходов, пока статус ещё open
+  exposure.track_coupon(db, coupon, legs, sign=-1)
+  coupon.status = CASHOUT_STATUS
+  coupon.result = CASHOUT_STATUS
+  coupon.actual_win = amount
+  coupon.resolved_at = coupon.updated_at = datetime.utcnow()
+  _credit(db, user_id, amount, bet_id=None, description=f"Cash-out of coupon {coupon.coupon_code}")
+  outbox.record_coupon_event(db, "coupon.cashed_out", coupon, previous_status="open")
+  db.commit()
+  db.refresh(coupon)
+  return coupon
@@ -1,10 +1,19 @@
+import base64
+from datetime import datetime
 from decimal import Decimal
-from typing import Iterable, List, Optional
+from math import comb
+from typing import Iterable, List, Optional, Sequence, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
 
-from . import models
+from . import exposure, models, outbox, refcodes
+from .odds_cache import odds_cache
+
+
+MIN_COEFFICIENT = Decimal("1.01")
+BET_RESULTS = ("won", "lost")
+MAX_SYSTEM_COMBINATIONS = 20000
 
 
 def calculate_potential_win(amount: Decimal, coefficient: Decimal) -> dict:
@@ -13,21 +22,27 @@ def calculate_potential_win(amount: Decimal, coefficient: Decimal) -> dict:
   return {"payout": payout, "profit": profit}
 
 
-def calculate_coupon_win(amount: Decimal, coefficients: Iterable[Decimal]) -> dict:
-  coeffs = [Decimal(str(c)) for c in coefficients if Decimal(str(c)) >= Decimal("1.01")]
-  if not coeffs or amount <= 0:
-    return {
-      "betAmount": Decimal("0"),
-      "coefficients": [],
-      "totalCoefficient": Decimal("0"),
-      "potentialWin": Decimal("0"),
-      "profit": Decimal("0"),
-    }
+def _valid_coefficients(coefficients: Iterable[Decimal]) -> List[Decimal]:
+  # Каждый коэффициент приводим к Decimal ровно один раз
+  coeffs = []
+  for c in coefficients:
+    c = Decimal(str(c))
+    if c >= MIN_COEFFICIENT:
+      coeffs.append(c)
+  return coeffs
+
+
+def _empty_coupon_win() -> dict:
+  return {
+    "betAmount": Decimal("0"),
+    "coefficients": [],
+    "totalCoefficient": Decimal("0"),
+    "potentialWin": Decimal("0"),
+    "profit": Decimal("0"),
+  }
 
-  total_coeff = Decimal("1")
-  for c in coeffs:
-    total_coeff *= c
 
+def _price_coupon(amount: Decimal, coeffs: List[Decimal], total_coeff: Decimal) -> dict:
   potential = round(amount * total_coeff, 2)
   profit = round(potential - amount, 2)
 
@@ -40,7 +55,138 @@ def calculate_coupon_win(amount: Decimal, coefficients: Iterable[Decimal]) -> di
   }
 
 
+def calculate_coupon_win(amount: Decimal, coefficients: Iterable[Decimal]) -> dict:
+  coeffs = _valid_coefficients(coefficients)
+  if not coeffs or amount <= 0:
+    return _empty_coupon_win()
+
+  total_coeff = Decimal("1")
+  for c in coeffs:
+    total_coeff *= c
+
+  return _price_coupon(amount, coeffs, total_coeff)
+
+
+def calculate_coupons_win(coupons: Iterable[Tuple[Decimal, Iterable[Decimal]]]) -> List[dict]:
+  """Bulk-версия calculate_coupon_win: один проход по списку (сумма, коэффициенты).
+
+  Произведение коэффициентов считается один раз на уникальный набор ног,
+  поэтому перебор сумм для одного и того же купона почти ничего не стоит.
+  Результат для каждого купона совпадает с calculate_coupon_win.
+  """
+  products = {}
+  results = []
+  for amount, coefficients in coupons:
+    coeffs = _valid_coefficients(coefficients)
+    if not coeffs or amount <= 0:
+      results.append(_empty_coupon_win())
+      continue
+
+    key = tuple(coeffs)
+    total_coeff = products.get(key)
+    if total_coeff is None:
+      total_coeff = Decimal("1")
+      for c in coeffs:
+        total_coeff *= c
+      products[key] = total_coeff
+
+    results.append(_price_coupon(amount, coeffs, total_coeff))
+  return results
+
+
+def calculate_system_win(
+  amount: Decimal,
+  coefficients: Iterable[Decimal],
+  size: int,
+  include_combinations: bool = False,
+) -> dict:
+  """Расчёт системной ставки "size из n".
+
+  amount - ставка на одну комбинацию. Каждая комбинация округляется до копеек
+  так же, как в calculate_coupon_win, и только потом суммируется. Произведения
+  строятся обходом в глубину, так что общий префикс комбинаций перемножается
+  один раз.
+
+  В отличие от купона, коэффициенты ниже MIN_COEFFICIENT не отбрасываются, а
+  отклоняются: legs комбинаций - индексы во входном списке.
+  """
+  coeffs = [Decimal(str(c)) for c in coefficients]
+  invalid = [i for i, c in enumerate(coeffs) if c < MIN_COEFFICIENT]
+  if invalid:
+    raise ValueError(f"Invalid coefficients at positions {invalid} (each must be >= {MIN_COEFFICIENT})")
+  n = len(coeffs)
+  if not coeffs:
+    raise ValueError("No coefficients")
+  if size < 1 or size > n:
+    raise ValueError(f"System size must be between 1 and {n}")
+
+  combinations_count = comb(n, size)
+  if combinations_count > MAX_SYSTEM_COMBINATIONS:
+    raise ValueError(
+      f"Too many combinations: {combinations_count} (max {MAX_SYSTEM_COMBINATIONS})"
+    )
+
+  total_stake = amount * combinations_count
+  if amount <= 0:
+    return {
+      "betAmount": amount,
+      "size": size,
+      "numberOfCombinations": combinations_count,
+      "totalStake": Decimal("0"),
+      "potentialWin": Decimal("0"),
+      "profit": Decimal("0"),
+      "minWin": Decimal("0"),
+      "maxWin": Decimal("0"),
+      "combinations": [],
+    }
+
+  payouts = []
+  combinations = []
+  indexes = []
+
+  def walk(start: int, product: Decimal) -> None:
+    if len(indexes) == size:
+      potential = round(amount * product, 2)
+      payouts.append(potential)
+      if include_combinations:
+        combinations.append({
+          "legs": list(indexes),
+          "totalCoefficient": round(product, 2),
+          "potentialWin": potential,
+        })
+      return
+    # Оставляем достаточно ног, чтобы добрать комбинацию до size
+    for i in range(start, n - (size - len(indexes)) + 1):
+      indexes.append(i)
+      walk(i + 1, product * coeffs[i])
+      indexes.pop()
+
+  walk(0, Decimal("1"))
+
+  potential = sum(payouts, Decimal("0"))
+  return {
+    "betAmount": amount,
+    "size": size,
+    "numberOfCombinations": combinations_count,
+    "totalStake": round(total_stake, 2),
+    "potentialWin": potential,
+    "profit": round(potential - total_stake, 2),
+    "minWin": min(payouts),
+    "maxWin": max(payouts),
+    "combinations": combinations,
+  }
+
+
 def create_bet(db: Session, *, payload) -> models.Bet:
+  # Цена проверяется по локальному кэшу коэффициентов (без запроса в sports-модуль).
+  # Если проверка выполнялась - фиксируем серверный коэффициент и пересчитываем выигрыш.
+  verified = odds_cache.verify(
+    odds_id=payload.odds_id,
+    event_id=payload.event_id,
+    bet_type=payload.bet_type,
+    coefficient=payload.coefficient,
+  )
+
   # Check and create user if needed (DEMO MODE: no balance deduction)
   user_balance = db.get(models.UserBalance, payload.user_id)
   if not user_balance:
@@ -66,7 +212,10 @@ def create_bet(db: Session, *, payload) -> models.Bet:
   # user_balance.balance -= payload.bet_amount
 
   data = payload.dict()
-  if not data.get("potential_win"):
+  if verified is not None:
+    data["coefficient"] = verified
+    data["potential_win"] = calculate_potential_win(payload.bet_amount, verified)["payout"]
+  elif not data.get("potential_win"):
     calc = calculate_potential_win(payload.bet_amount, payload.coefficient)
     data["potential_win"] = calc["payout"]
 
@@ -81,6 +230,9 @@ def create_bet(db: Session, *, payload) -> models.Bet:
 
   bet = models.Bet(**data)
   db.add(bet)
+  db.flush()
+  exposure.track_bet(db, bet)
+  outbox.record_bet_event(db, "bet.placed", bet)
   db.commit()
   db.refresh(bet)
   return bet
@@ -105,9 +257,19 @@ def get_user_balance(db: Session, user_id: str) -> models.UserBalance:
     db.commit()
     db.refresh(balance)
 
+  return _demo_balance(balance)
+
+
+def find_user_balance(db: Session, user_id: str) -> Optional[models.UserBalance]:
+  """Как get_user_balance, но только чтение (годится для реплики); None - баланса ещё нет."""
+  balance = db.get(models.UserBalance, user_id)
+  return _demo_balance(balance) if balance else None
+
+
+def _demo_balance(balance: models.UserBalance) -> models.UserBalance:
   # DEMO MODE: Always return 5000 balance
   # Create a copy with balance = 5000 for demo purposes
-  demo_balance = models.UserBalance(
+  return models.UserBalance(
     user_id=balance.user_id,
     balance=Decimal("5000.00"),
     currency=balance.currency,
@@ -116,18 +278,66 @@ def get_user_balance(db: Session, user_id: str) -> models.UserBalance:
     updated_at=balance.updated_at
   )
 
-  return demo_balance
-
 
 def get_bet(db: Session, bet_id: int) -> Optional[models.Bet]:
   return db.get(models.Bet, bet_id)
 
 
-def list_user_bets(db: Session, user_id: str) -> List[models.Bet]:
-  stmt = select(models.Bet).where(models.Bet.user_id == user_id).order_by(
-    models.Bet.placed_at.desc()
-  )
-  return list(db.scalars(stmt))
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+  raw = f"{ts.isoformat()}|{row_id}".encode()
+  return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+  try:
+    ts, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(ts), int(row_id)
+  except (ValueError, UnicodeDecodeError) as exc:
+    raise ValueError("Invalid cursor") from exc
+
+
+def _keyset_page(
+  db: Session,
+  model,
+  ts_column,
+  id_column,
+  *,
+  user_id: str,
+  limit: int,
+  cursor: Optional[str],
+  status: Optional[str],
+  date_from: Optional[datetime],
+  date_to: Optional[datetime],
+  columns: Sequence,
+) -> Tuple[list, Optional[str]]:
+  # Пагинация по (ts, id) DESC: каждая страница - это range scan по
+  # составному индексу (user_id, ts, id), глубина страницы не важна.
+  # Выбираются только columns (строки-кортежи, без ORM-объектов).
+  limit = min(max(limit, 1), MAX_PAGE_SIZE)
+  stmt = select(*columns, ts_column, id_column)
+  stmt = stmt.where(model.user_id == user_id)
+  if status:
+    stmt = stmt.where(model.status == status)
+  if date_from:
+    stmt = stmt.where(ts_column >= date_from)
+  if date_to:
+    stmt = stmt.where(ts_column <= date_to)
+  if cursor:
+    cursor_ts, cursor_id = decode_cursor(cursor)
+    stmt = stmt.where(tuple_(ts_column, id_column) < tuple_(cursor_ts, cursor_id))
+
+  stmt = stmt.order_by(ts_column.desc(), id_column.desc()).limit(limit + 1)
+  rows = db.execute(stmt).all()
+
+  next_cursor = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    next_cursor = encode_cursor(*rows[-1][-2:])
+  return [row[:-2] for row in rows], next_cursor
 
 
 def create_coupon(db: Session, *, user_id: str, bet_ids: List[int], total_amount: Decimal) -> models.Coupon:
@@ -140,13 +350,8 @@ def create_coupon(db: Session, *, user_id: str, bet_ids: List[int], total_amount
   coeffs = [Decimal(str(b.coefficient)) for b in bets]
   calc = calculate_coupon_win(total_amount, coeffs)
 
-  from datetime import datetime
-
-  date = datetime.utcnow().strftime("%Y%m%d")
-  import random
-
-  random_code = f"{random.randrange(10**6):06d}"
-  coupon_code = f"CPN{date}_{random_code}"
+  # Уникален без запроса к БД (время + узел + счётчик), см. refcodes
+  coupon_code = refcodes.coupon_codes.next()
 
   coupon = models.Coupon(
     user_id=user_id,
@@ -162,26 +367,59 @@ def create_coupon(db: Session, *, user_id: str, bet_ids: List[int], total_amount
   for b in bets:
     link = models.CouponBet(coupon_id=coupon.coupon_id, bet_id=b.bet_id)
     db.add(link)
+  exposure.track_coupon(db, coupon, bets)
 
   db.commit()
   db.refresh(coupon)
   return coupon
 
 
-def update_bet_status(db: Session, bet_id: int, new_status: str) -> Optional[models.Bet]:
+def update_bet_status(db: Session, bet_id: int, new_status: str,
+                      result: Optional[str] = None) -> Optional[models.Bet]:
+  # Расчёт (resolved) - только с исходом: result и actual_win уходят в событие
+  # bet.settled, по ним finance считает выигрыш/проигрыш
+  if (new_status == "resolved") != (result in BET_RESULTS):
+    raise ValueError("result (won|lost) is required for resolved and only for resolved")
   bet = get_bet(db, bet_id)
   if not bet:
     return None
+  old_status, old_result = bet.status, bet.result
+  was_open = old_status == "open"
   bet.status = new_status
+  bet.result = result
+  bet.actual_win = (bet.potential_win if result == "won" else Decimal("0")) if result else None
+  bet.resolved_at = datetime.utcnow() if result else None
+  if was_open != (new_status == "open"):
+    exposure.track_bet(db, bet, sign=-1 if was_open else 1)
+  if (old_status, old_result) != (new_status, result):
+    outbox.record_bet_event(db, outbox.status_event_type(new_status), bet, previous_status=old_status)
   db.commit()
   db.refresh(bet)
   return bet
 
 
-def list_user_coupons(db: Session, user_id: str) -> List[models.Coupon]:
-  stmt = select(models.Coupon).where(models.Coupon.user_id == user_id).order_by(
-    models.Coupon.created_at.desc()
+def _row_page(db: Session, model, ts_column, id_column, fields: Sequence[str], **kwargs) -> Tuple[List[dict], Optional[str]]:
+  # Быстрый путь для списков: только нужные колонки, без ORM-объектов и
+  # без валидации каждой строки через pydantic.
+  rows, next_cursor = _keyset_page(
+    db, model, ts_column, id_column, columns=[getattr(model, f) for f in fields], **kwargs
+  )
+  return [dict(zip(fields, row)) for row in rows], next_cursor
+
+
+def list_user_bet_rows(db: Session, user_id: str, *, fields: Sequence[str], limit: int = DEFAULT_PAGE_SIZE,
+                       cursor: Optional[str] = None, status: Optional[str] = None,
+                       date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+  return _row_page(
+    db, models.Bet, models.Bet.placed_at, models.Bet.bet_id, fields,
+    user_id=user_id, limit=limit, cursor=cursor, status=status, date_from=date_from, date_to=date_to,
   )
-  return list(db.scalars(stmt))
 
 
+def list_user_coupon_rows(db: Session, user_id: str, *, fields: Sequence[str], limit: int = DEFAULT_PAGE_SIZE,
+                          cursor: Optional[str] = None, status: Optional[str] = None,
+                          date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+  return _row_page(
+    db, models.Coupon, models.Coupon.created_at, models.Coupon.coupon_id, fields,
+    user_id=user_id, limit=limit, cursor=cursor, status=status, date_from=date_from, date_to=date_to,
+  )
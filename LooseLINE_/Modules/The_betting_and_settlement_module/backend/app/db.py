@@ -1,8 +1,19 @@
+"""
+Подключение к БД: синхронный движок (по умолчанию) или asyncpg (DB_ASYNC=true).
+
+Ограничение async-режима: crud остаётся синхронным и в DB_ASYNC=true лишь
+оборачивается в AsyncSession.run_sync (см. run_db). Event loop и потоки
+threadpool не заняты, но запросы одного вызова crud по-прежнему идут строго
+друг за другом, а сам crud не может использовать async API (await, gather).
+"""
 import os
 
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from starlette.concurrency import run_in_threadpool
 
 load_dotenv()
 
@@ -11,6 +22,12 @@ DATABASE_URL = os.getenv(
     "sqlite:///./looseline.db",  # SQLite по умолчанию для разработки
 )
 
+# DB_ASYNC=true - asyncpg + AsyncSession: запросы не занимают потоки threadpool.
+# Только для PostgreSQL; SQLite для разработки работает в синхронном режиме.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
 # Для SQLite нужен check_same_thread=False
 connect_args = {}
 if DATABASE_URL.startswith("sqlite"):
@@ -22,6 +39,30 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, futu
 Base = declarative_base()
 
 
+def async_database_url(url: str):
+    """postgresql://...?sslmode=disable -> postgresql+asyncpg://...?ssl=disable"""
+    url = make_url(url)
+    if url.get_backend_name() != "postgresql":
+        raise RuntimeError("DB_ASYNC=true requires a PostgreSQL DATABASE_URL")
+    query = dict(url.query)
+    sslmode = query.pop("sslmode", None)
+    if sslmode:
+        query["ssl"] = sslmode
+    return url.set(drivername="postgresql+asyncpg", query=query)
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    async_engine = create_async_engine(
+        async_database_url(DATABASE_URL),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+    )
+    # Ответы сериализуются после commit - атрибуты не должны протухать
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
 def get_db():
   db = SessionLocal()
   try:
@@ -30,3 +71,22 @@ def get_db():
     db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Зависимость для роутеров: сессия текущего режима
+get_session = get_async_db if DB_ASYNC else get_db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Вызывает синхронную crud-функцию fn(session, ...) в текущем режиме.
+
+    AsyncSession: через run_sync - тот же код crud работает поверх asyncpg,
+    не блокируя event loop. Session: в threadpool, как sync-эндпоинты FastAPI.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -0,0 +1,293 @@
+"""
+Открытая ответственность (exposure) по событиям и исходам.
+
+Счётчики event_exposure меняются в той же транзакции, что и ставка:
+  - create_bet            +ставка по (event_id, bet_type)
+  - create_coupon         +выплата купона на каждый открытый исход купона
+  - смена статуса ставки  open -> (resolved|cancelled|cashout) снимает ставку и
+                          выплаты открытых купонов по этому исходу, обратно - возвращает
+  - cash-out купона       снимает его выплату с открытых исходов
+
+Таблица event_exposure общая для всех воркеров и отдаёт /risk/exposure по
+умолчанию: top-N и отбор события считаются в SQL (load_top_events,
+load_event), полностью закрытые исходы удаляются из таблицы сразу. Копия в памяти процесса (book, ?source=memory) обновляется после
+commit только этого процесса: без запросов в БД, но точна лишь при одном
+воркере uvicorn - с несколькими каждый видит свои ставки.
+
+Полный пересчёт (блокирует bets и coupons на запись, поэтому не через API):
+    python -m app.exposure rebuild
+"""
+import logging
+import threading
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal("0")
+REBUILD_CHUNK = 5000
+
+Key = Tuple[int, str]
+FIELDS = ("open_bets", "total_stake", "total_payout", "coupon_payout")
+
+_PENDING = "exposure_pending"
+
+
+class ExposureBook:
+  """Счётчики в памяти процесса: (event_id, bet_type) -> [bets, stake, payout, coupon_payout]."""
+
+  def __init__(self):
+    self._rows: Dict[Key, list] = {}
+    self._lock = threading.Lock()
+
+  def add(self, key: Key, delta: tuple) -> None:
+    with self._lock:
+      row = self._rows.setdefault(key, [0, ZERO, ZERO, ZERO])
+      for i, d in enumerate(delta):
+        row[i] += d
+
+  def replace(self, rows: Dict[Key, list]) -> None:
+    with self._lock:
+      self._rows = {k: list(v) for k, v in rows.items()}
+
+  def load(self, db: Session, event_ids: Optional[List[int]] = None) -> None:
+    """Счётчики из event_exposure: все или только событий event_ids."""
+    stmt = select(models.EventExposure)
+    if event_ids is not None:
+      stmt = stmt.where(models.EventExposure.event_id.in_(event_ids))
+    rows = {}
+    for r in db.scalars(stmt):
+      rows[(r.event_id, r.bet_type)] = [
+        r.open_bets, Decimal(r.total_stake), Decimal(r.total_payout), Decimal(r.coupon_payout)
+      ]
+    self.replace(rows)
+
+  def events(self) -> Dict[int, dict]:
+    """Сводка по событиям: исходы и худший сценарий для букмекера."""
+    with self._lock:
+      # Полностью закрытые исходы (все счётчики 0) не показываем
+      items = [(k, list(v)) for k, v in self._rows.items() if any(v)]
+
+    result: Dict[int, dict] = {}
+    for (event_id, bet_type), (bets, stake, payout, coupon_payout) in items:
+      ev = result.setdefault(event_id, {"event_id": event_id, "open_bets": 0, "total_stake": ZERO, "outcomes": []})
+      ev["open_bets"] += bets
+      ev["total_stake"] += stake
+      ev["outcomes"].append({
+        "bet_type": bet_type,
+        "open_bets": bets,
+        "total_stake": stake,
+        "total_payout": payout,
+        "coupon_payout": coupon_payout,
+      })
+
+    for ev in result.values():
+      # Если сыграет исход o: платим выплаты по o, ставки события остаются у нас
+      for o in ev["outcomes"]:
+        o["liability"] = o["total_payout"] + o["coupon_payout"] - ev["total_stake"]
+      worst = max(ev["outcomes"], key=lambda o: o["liability"])
+      ev["worst_outcome"] = worst["bet_type"]
+      ev["worst_case_liability"] = worst["liability"]
+      ev["outcomes"].sort(key=lambda o: o["bet_type"])
+    return result
+
+  def top_events(self, limit: int) -> List[dict]:
+    evs = list(self.events().values())
+    evs.sort(key=lambda ev: ev["worst_case_liability"], reverse=True)
+    return evs[:limit]
+
+  def event(self, event_id: int) -> Optional[dict]:
+    return self.events().get(event_id)
+
+
+book = ExposureBook()
+
+
+def load_top_events(db: Session, limit: int) -> List[dict]:
+  """Top-N событий по худшему сценарию: агрегат и LIMIT в SQL, читаются только их исходы."""
+  ee = models.EventExposure
+  worst = func.max(ee.total_payout + ee.coupon_payout) - func.sum(ee.total_stake)
+  event_ids = db.scalars(
+    select(ee.event_id).group_by(ee.event_id).order_by(worst.desc(), ee.event_id).limit(limit)
+  ).all()
+  if not event_ids:
+    return []
+  top = ExposureBook()
+  top.load(db, list(event_ids))
+  return top.top_events(limit)
+
+
+def load_event(db: Session, event_id: int) -> Optional[dict]:
+  one = ExposureBook()
+  one.load(db, [event_id])
+  return one.event(event_id)
+
+
+# ---------- инкрементальные изменения ----------
+
+def _key(bet: models.Bet) -> Key:
+  return (bet.event_id, bet.bet_type or "")
+
+
+def _upsert(db: Session, key: Key, delta: tuple) -> None:
+  dialect = db.get_bind().dialect.name
+  if dialect == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert
+  else:
+    from sqlalchemy.dialects.sqlite import insert
+
+  table = models.EventExposure.__table__
+  values = dict(zip(FIELDS, delta))
+  stmt = insert(table).values(event_id=key[0], bet_type=key[1], **values)
+  stmt = stmt.on_conflict_do_update(
+    index_elements=[table.c.event_id, table.c.bet_type],
+    set_={**{f: table.c[f] + stmt.excluded[f] for f in FIELDS}, "updated_at": stmt.excluded.updated_at},
+  )
+  db.execute(stmt)
+
+  if any(d < 0 for d in delta):
+    # Исход закрылся полностью - строка не нужна (иначе таблица растёт с каждым событием)
+    db.execute(delete(table).where(
+      table.c.event_id == key[0], table.c.bet_type == key[1],
+      *(table.c[f] == 0 for f in FIELDS),
+    ))
+
+
+def _track(db: Session, key: Key, delta: tuple) -> None:
+  _upsert(db, key, delta)
+  db.info.setdefault(_PENDING, []).append((key, delta))
+
+
+def track_bet(db: Session, bet: models.Bet, sign: int = 1) -> None:
+  """Ставка открылась (sign=1) или закрылась (sign=-1)."""
+  _track(db, _key(bet), (sign, sign * Decimal(bet.bet_amount), sign * Decimal(bet.potential_win), ZERO))
+
+  # Выплаты открытых купонов, в которые входит ставка
+  coupon_payouts = db.scalars(
+    select(models.Coupon.total_potential_win)
+    .join(models.CouponBet, models.CouponBet.coupon_id == models.Coupon.coupon_id)
+    .where(models.CouponBet.bet_id == bet.bet_id, models.Coupon.status == "open")
+  ).all()
+  total = sum((Decimal(p) for p in coupon_payouts), ZERO)
+  if total:
+    _track(db, _key(bet), (0, ZERO, ZERO, sign * total))
+
+
+def track_bets(db: Session, bets: List, sign: int) -> None:
+  """track_bet для пачки ставок: один upsert на исход и один запрос выплат купонов."""
+  acc: Dict[Key, list] = defaultdict(lambda: [0, ZERO, ZERO, ZERO])
+  keys = {}
+  for bet in bets:
+    key = keys[bet.bet_id] = _key(bet)
+    row = acc[key]
+    row[0] += sign
+    row[1] += sign * Decimal(bet.bet_amount)
+    row[2] += sign * Decimal(bet.potential_win)
+
+  if keys:
+    coupon_payouts = db.execute(
+      select(models.CouponBet.bet_id, models.Coupon.total_potential_win)
+      .join(models.Coupon, models.Coupon.coupon_id == models.CouponBet.coupon_id)
+      .where(models.CouponBet.bet_id.in_(list(keys)), models.Coupon.status == "open")
+    )
+    for bet_id, payout in coupon_payouts:
+      acc[keys[bet_id]][3] += sign * Decimal(payout)
+
+  for key, delta in acc.items():
+    _track(db, key, tuple(delta))
+
+
+def track_coupon(db: Session, coupon: models.Coupon, bets: List[models.Bet], sign: int = 1) -> None:
+  """Купон открылся (sign=1) или закрылся досрочно (sign=-1, cash-out)."""
+  payout = sign * Decimal(coupon.total_potential_win)
+  for bet in bets:
+    if bet.status == "open":
+      _track(db, _key(bet), (0, ZERO, ZERO, payout))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session) -> None:
+  for key, delta in session.info.pop(_PENDING, []):
+    book.add(key, delta)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+  session.info.pop(_PENDING, None)
+
+
+# ---------- полный пересчёт ----------
+
+def rebuild(db: Session, chunk_size: int = REBUILD_CHUNK) -> int:
+  """
+  Пересчитывает счётчики из bets/coupons потоковым проходом (yield_per),
+  не загружая таблицу в память. Возвращает число учтённых ставок.
+  """
+  if db.get_bind().dialect.name == "postgresql":
+    # Не даём принять ставку между проходом и записью счётчиков
+    db.connection().exec_driver_sql("LOCK TABLE bets, coupons IN SHARE MODE")
+
+  acc: Dict[Key, list] = defaultdict(lambda: [0, ZERO, ZERO, ZERO])
+
+  bets_stmt = (
+    select(models.Bet.event_id, models.Bet.bet_type, models.Bet.bet_amount, models.Bet.potential_win)
+    .where(models.Bet.status == "open")
+    .execution_options(yield_per=chunk_size)
+  )
+  counted = 0
+  for event_id, bet_type, amount, payout in db.execute(bets_stmt):
+    row = acc[(event_id, bet_type or "")]
+    row[0] += 1
+    row[1] += Decimal(amount)
+    row[2] += Decimal(payout)
+    counted += 1
+
+  coupons_stmt = (
+    select(models.Bet.event_id, models.Bet.bet_type, models.Coupon.total_potential_win)
+    .join(models.CouponBet, models.CouponBet.bet_id == models.Bet.bet_id)
+    .join(models.Coupon, models.Coupon.coupon_id == models.CouponBet.coupon_id)
+    .where(models.Bet.status == "open", models.Coupon.status == "open")
+    .execution_options(yield_per=chunk_size)
+  )
+  for event_id, bet_type, payout in db.execute(coupons_stmt):
+    acc[(event_id, bet_type or "")][3] += Decimal(payout)
+
+  db.execute(delete(models.EventExposure))
+  if acc:
+    db.execute(
+      models.EventExposure.__table__.insert(),
+      [
+        {"event_id": k[0], "bet_type": k[1], **dict(zip(FIELDS, v))}
+        for k, v in acc.items()
+      ],
+    )
+  db.info.pop(_PENDING, None)
+  db.commit()
+  book.replace(acc)
+  return counted
+
+
+def main() -> None:
+  import argparse
+
+  from .db import SessionLocal
+
+  parser = argparse.ArgumentParser(prog="python -m app.exposure", description="Exposure counters")
+  sub = parser.add_subparsers(dest="command", required=True)
+  sub.add_parser("rebuild", help="recompute event_exposure from bets and coupons")
+  parser.parse_args()
+
+  logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+  with SessionLocal() as db:
+    counted = rebuild(db)
+  logger.info("exposure: rebuilt from %d open bets, %d events", counted, len(book.events()))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,228 @@
+"""
+Idempotency-Key для POST /bets/ и POST /coupons/.
+
+Повтор запроса с тем же ключом возвращает сохранённый ответ, не трогая bets:
+  1. LRU в памяти процесса (IDEMPOTENCY_CACHE_SIZE записей);
+  2. таблица idempotency_keys - общая для всех процессов.
+
+Одновременные запросы с одним ключом выполняются один раз: внутри процесса
+ждут общий in-flight запрос, между процессами - строку-заявку в таблице
+(status_code IS NULL), пока её владелец не запишет ответ. Работает в обоих
+режимах БД (Session / AsyncSession), см. db.run_db.
+
+Заявка не коммитится отдельно, а уходит в БД одной транзакцией с записью
+crud: если владелец упал до коммита, заявки нет и повтор выполняется заново;
+если заявка видна без ответа - ставка, возможно, уже записана, и повтор
+получает 409, но не выполняется второй раз.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .db import run_db
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# Сколько повтор ждёт ответа владельца заявки, прежде чем вернуть 409
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "30"))
+IDEMPOTENCY_POLL_SECONDS = 0.05
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+  request_hash: str
+  status_code: int
+  body: str
+
+
+class _LRU:
+  def __init__(self, size: int):
+    self.size = size
+    self._data: "OrderedDict[Tuple[str, str], StoredResponse]" = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key: Tuple[str, str]) -> Optional[StoredResponse]:
+    with self._lock:
+      value = self._data.get(key)
+      if value is not None:
+        self._data.move_to_end(key)
+      return value
+
+  def put(self, key: Tuple[str, str], value: StoredResponse) -> None:
+    with self._lock:
+      self._data[key] = value
+      self._data.move_to_end(key)
+      while len(self._data) > self.size:
+        self._data.popitem(last=False)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._data.clear()
+
+
+cache = _LRU(IDEMPOTENCY_CACHE_SIZE)
+
+# Координация идёт в event loop процесса (роутеры async), поэтому asyncio.Event
+_inflight: Dict[Tuple[str, str], asyncio.Event] = {}
+
+
+def request_hash(payload: BaseModel) -> str:
+  raw = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+  return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _replay(stored: StoredResponse, req_hash: str) -> JSONResponse:
+  if stored.request_hash != req_hash:
+    raise HTTPException(
+      status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+      detail="Idempotency-Key was already used with a different request body",
+    )
+  return JSONResponse(
+    content=json.loads(stored.body),
+    status_code=stored.status_code,
+    headers={REPLAYED_HEADER: "true"},
+  )
+
+
+def _load(db: Session, scope: str, key: str) -> Optional[models.IdempotencyKey]:
+  return db.get(models.IdempotencyKey, (scope, key), populate_existing=True)
+
+
+def _try_claim(db: Session, scope: str, key: str, req_hash: str) -> Tuple[bool, Optional[StoredResponse]]:
+  """
+  Одна попытка занять ключ в таблице:
+    (True, None)    - ключ наш, выполняем запрос;
+    (False, stored) - ответ уже сохранён;
+    (False, None)   - по ключу выполняется чужой запрос.
+  """
+  row = _load(db, scope, key)
+  if row is None:
+    db.add(models.IdempotencyKey(scope=scope, idem_key=key, request_hash=req_hash))
+    try:
+      # Без коммита: заявка станет видна вместе с записью crud (см. docstring модуля)
+      db.flush()
+      return True, None
+    except IntegrityError:
+      db.rollback()
+      return False, None
+
+  if row.status_code is not None:
+    return False, StoredResponse(row.request_hash, row.status_code, row.response_body)
+
+  # Заявку без ответа не перехватываем: её владелец мог уже закоммитить ставку
+  db.rollback()  # снимок заканчивается, следующий SELECT увидит свежие данные
+  return False, None
+
+
+def _store(db: Session, scope: str, key: str, stored: StoredResponse) -> None:
+  row = _load(db, scope, key)
+  row.status_code = stored.status_code
+  row.response_body = stored.body
+  db.commit()
+
+
+def _release(db: Session, scope: str, key: str) -> None:
+  db.rollback()
+  db.execute(delete(models.IdempotencyKey).where(
+    models.IdempotencyKey.scope == scope,
+    models.IdempotencyKey.idem_key == key,
+    models.IdempotencyKey.status_code.is_(None),
+  ))
+  db.commit()
+
+
+def _in_progress() -> HTTPException:
+  return HTTPException(
+    status_code=status.HTTP_409_CONFLICT,
+    detail="A request with this Idempotency-Key is still in progress",
+  )
+
+
+async def _claim(db, scope: str, key: str, req_hash: str) -> Optional[StoredResponse]:
+  """Занимает ключ; если его держит другой процесс - ждёт, пока тот допишет ответ."""
+  deadline = time.monotonic() + IDEMPOTENCY_LOCK_SECONDS
+  while True:
+    owned, stored = await run_db(db, _try_claim, scope, key, req_hash)
+    if owned or stored is not None:
+      return stored
+    if time.monotonic() > deadline:
+      raise _in_progress()
+    await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+
+async def execute(
+  db,
+  *,
+  scope: str,
+  key: str,
+  payload: BaseModel,
+  handler: Callable[[], Awaitable[Any]],
+  status_code: int = status.HTTP_201_CREATED,
+) -> JSONResponse:
+  """Выполняет handler не более одного раза на (scope, key) и сохраняет его ответ."""
+  req_hash = request_hash(payload)
+  cache_key = (scope, key)
+
+  while True:
+    stored = cache.get(cache_key)
+    if stored is not None:
+      return _replay(stored, req_hash)
+
+    waiter = _inflight.get(cache_key)
+    if waiter is None:
+      done = _inflight[cache_key] = asyncio.Event()
+      break
+    # Такой же запрос уже выполняется в этом процессе - ждём его результат
+    try:
+      await asyncio.wait_for(waiter.wait(), IDEMPOTENCY_LOCK_SECONDS)
+    except asyncio.TimeoutError:
+      raise _in_progress()
+
+  try:
+    stored = await _claim(db, scope, key, req_hash)
+    if stored is not None:
+      cache.put(cache_key, stored)
+      return _replay(stored, req_hash)
+
+    try:
+      result = await handler()
+    except BaseException:
+      # Ошибку не запоминаем - клиент может повторить запрос с тем же ключом
+      await run_db(db, _release, scope, key)
+      raise
+
+    body = jsonable_encoder(result)
+    stored = StoredResponse(req_hash, status_code, json.dumps(body))
+    await run_db(db, _store, scope, key, stored)
+    cache.put(cache_key, stored)
+    return JSONResponse(content=body, status_code=status_code)
+  finally:
+    _inflight.pop(cache_key, None)
+    done.set()
+
+
+def purge_expired(db: Session, older_than: timedelta = timedelta(days=1)) -> int:
+  """Удаляет старые ключи; клиенты повторяют запросы минуты, а не дни."""
+  result = db.execute(
+    delete(models.IdempotencyKey).where(models.IdempotencyKey.created_at < datetime.utcnow() - older_than)
+  )
+  db.commit()
+  return result.rowcount
@@ -1,10 +1,15 @@
+import asyncio
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .db import Base, engine
-from .routers import bets, coupons
+from . import bulk_status, exposure, idempotency, replicas
+from .db import Base, DATABASE_URL, SessionLocal, engine
+from .odds_cache import odds_cache
+from .routers import bets, cashout, coupons, outbox, risk
 
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Looseline Betting API")
 
@@ -15,9 +20,14 @@ app.add_middleware(
   allow_methods=["*"],
   allow_headers=["*"],
 )
+# Метка последней записи клиента для read-your-writes (см. replicas)
+app.add_middleware(replicas.ReadYourWritesMiddleware)
 
 app.include_router(bets.router)
 app.include_router(coupons.router)
+app.include_router(risk.router)
+app.include_router(outbox.router)
+app.include_router(cashout.router)
 
 
 @app.get("/health", tags=["service"])
@@ -27,16 +37,35 @@ def health_check():
 
 @app.on_event("startup")
 async def startup_event():
-    # Simple "migration" to ensure columns exist
-    from sqlalchemy import text
+    # Схема PostgreSQL управляется только миграциями Alembic (alembic upgrade head,
+    # сервис betting-migrations) - при старте приложения DDL не выполняется.
+    # Для локальной SQLite-базы создаём таблицы как раньше.
+    if DATABASE_URL.startswith("sqlite"):
+        Base.metadata.create_all(bind=engine)
+
+    # Счётчики exposure в памяти процесса стартуют с сохранённых значений
     try:
-        with engine.connect() as conn:
-            # Existing column
-            conn.execute(text("ALTER TABLE bets ADD COLUMN IF NOT EXISTS event_name VARCHAR(255)"))
-            # New columns
-            conn.execute(text("ALTER TABLE bets ADD COLUMN IF NOT EXISTS event_end_date TIMESTAMP"))
-            conn.execute(text("ALTER TABLE bets ADD COLUMN IF NOT EXISTS expected_result VARCHAR(10)"))
-            conn.commit()
-            print("✅ Checked/Added columns to bets table: event_name, event_end_date, expected_result")
+        with SessionLocal() as db:
+            exposure.book.load(db)
+            idempotency.purge_expired(db)
     except Exception as e:
-        print(f"⚠️ Migration warning: {e}")
+        logger.warning("exposure/idempotency startup step failed: %s", e)
+
+    # Массовые смены статусов, брошенные упавшим процессом, дорабатываются в фоне
+    app.state.bulk_resumer = asyncio.create_task(asyncio.to_thread(bulk_status.resume_stale_jobs))
+
+    # Фоновая синхронизация кэша коэффициентов из sports-модуля
+    if odds_cache.enabled:
+        app.state.odds_refresher = asyncio.create_task(odds_cache.run())
+
+    # Проверка здоровья и отставания реплик чтения
+    if replicas.router.enabled:
+        app.state.replica_checker = asyncio.create_task(replicas.router.run())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+  for name in ("odds_refresher", "replica_checker"):
+    task = getattr(app.state, name, None)
+    if task:
+      task.cancel()
@@ -1,9 +1,11 @@
 from datetime import datetime
 
 from sqlalchemy import (
+  BigInteger,
   Column,
   DateTime,
   ForeignKey,
+  Index,
   Integer,
   Numeric,
   String,
@@ -93,6 +95,13 @@ class Bet(Base):
   coupon_links = relationship("CouponBet", back_populates="bet")
   transactions = relationship("BetTransaction", back_populates="bet")
 
+  __table_args__ = (
+    # Keyset-пагинация истории ставок: (user_id, placed_at, bet_id) DESC
+    Index("idx_bets_user_placed", "user_id", placed_at.desc(), bet_id.desc()),
+    # Массовая смена статуса по событию (void)
+    Index("idx_bets_event_status", "event_id", "status", "bet_id"),
+  )
+
 
 class Coupon(Base):
   __tablename__ = "coupons"
@@ -113,6 +122,10 @@ class Coupon(Base):
   user = relationship("User", back_populates="coupons")
   bets = relationship("CouponBet", back_populates="coupon")
 
+  __table_args__ = (
+    Index("idx_coupons_user_created", "user_id", created_at.desc(), coupon_id.desc()),
+  )
+
 
 class CouponBet(Base):
   __tablename__ = "coupon_bets"
@@ -142,6 +155,75 @@ class BetTransaction(Base):
   bet = relationship("Bet", back_populates="transactions")
 
 
+class EventExposure(Base):
+  """Открытая ответственность по исходу события (агрегат, ведётся инкрементально)."""
+  __tablename__ = "event_exposure"
+
+  event_id = Column(Integer, primary_key=True)
+  bet_type = Column(String(10), primary_key=True)  # '1', 'X', '2'
+  open_bets = Column(Integer, nullable=False, default=0)
+  total_stake = Column(Numeric(15, 2), nullable=False, default=0)
+  total_payout = Column(Numeric(15, 2), nullable=False, default=0)
+  # Выплата по открытым купонам, если этот исход сыграет
+  coupon_payout = Column(Numeric(15, 2), nullable=False, default=0)
+  updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class IdempotencyKey(Base):
+  """Сохранённый ответ на POST с заголовком Idempotency-Key."""
+  __tablename__ = "idempotency_keys"
+
+  scope = Column(String(20), primary_key=True)  # 'bets' | 'coupons'
+  idem_key = Column(String(100), primary_key=True)
+  request_hash = Column(String(64), nullable=False)
+  status_code = Column(Integer)  # NULL - запрос ещё выполняется
+  response_body = Column(Text)
+  created_at = Column(DateTime, default=datetime.utcnow)
+
+  __table_args__ = (
+    Index("idx_idempotency_keys_created", "created_at"),
+  )
+
+
+class OutboxEvent(Base):
+  """Событие жизненного цикла ставки; пишется в одной транзакции со ставкой."""
+  __tablename__ = "outbox_events"
+
+  id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+  aggregate_type = Column(String(20), nullable=False, default="bet")
+  aggregate_id = Column(Integer, nullable=False)  # bet_id | coupon_id (по aggregate_type)
+  event_type = Column(String(50), nullable=False)  # bet.placed | bet.status_changed | bet.settled | coupon.cashed_out
+  payload = Column(Text, nullable=False)  # JSON
+  created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+  published_at = Column(DateTime)
+
+  __table_args__ = (
+    # Релей читает только неопубликованные события по порядку id
+    Index("idx_outbox_unpublished", "id", postgresql_where=published_at.is_(None)),
+  )
+
+
+class BulkStatusJob(Base):
+  """Массовая смена статуса ставок (void события и т.п.), прогресс для опроса."""
+  __tablename__ = "bulk_status_jobs"
+
+  job_id = Column(String(36), primary_key=True)
+  status = Column(String(20), nullable=False, default="queued")  # queued | running | done | failed
+  event_id = Column(Integer)
+  bet_ids = Column(Text)  # JSON-список, если выбор по bet_id
+  new_status = Column(String(20), nullable=False)
+  reason = Column(Text)
+  total = Column(Integer, nullable=False, default=0)
+  updated = Column(Integer, nullable=False, default=0)
+  skipped = Column(Integer, nullable=False, default=0)  # выбраны, но не в исходном статусе
+  refunded = Column(Integer, nullable=False, default=0)
+  refunded_amount = Column(Numeric(15, 2), nullable=False, default=0)
+  error = Column(Text)
+  created_at = Column(DateTime, default=datetime.utcnow)
+  heartbeat_at = Column(DateTime)  # последняя пачка; по нему находятся брошенные задания
+  finished_at = Column(DateTime)
+
+
 class BetResult(Base):
   __tablename__ = "bet_results"
 
@@ -0,0 +1,282 @@
+"""
+Локальный кэш коэффициентов для проверки цены при приёме ставки.
+
+Коэффициенты живут в базе модуля спортивных событий. Вместо синхронного
+запроса туда на каждую ставку сервис держит снимок odds_id -> коэффициент
+и периодически дотягивает изменения из дельта-фида
+GET {SPORTS_API_URL}/api/odds/changes?since=<updated_at>&after_id=<odds_id>.
+Курсор составной (updated_at, odds_id) - последняя строка страницы; строки
+без updated_at фид отдаёт первыми как '-infinity'.
+
+updated_at ставится NOW() - временем начала транзакции sports-модуля, и
+строка может закоммититься позже строк с большим updated_at. Поэтому каждый
+опрос начинается с курсора, отодвинутого на ODDS_FEED_OVERLAP_SECONDS назад:
+окно перечитывается, повторы по odds_id применяются без изменений.
+
+Снимок хранит только активные коэффициенты; неактивные вытесняются, а их
+odds_id запоминаются, чтобы отклонять ставки с кодом odds_suspended.
+Удалённые строки (удаление события) фид не отдаёт - раз в
+ODDS_RESYNC_SECONDS снимок перечитывается целиком и заменяется.
+
+Настройки (переменные окружения):
+  SPORTS_API_URL        - адрес sports-backend; пусто - проверка выключена
+  ODDS_REFRESH_SECONDS  - период опроса фида
+  ODDS_PRICE_TOLERANCE  - допустимое отклонение цены клиента от текущей
+  ODDS_MAX_STALENESS    - через сколько секунд без синхронизации кэш устарел
+  ODDS_FEED_OVERLAP_SECONDS - окно перечитывания фида за курсором
+  ODDS_RESYNC_SECONDS   - период полной перезагрузки снимка
+  ODDS_VERIFY_MODE      - off | lenient | strict
+                          lenient: неизвестный odds_id или устаревший кэш -
+                                   принимаем цену клиента как раньше
+                          strict:  в этих случаях ставка отклоняется
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+logger = logging.getLogger(__name__)
+
+SPORTS_API_URL = os.getenv("SPORTS_API_URL", "").rstrip("/")
+ODDS_REFRESH_SECONDS = float(os.getenv("ODDS_REFRESH_SECONDS", "5"))
+ODDS_PRICE_TOLERANCE = Decimal(os.getenv("ODDS_PRICE_TOLERANCE", "0"))
+ODDS_MAX_STALENESS = float(os.getenv("ODDS_MAX_STALENESS", "60"))
+ODDS_FEED_OVERLAP_SECONDS = float(os.getenv("ODDS_FEED_OVERLAP_SECONDS", "30"))
+ODDS_RESYNC_SECONDS = float(os.getenv("ODDS_RESYNC_SECONDS", "600"))
+ODDS_VERIFY_MODE = os.getenv("ODDS_VERIFY_MODE", "lenient")
+
+FEED_PAGE_SIZE = 5000
+FEED_TIMEOUT_SECONDS = 5
+# updated_at строк без отметки времени в курсоре фида
+FEED_NULL_UPDATED_AT = "-infinity"
+
+
+class OddsVerificationError(ValueError):
+  """Цена ставки не прошла проверку по кэшу коэффициентов."""
+
+  def __init__(self, code: str, message: str, *, odds_id: int,
+               submitted: Optional[Decimal] = None, current: Optional[Decimal] = None):
+    super().__init__(message)
+    self.code = code
+    self.odds_id = odds_id
+    self.submitted = submitted
+    self.current = current
+
+  def to_detail(self) -> dict:
+    return {
+      "code": self.code,
+      "message": str(self),
+      "odds_id": self.odds_id,
+      "submitted_coefficient": str(self.submitted) if self.submitted is not None else None,
+      "current_coefficient": str(self.current) if self.current is not None else None,
+    }
+
+
+@dataclass(frozen=True)
+class OddsSnapshot:
+  odds_id: int
+  event_id: int
+  bet_type: str
+  coefficient: Decimal
+  updated_at: Optional[str]
+
+
+Cursor = Tuple[str, int]
+
+
+def _snapshot(row: dict) -> OddsSnapshot:
+  return OddsSnapshot(
+    odds_id=int(row["odds_id"]),
+    event_id=int(row["event_id"]),
+    bet_type=str(row["bet_type"]),
+    coefficient=Decimal(str(row["coefficient"])),
+    updated_at=row.get("updated_at"),
+  )
+
+
+def _is_active(row: dict) -> bool:
+  return bool(row.get("is_active", True))
+
+
+class OddsCache:
+  def __init__(self, *, base_url: str = SPORTS_API_URL, mode: str = ODDS_VERIFY_MODE,
+               tolerance: Decimal = ODDS_PRICE_TOLERANCE, max_staleness: float = ODDS_MAX_STALENESS,
+               overlap: float = ODDS_FEED_OVERLAP_SECONDS, resync_seconds: float = ODDS_RESYNC_SECONDS):
+    self.base_url = base_url
+    self.mode = mode if base_url else "off"
+    self.tolerance = tolerance
+    self.max_staleness = max_staleness
+    self.overlap = overlap
+    self.resync_seconds = resync_seconds
+    self._odds: Dict[int, OddsSnapshot] = {}
+    self._suspended: Set[int] = set()
+    self._cursor: Optional[Cursor] = None
+    self._synced_at: Optional[float] = None
+    self._resynced_at: Optional[float] = None
+    # Растёт при каждом изменении коэффициентов; по нему клиент понимает, что котировки устарели
+    self.version = 0
+    self._lock = threading.Lock()
+
+  @property
+  def enabled(self) -> bool:
+    return self.mode != "off"
+
+  def __len__(self) -> int:
+    return len(self._odds)
+
+  def get(self, odds_id: int) -> Optional[OddsSnapshot]:
+    return self._odds.get(odds_id)
+
+  def is_suspended(self, odds_id: int) -> bool:
+    return odds_id in self._suspended
+
+  def is_fresh(self) -> bool:
+    return self._synced_at is not None and time.monotonic() - self._synced_at <= self.max_staleness
+
+  # ---------- синхронизация ----------
+
+  def apply(self, rows: Iterable[dict]) -> int:
+    """Применяет строки дельта-фида к снимку. Возвращает число изменившихся коэффициентов."""
+    changed = 0
+    with self._lock:
+      for row in rows:
+        snap = _snapshot(row)
+        prev = self._odds.get(snap.odds_id)
+        if not _is_active(row):
+          # Неактивный коэффициент вытесняется из снимка, остаётся только его odds_id
+          if prev is not None or snap.odds_id not in self._suspended:
+            changed += 1
+          self._odds.pop(snap.odds_id, None)
+          self._suspended.add(snap.odds_id)
+          continue
+        if prev is None or prev.coefficient != snap.coefficient:
+          changed += 1
+        self._odds[snap.odds_id] = snap
+        self._suspended.discard(snap.odds_id)
+      self.version += changed
+    return changed
+
+  def mark_synced(self) -> None:
+    self._synced_at = time.monotonic()
+
+  def _held_back(self, cursor: Optional[Cursor]) -> Optional[Cursor]:
+    """Курсор, отодвинутый на окно перекрытия: поздние коммиты с меньшим updated_at."""
+    if cursor is None or cursor[0] == FEED_NULL_UPDATED_AT:
+      return cursor
+    since = datetime.fromisoformat(cursor[0]) - timedelta(seconds=self.overlap)
+    return since.isoformat(), 0
+
+  def _pages(self, cursor: Optional[Cursor]) -> Iterator[Tuple[List[dict], Cursor]]:
+    """Страницы фида после курсора и курсор после каждой из них."""
+    while True:
+      page = self._fetch(cursor)
+      rows = page.get("odds", [])
+      if rows:
+        # фид отдаёт строки строго после курсора в его порядке
+        last = rows[-1]
+        cursor = (last.get("updated_at") or FEED_NULL_UPDATED_AT, int(last["odds_id"]))
+        yield rows, cursor
+      if not page.get("has_more") or not rows:
+        return
+
+  def _fetch(self, cursor: Optional[Cursor]) -> dict:
+    params = {"limit": FEED_PAGE_SIZE}
+    if cursor:
+      params["since"], params["after_id"] = cursor
+    url = f"{self.base_url}/api/odds/changes?{urlencode(params)}"
+    with urlopen(url, timeout=FEED_TIMEOUT_SECONDS) as resp:
+      return json.loads(resp.read().decode("utf-8"))
+
+  def refresh(self) -> int:
+    """Дотягивает изменения после курсора (с окном перекрытия). Возвращает число изменений."""
+    if self._resynced_at is None or time.monotonic() - self._resynced_at >= self.resync_seconds:
+      return self.resync()
+    changed = 0
+    for rows, cursor in self._pages(self._held_back(self._cursor)):
+      changed += self.apply(rows)
+      self._cursor = cursor
+    self.mark_synced()
+    return changed
+
+  def resync(self) -> int:
+    """Перечитывает фид целиком и заменяет снимок: так вытесняются удалённые коэффициенты."""
+    odds: Dict[int, OddsSnapshot] = {}
+    suspended: Set[int] = set()
+    cursor = None
+    for rows, cursor in self._pages(None):
+      for row in rows:
+        snap = _snapshot(row)
+        if _is_active(row):
+          odds[snap.odds_id] = snap
+          suspended.discard(snap.odds_id)
+        else:
+          odds.pop(snap.odds_id, None)
+          suspended.add(snap.odds_id)
+    with self._lock:
+      changed = sum(
+        1 for odds_id in self._odds.keys() | odds.keys()
+        if getattr(self._odds.get(odds_id), "coefficient", None) != getattr(odds.get(odds_id), "coefficient", None)
+      ) + len(self._suspended ^ suspended)
+      self._odds, self._suspended = odds, suspended
+      self.version += changed
+    self._cursor = cursor
+    self._resynced_at = time.monotonic()
+    self.mark_synced()
+    return changed
+
+  async def run(self) -> None:
+    """Фоновый цикл опроса фида; запускается на старте приложения."""
+    while True:
+      try:
+        changed = await asyncio.to_thread(self.refresh)
+        if changed:
+          logger.debug("odds cache: %s rows applied, %s cached", changed, len(self))
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        logger.warning("odds cache refresh failed: %s", e)
+      await asyncio.sleep(ODDS_REFRESH_SECONDS)
+
+  # ---------- проверка ----------
+
+  def verify(self, *, odds_id: int, event_id: int, bet_type: str,
+             coefficient: Decimal) -> Optional[Decimal]:
+    """
+    Проверяет цену ставки по снимку.
+
+    Возвращает серверный коэффициент, по которому ставка принимается, или None,
+    если проверка не выполнялась (выключена, либо lenient без данных).
+    """
+    if not self.enabled:
+      return None
+
+    fresh = self.is_fresh()
+    if fresh and self.is_suspended(odds_id):
+      raise OddsVerificationError("odds_suspended", "Odds are suspended", odds_id=odds_id, submitted=coefficient)
+
+    snap = self.get(odds_id) if fresh else None
+    if snap is None:
+      if self.mode == "strict":
+        code = "unknown_odds" if self.is_fresh() else "odds_unavailable"
+        raise OddsVerificationError(code, "Odds are not available for verification",
+                                    odds_id=odds_id, submitted=coefficient)
+      return None
+
+    if snap.event_id != event_id or snap.bet_type != bet_type:
+      raise OddsVerificationError("odds_mismatch", "Odds do not belong to this event/bet type",
+                                  odds_id=odds_id, submitted=coefficient)
+    if abs(Decimal(coefficient) - snap.coefficient) > self.tolerance:
+      raise OddsVerificationError("price_changed", "Coefficient has changed",
+                                  odds_id=odds_id, submitted=coefficient, current=snap.coefficient)
+    return snap.coefficient
+
+
+odds_cache = OddsCache()
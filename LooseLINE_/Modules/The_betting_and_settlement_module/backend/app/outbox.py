@@ -0,0 +1,273 @@
+"""
+Transactional outbox для событий жизненного цикла ставок и купонов.
+
+crud пишет строку outbox_events в той же транзакции, что и изменение ставки,
+поэтому событие есть тогда и только тогда, когда изменение закоммичено.
+Релей (python -m app.outbox) читает неопубликованные события пачками по
+порядку id и отдаёт их потребителю:
+  OUTBOX_PUBLISH_URL  - POST {"events": [...]} (например, finance
+                        /api/internal/bet-events), заголовок X-Internal-Token
+  OUTBOX_BROKER_FILE  - иначе JSONL-файл, локальная замена брокера
+
+Доставка at-least-once: пачка помечается опубликованной только после
+подтверждения, при сбое отправляется целиком повторно - потребитель
+дедуплицирует по id события. Порядок внутри ставки сохраняется: активен
+один релей (pg_advisory_lock), пачки уходят строго по возрастанию id.
+"""
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, List
+from urllib.request import Request, urlopen
+
+from sqlalchemy import func, insert, select, text, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PUBLISH_URL = os.getenv("OUTBOX_PUBLISH_URL", "")
+OUTBOX_PUBLISH_TOKEN = os.getenv("OUTBOX_PUBLISH_TOKEN", "")
+OUTBOX_BROKER_FILE = os.getenv("OUTBOX_BROKER_FILE", "./outbox_events.jsonl")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_MAX_BACKOFF_SECONDS = 60.0
+
+RELAY_LOCK_ID = 7_300_035  # pg_advisory_lock: один активный релей
+
+BET_FIELDS = (
+  "bet_id", "user_id", "event_id", "event_name", "event_end_date", "odds_id", "bet_type",
+  "expected_result", "bet_amount", "coefficient", "potential_win", "status", "result",
+  "actual_win", "placed_at", "resolved_at",
+)
+
+
+COUPON_FIELDS = (
+  "coupon_id", "user_id", "coupon_code", "total_bet_amount", "total_potential_win", "number_of_bets",
+  "status", "result", "actual_win", "created_at", "resolved_at",
+)
+
+
+def _json_default(value):
+  if isinstance(value, Decimal):
+    return str(value)
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# ---------- запись (внутри транзакции crud) ----------
+
+def record_bet_event(db: Session, event_type: str, bet: models.Bet, **extra) -> None:
+  """Добавляет событие в текущую транзакцию; commit делает вызывающий код."""
+  payload = {f: getattr(bet, f) for f in BET_FIELDS}
+  payload.update(extra)
+  db.add(models.OutboxEvent(
+    aggregate_type="bet",
+    aggregate_id=bet.bet_id,
+    event_type=event_type,
+    payload=json.dumps(payload, default=_json_default),
+  ))
+
+
+def record_bet_events(db: Session, event_type: str, bets, extras: List[dict]) -> None:
+  """record_bet_event для пачки ставок одним INSERT; extras[i] - доп. поля события bets[i]."""
+  rows = []
+  for bet, extra in zip(bets, extras):
+    payload = {f: getattr(bet, f) for f in BET_FIELDS}
+    payload.update(extra)
+    rows.append({
+      "aggregate_type": "bet",
+      "aggregate_id": bet.bet_id,
+      "event_type": event_type,
+      "payload": json.dumps(payload, default=_json_default),
+      "created_at": datetime.utcnow(),
+    })
+  if rows:
+    db.execute(insert(models.OutboxEvent), rows)
+
+
+def record_coupon_event(db: Session, event_type: str, coupon: models.Coupon, **extra) -> None:
+  """Событие купона (aggregate_type=coupon); commit делает вызывающий код."""
+  payload = {f: getattr(coupon, f) for f in COUPON_FIELDS}
+  payload["bet_ids"] = [link.bet_id for link in coupon.bets]
+  payload.update(extra)
+  db.add(models.OutboxEvent(
+    aggregate_type="coupon",
+    aggregate_id=coupon.coupon_id,
+    event_type=event_type,
+    payload=json.dumps(payload, default=_json_default),
+  ))
+
+
+def status_event_type(new_status: str) -> str:
+  return "bet.settled" if new_status == "resolved" else "bet.status_changed"
+
+
+# ---------- публикация ----------
+
+def to_message(event: models.OutboxEvent) -> dict:
+  return {
+    "id": event.id,
+    "type": event.event_type,
+    "aggregate_type": event.aggregate_type,
+    "aggregate_id": event.aggregate_id,
+    "occurred_at": event.created_at.isoformat(),
+    "payload": json.loads(event.payload),
+  }
+
+
+class HttpBatchPublisher:
+  def __init__(self, url: str, token: str = "", timeout: float = 10):
+    self.url = url
+    self.token = token
+    self.timeout = timeout
+
+  def publish(self, messages: List[dict]) -> None:
+    req = Request(
+      self.url,
+      data=json.dumps({"events": messages}).encode("utf-8"),
+      headers={"Content-Type": "application/json", "X-Internal-Token": self.token},
+      method="POST",
+    )
+    # Ошибка HTTP (urllib бросает HTTPError на 4xx/5xx) - пачка уйдёт повторно
+    with urlopen(req, timeout=self.timeout) as resp:
+      resp.read()
+
+
+class FileBrokerPublisher:
+  """Локальная замена брокера: события дописываются в JSONL-файл."""
+
+  def __init__(self, path: str):
+    self.path = path
+
+  def publish(self, messages: List[dict]) -> None:
+    with open(self.path, "a", encoding="utf-8") as f:
+      for m in messages:
+        f.write(json.dumps(m, ensure_ascii=False) + "\n")
+      f.flush()
+      os.fsync(f.fileno())
+
+
+def make_publisher():
+  if OUTBOX_PUBLISH_URL:
+    return HttpBatchPublisher(OUTBOX_PUBLISH_URL, OUTBOX_PUBLISH_TOKEN)
+  return FileBrokerPublisher(OUTBOX_BROKER_FILE)
+
+
+# ---------- метрики ----------
+
+def backlog(db: Session) -> dict:
+  """Сколько событий ждут публикации и насколько отстаёт релей."""
+  count, oldest = db.execute(
+    select(func.count(models.OutboxEvent.id), func.min(models.OutboxEvent.created_at))
+    .where(models.OutboxEvent.published_at.is_(None))
+  ).one()
+  lag = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+  return {"pending_events": count, "oldest_pending_at": oldest, "lag_seconds": round(lag, 3)}
+
+
+# ---------- релей ----------
+
+class OutboxRelay:
+  def __init__(self, publisher, session_factory: Callable[[], Session],
+               batch_size: int = OUTBOX_BATCH_SIZE, poll_seconds: float = OUTBOX_POLL_SECONDS):
+    self.publisher = publisher
+    self.session_factory = session_factory
+    self.batch_size = batch_size
+    self.poll_seconds = poll_seconds
+    self.metrics = {
+      "published_total": 0,
+      "batches_total": 0,
+      "failures_total": 0,
+      "last_batch_size": 0,
+      "last_publish_ms": 0.0,
+      "last_lag_seconds": 0.0,
+    }
+
+  def run_once(self) -> int:
+    """Публикует одну пачку; возвращает число опубликованных событий."""
+    with self.session_factory() as db:
+      events = db.scalars(
+        select(models.OutboxEvent)
+        .where(models.OutboxEvent.published_at.is_(None))
+        .order_by(models.OutboxEvent.id)
+        .limit(self.batch_size)
+      ).all()
+      if not events:
+        self.metrics["last_lag_seconds"] = 0.0
+        return 0
+
+      started = time.perf_counter()
+      self.publisher.publish([to_message(e) for e in events])
+      publish_ms = (time.perf_counter() - started) * 1000
+
+      count, oldest = len(events), events[0].created_at
+      now = datetime.utcnow()
+      db.execute(
+        update(models.OutboxEvent)
+        .where(models.OutboxEvent.id.in_([e.id for e in events]))
+        .values(published_at=now)
+      )
+      db.commit()
+
+    self.metrics["published_total"] += count
+    self.metrics["batches_total"] += 1
+    self.metrics["last_batch_size"] = count
+    self.metrics["last_publish_ms"] = round(publish_ms, 1)
+    self.metrics["last_lag_seconds"] = round((now - oldest).total_seconds(), 3)
+    return count
+
+  def run_forever(self, stop: threading.Event) -> None:
+    backoff = self.poll_seconds
+    while not stop.is_set():
+      try:
+        published = self.run_once()
+        backoff = self.poll_seconds
+        if published:
+          logger.info("outbox: published %s events, lag %.3fs, publish %.1fms",
+                      published, self.metrics["last_lag_seconds"], self.metrics["last_publish_ms"])
+        if published == self.batch_size:
+          continue  # есть ещё - без паузы
+      except Exception as e:
+        self.metrics["failures_total"] += 1
+        backoff = min(backoff * 2, OUTBOX_MAX_BACKOFF_SECONDS)
+        logger.warning("outbox: publish failed (%s), retry in %.1fs", e, backoff)
+      stop.wait(backoff)
+
+
+def main() -> None:
+  from .db import DATABASE_URL, SessionLocal, engine
+
+  logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+  stop = threading.Event()
+  signal.signal(signal.SIGTERM, lambda *_: stop.set())
+  signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+  relay = OutboxRelay(make_publisher(), SessionLocal)
+  if not DATABASE_URL.startswith("postgresql"):
+    relay.run_forever(stop)
+    return
+
+  # Лок держит отдельное соединение, пока релей жив; остальные экземпляры ждут
+  with engine.connect() as lock_conn:
+    while not stop.is_set():
+      if lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": RELAY_LOCK_ID}).scalar():
+        logger.info("outbox: relay lock acquired")
+        try:
+          relay.run_forever(stop)
+        finally:
+          lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": RELAY_LOCK_ID})
+        return
+      lock_conn.rollback()
+      stop.wait(5)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,230 @@
+"""
+Ограничение частоты запросов (token bucket) по user_id и по IP.
+
+Правила задаются по имени маршрута в RATE_LIMITS:
+  "bets.create=5/s:20,bets.calculate=50/s:100"  -> 5 запросов/с, запас (burst) 20
+Для IP лимит умножается на RATE_LIMIT_IP_FACTOR (за одним NAT бывает много
+пользователей). Превышение - 429 с Retry-After, до обращения к БД.
+
+Хранилище:
+  - по умолчанию в памяти процесса: RATE_LIMIT_SHARDS словарей со своими
+    локами, значение - кортеж (tokens, last, full_at). Ключ, чей bucket уже
+    заполнился бы до краёв, ничем не отличается от отсутствующего - такие
+    ключи вычищаются ленивым проходом по шарду раз в RATE_LIMIT_SWEEP_SECONDS;
+  - RATE_LIMIT_REDIS_URL - общий для всех воркеров bucket в Redis (Lua-скрипт,
+    время берётся у Redis, TTL ключа = время до полного заполнения). Если Redis
+    недоступен, запрос не блокируется - считаем по локальному хранилищу.
+    После ошибки Redis не опрашивается RATE_LIMIT_REDIS_RETRY_SECONDS
+    (circuit breaker): запросы не ждут таймаут сокета, в лог - одна запись
+    на отключение.
+
+Включение: RATE_LIMIT_ENABLED (по умолчанию true).
+"""
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, status
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMITS = os.getenv(
+  "RATE_LIMITS",
+  "bets.create=5/s:20,bets.calculate=50/s:100,coupons.create=2/s:10,cashout.accept=2/s:5",
+)
+RATE_LIMIT_IP_FACTOR = float(os.getenv("RATE_LIMIT_IP_FACTOR", "5"))
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+RATE_LIMIT_REDIS_RETRY_SECONDS = float(os.getenv("RATE_LIMIT_REDIS_RETRY_SECONDS", "30"))
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "64"))
+RATE_LIMIT_SWEEP_SECONDS = float(os.getenv("RATE_LIMIT_SWEEP_SECONDS", "30"))
+
+
+@dataclass(frozen=True)
+class Rule:
+  rate: float  # токенов в секунду
+  burst: float  # ёмкость bucket
+
+  def scaled(self, factor: float) -> "Rule":
+    return Rule(self.rate * factor, self.burst * factor)
+
+
+def parse_rules(spec: str) -> Dict[str, Rule]:
+  """'name=5/s:20,other=1/s:5' -> {name: Rule(5, 20), ...}"""
+  rules = {}
+  for item in filter(None, (part.strip() for part in spec.split(","))):
+    name, _, value = item.partition("=")
+    rate, _, burst = value.partition(":")
+    rate = rate.strip().removesuffix("/s")
+    rules[name.strip()] = Rule(float(rate), float(burst or rate))
+  return rules
+
+
+class MemoryBucketStore:
+  """Шардированные bucket'ы в памяти процесса."""
+
+  def __init__(self, shards: int = RATE_LIMIT_SHARDS, sweep_seconds: float = RATE_LIMIT_SWEEP_SECONDS,
+               clock=time.monotonic):
+    self._mask = (1 << max(shards - 1, 0).bit_length()) - 1
+    self._data = [dict() for _ in range(self._mask + 1)]
+    self._locks = [threading.Lock() for _ in range(self._mask + 1)]
+    self._next_sweep = [0.0] * (self._mask + 1)
+    self._sweep_seconds = sweep_seconds
+    self._clock = clock
+
+  def __len__(self) -> int:
+    return sum(len(d) for d in self._data)
+
+  def take_now(self, key: str, rule: Rule) -> float:
+    """Забирает токен; 0 - разрешено, иначе через сколько секунд появится токен."""
+    shard = hash(key) & self._mask
+    data = self._data[shard]
+    now = self._clock()
+    with self._locks[shard]:
+      if now >= self._next_sweep[shard]:
+        self._sweep(data, now)
+        self._next_sweep[shard] = now + self._sweep_seconds
+
+      state = data.get(key)
+      if state is None or now >= state[2]:
+        tokens = rule.burst
+      else:
+        tokens = min(rule.burst, state[0] + (now - state[1]) * rule.rate)
+
+      retry = 0.0
+      if tokens >= 1:
+        tokens -= 1
+      else:
+        retry = (1 - tokens) / rule.rate
+      data[key] = (tokens, now, now + (rule.burst - tokens) / rule.rate)
+      return retry
+
+  async def take(self, key: str, rule: Rule) -> float:
+    return self.take_now(key, rule)
+
+  def sweep(self) -> None:
+    """Проход по всем шардам сразу (обычно шарды чистятся лениво, по одному)."""
+    now = self._clock()
+    for data, lock in zip(self._data, self._locks):
+      with lock:
+        self._sweep(data, now)
+
+  @staticmethod
+  def _sweep(data: dict, now: float) -> None:
+    idle = [k for k, (_, _, full_at) in data.items() if now >= full_at]
+    for k in idle:
+      del data[k]
+
+
+# Тот же алгоритм в Redis; время - redis TIME, чтобы воркеры не зависели от своих часов
+_REDIS_TAKE = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local s = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(s[1])
+if tokens == nil then
+  tokens = burst
+else
+  tokens = math.min(burst, tokens + (now - tonumber(s[2])) * rate)
+end
+local retry = 0
+if tokens >= 1 then tokens = tokens - 1 else retry = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1)
+return tostring(retry)
+"""
+
+
+class RedisBucketStore:
+  """Общие для всех воркеров bucket'ы; при недоступности Redis - локальный фолбэк."""
+
+  def __init__(self, url: str, prefix: str = "ratelimit:", *, client=None,
+               retry_seconds: float = RATE_LIMIT_REDIS_RETRY_SECONDS, clock=time.monotonic):
+    if client is None:
+      try:
+        import redis.asyncio as redis_asyncio
+      except ImportError as e:
+        raise RuntimeError("RATE_LIMIT_REDIS_URL requires the 'redis' package") from e
+      client = redis_asyncio.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.2)
+    self._redis = client
+    self._script = self._redis.register_script(_REDIS_TAKE)
+    self._prefix = prefix
+    self._fallback = MemoryBucketStore(clock=clock)
+    self._retry_seconds = retry_seconds
+    self._clock = clock
+    self._open_until: Optional[float] = None  # не None - Redis отключён до этого момента
+
+  async def take(self, key: str, rule: Rule) -> float:
+    if self._open_until is not None and self._clock() < self._open_until:
+      return self._fallback.take_now(key, rule)
+    try:
+      retry = float(await self._script(keys=[self._prefix + key], args=[rule.rate, rule.burst]))
+    except Exception as e:
+      if self._open_until is None:
+        logger.warning("rate limit redis unavailable, using local buckets for %ss: %s", self._retry_seconds, e)
+      self._open_until = self._clock() + self._retry_seconds
+      return self._fallback.take_now(key, rule)
+    if self._open_until is not None:
+      logger.info("rate limit redis is back")
+      self._open_until = None
+    return retry
+
+
+class RateLimiter:
+  def __init__(self, rules: Dict[str, Rule], store, *, ip_factor: float = RATE_LIMIT_IP_FACTOR,
+               enabled: bool = RATE_LIMIT_ENABLED):
+    self.rules = rules
+    self.ip_rules = {name: rule.scaled(ip_factor) for name, rule in rules.items()}
+    self.store = store
+    self.enabled = enabled
+
+  async def check(self, name: str, *, user_id: Optional[str] = None, ip: Optional[str] = None) -> None:
+    """Списывает токен с bucket'ов пользователя и IP; при нехватке - 429."""
+    rule = self.rules.get(name)
+    if not self.enabled or rule is None:
+      return
+    retry = 0.0
+    if ip:
+      retry = await self.store.take(f"{name}|ip|{ip}", self.ip_rules[name])
+    if user_id and not retry:
+      retry = await self.store.take(f"{name}|user|{user_id}", rule)
+    if retry:
+      raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, slow down",
+        headers={"Retry-After": str(max(1, math.ceil(retry)))},
+      )
+
+
+def client_ip(request: Request) -> Optional[str]:
+  if RATE_LIMIT_TRUST_FORWARDED:
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+      return forwarded.split(",", 1)[0].strip()
+  return request.client.host if request.client else None
+
+
+def _make_store():
+  if RATE_LIMIT_REDIS_URL:
+    return RedisBucketStore(RATE_LIMIT_REDIS_URL)
+  return MemoryBucketStore()
+
+
+limiter = RateLimiter(parse_rules(RATE_LIMITS), _make_store())
+
+
+def limit(name: str):
+  """
+  Зависимость маршрута: лимит по IP и по user_id из пути.
+  user_id из тела запроса маршрут проверяет сам - limiter.check(name, user_id=...).
+  """
+  async def dependency(request: Request) -> None:
+    await limiter.check(name, user_id=request.path_params.get("user_id"), ip=client_ip(request))
+  return dependency
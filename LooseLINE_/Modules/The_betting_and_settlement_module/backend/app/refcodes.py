@@ -0,0 +1,92 @@
+"""
+Генератор уникальных кодов (купоны и др.) без обращения к БД на каждый код.
+
+Код = префикс + время(6) + узел(4) + счётчик(4), всё в base36:
+  CPN 0F3K2A 00A7 0001   ->  "CPN0F3K2A00A70001" (17 символов, влезает в String(20))
+
+  время    - секунды от 2025-01-01 UTC (36^6 с ~ 68 лет)
+  узел     - номер процесса: REFERENCE_NODE_ID, либо nextval('reference_node_seq')
+             в PostgreSQL один раз на процесс, либо pid для локальной SQLite
+  счётчик  - до 36^4 = 1 679 616 кодов в секунду на процесс; при переполнении
+             или переводе часов назад берём следующую секунду (логические часы)
+
+Пока номера узлов живых процессов различны, коды не совпадают.
+"""
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+EPOCH = 1735689600  # 2025-01-01T00:00:00Z
+
+TIME_WIDTH = 6
+NODE_WIDTH = 4
+COUNTER_WIDTH = 4
+NODE_SPACE = 36 ** NODE_WIDTH
+COUNTER_SPACE = 36 ** COUNTER_WIDTH
+
+CODE_MAX_LENGTH = 20  # coupons.coupon_code String(20)
+
+
+def _b36(n: int, width: int) -> str:
+  chars = []
+  for _ in range(width):
+    n, r = divmod(n, 36)
+    chars.append(ALPHABET[r])
+  return "".join(reversed(chars))
+
+
+def default_node_id() -> int:
+  env = os.getenv("REFERENCE_NODE_ID")
+  if env:
+    return int(env)
+
+  from .db import DATABASE_URL, engine
+  if DATABASE_URL.startswith("postgresql"):
+    from sqlalchemy import text
+    with engine.connect() as conn:
+      return int(conn.execute(text("SELECT nextval('reference_node_seq')")).scalar_one())
+  # SQLite для разработки - один хост, pid живых процессов различны
+  return os.getpid()
+
+
+class ReferenceGenerator:
+  def __init__(self, prefix: str, node_source: Callable[[], int] = default_node_id,
+               clock: Callable[[], float] = time.time):
+    if len(prefix) + TIME_WIDTH + NODE_WIDTH + COUNTER_WIDTH > CODE_MAX_LENGTH:
+      raise ValueError("Prefix is too long for a 20-character code")
+    self.prefix = prefix
+    self._node_source = node_source
+    self._clock = clock
+    self._lock = threading.Lock()
+    self._pid: Optional[int] = None
+    self._node = ""
+    self._ts = 0
+    self._counter = 0
+
+  def _ensure_node(self) -> None:
+    # После fork дочерний процесс обязан взять собственный номер узла
+    pid = os.getpid()
+    if self._pid != pid:
+      self._node = _b36(self._node_source() % NODE_SPACE, NODE_WIDTH)
+      self._pid = pid
+      self._ts = 0
+      self._counter = 0
+
+  def next(self) -> str:
+    with self._lock:
+      self._ensure_node()
+      now = int(self._clock()) - EPOCH
+      if now > self._ts:
+        self._ts, self._counter = now, 0
+      elif self._counter >= COUNTER_SPACE:
+        self._ts, self._counter = self._ts + 1, 0
+      counter = self._counter
+      self._counter += 1
+      ts = self._ts
+      node = self._node
+    return f"{self.prefix}{_b36(ts, TIME_WIDTH)}{node}{_b36(counter, COUNTER_WIDTH)}"
+
+
+coupon_codes = ReferenceGenerator("CPN")
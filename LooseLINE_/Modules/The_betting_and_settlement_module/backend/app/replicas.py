@@ -0,0 +1,183 @@
+"""
+Маршрутизация чтений на реплики PostgreSQL.
+
+Запись (приём ставок, купонов, cash-out, смена статуса) всегда идёт в primary
+через db.get_session. Эндпоинты чтения берут сессию из get_read_session /
+get_user_read_session:
+  - реплики из DB_REPLICA_URLS (через запятую) по кругу, только здоровые;
+  - фоновая проверка раз в REPLICA_HEALTH_SECONDS: SELECT на реплике и её
+    отставание (replay lag); недоступная или отстающая больше
+    REPLICA_MAX_LAG_SECONDS реплика выводится из ротации до следующей проверки;
+  - read-your-writes: ответ на запись несёт метку времени записи (cookie
+    LAST_WRITE_COOKIE и заголовок LAST_WRITE_HEADER); клиент с меткой моложе
+    REPLICA_STICKY_SECONDS читает из primary - на любом процессе и в любом
+    эндпоинте чтения, включая GET /bets/{bet_id};
+  - нет здоровых реплик или список пуст - чтение из primary, как раньше.
+"""
+import asyncio
+import itertools
+import logging
+import math
+import os
+import time
+from typing import List, Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from starlette.middleware.base import BaseHTTPMiddleware
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from .db import DB_ASYNC, DB_MAX_OVERFLOW, DB_POOL_SIZE, AsyncSessionLocal, SessionLocal, async_database_url
+
+logger = logging.getLogger(__name__)
+
+DB_REPLICA_URLS = [u.strip() for u in os.getenv("DB_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_HEALTH_SECONDS = float(os.getenv("REPLICA_HEALTH_SECONDS", "5"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+LAST_WRITE_COOKIE = "ll_last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+# 0, если реплика проиграла всё полученное WAL (простаивающий primary не даёт ложного лага)
+LAG_SQL = text(
+  "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+  "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+  def __init__(self, url: str, async_mode: bool):
+    self.url = url
+    self.async_mode = async_mode
+    self.is_postgres = url.startswith("postgresql")
+    if async_mode:
+      self.engine = create_async_engine(async_database_url(url), pool_size=DB_POOL_SIZE,
+                                        max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+      self.session_factory = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+    else:
+      connect_args = {} if self.is_postgres else {"check_same_thread": False}
+      self.engine = create_engine(url, connect_args=connect_args, pool_pre_ping=True, future=True)
+      self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine, future=True)
+    self.healthy = True
+    self.lag_seconds = 0.0
+
+  def _lag_sql(self):
+    return LAG_SQL if self.is_postgres else text("SELECT 0")
+
+  def check_sync(self) -> float:
+    with self.engine.connect() as conn:
+      return float(conn.execute(self._lag_sql()).scalar() or 0)
+
+  async def check_async(self) -> float:
+    async with self.engine.connect() as conn:
+      return float((await conn.execute(self._lag_sql())).scalar() or 0)
+
+
+class ReplicaRouter:
+  def __init__(self, urls: List[str] = DB_REPLICA_URLS, *, async_mode: bool = DB_ASYNC,
+               sticky_seconds: float = REPLICA_STICKY_SECONDS, max_lag: float = REPLICA_MAX_LAG_SECONDS):
+    self.replicas = [Replica(u, async_mode) for u in urls]
+    self.async_mode = async_mode
+    self.sticky_seconds = sticky_seconds
+    self.max_lag = max_lag
+    self._rr = itertools.count()
+
+  @property
+  def enabled(self) -> bool:
+    return bool(self.replicas)
+
+  # ---------- read-your-writes ----------
+
+  def mark_write(self, request: Request) -> None:
+    """Запрос что-то записал: ReadYourWritesMiddleware вернёт клиенту метку."""
+    if self.enabled:
+      request.state.last_write = time.time()
+
+  def is_sticky(self, last_write: Optional[str]) -> bool:
+    """Метка клиента (unix-время записи) ещё в окне REPLICA_STICKY_SECONDS."""
+    if not last_write:
+      return False
+    try:
+      written_at = float(last_write)
+    except ValueError:
+      return False
+    # abs: метку ставят разные процессы, их часы могут немного расходиться
+    return abs(time.time() - written_at) < self.sticky_seconds
+
+  # ---------- выбор ----------
+
+  def pick(self) -> Optional[Replica]:
+    healthy = [r for r in self.replicas if r.healthy]
+    if not healthy:
+      return None
+    return healthy[next(self._rr) % len(healthy)]
+
+  def session(self, last_write: Optional[str] = None):
+    """Новая сессия для чтения: реплика, либо primary (свежая запись клиента / нет реплик)."""
+    replica = None if self.is_sticky(last_write) else self.pick()
+    if replica is not None:
+      return replica.session_factory()
+    return AsyncSessionLocal() if self.async_mode else SessionLocal()
+
+  # ---------- проверка здоровья ----------
+
+  def _mark(self, replica: Replica, lag: Optional[float], error: Optional[Exception] = None) -> None:
+    healthy = lag is not None and lag <= self.max_lag
+    if healthy != replica.healthy:
+      logger.warning("replica %s is %s (lag=%s, error=%s)", replica.engine.url.render_as_string(),
+                     "back in rotation" if healthy else "out of rotation", lag, error)
+    replica.healthy = healthy
+    replica.lag_seconds = lag if lag is not None else float("inf")
+
+  async def check(self) -> None:
+    for replica in self.replicas:
+      try:
+        if replica.async_mode:
+          lag = await replica.check_async()
+        else:
+          lag = await asyncio.to_thread(replica.check_sync)
+        self._mark(replica, lag)
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        self._mark(replica, None, e)
+
+  async def run(self) -> None:
+    """Фоновый цикл проверки реплик; запускается на старте приложения."""
+    while True:
+      await self.check()
+      await asyncio.sleep(REPLICA_HEALTH_SECONDS)
+
+
+router = ReplicaRouter()
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+  """Отдаёт клиенту метку записи, поставленную router.mark_write."""
+
+  async def dispatch(self, request: Request, call_next):
+    response = await call_next(request)
+    last_write = getattr(request.state, "last_write", None)
+    if last_write is not None:
+      value = f"{last_write:.3f}"
+      response.headers[LAST_WRITE_HEADER] = value
+      response.set_cookie(LAST_WRITE_COOKIE, value, max_age=math.ceil(router.sticky_seconds),
+                          httponly=True, samesite="lax")
+    return response
+
+
+def last_write_marker(request: Request) -> Optional[str]:
+  return request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+
+
+async def get_read_session(request: Request):
+  """Зависимость для чтений: реплика, либо primary сразу после записи клиента."""
+  db = router.session(last_write_marker(request))
+  try:
+    yield db
+  finally:
+    if router.async_mode:
+      await db.close()
+    else:
+      db.close()
@@ -0,0 +1,24 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(value: Any):
+  # Decimal отдаём строкой - так же, как pydantic v2 сериализует схемы
+  if isinstance(value, Decimal):
+    return str(value)
+  raise TypeError
+
+
+class FastJSONResponse(JSONResponse):
+  """
+  JSON через orjson для больших списков из строк-словарей.
+
+  Содержимое не проходит через response_model: форма строк должна совпадать
+  со схемой (поля берутся из schemas.*.model_fields).
+  """
+
+  def render(self, content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
@@ -1,68 +1,185 @@
+from datetime import datetime
 from decimal import Decimal
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response, status
 
-from .. import crud, models, schemas
-from ..db import get_db
+from .. import auth, bulk_status, crud, idempotency, models, ratelimit, replicas, schemas
+from ..db import get_session, run_db
+from ..odds_cache import OddsVerificationError
+from ..responses import FastJSONResponse
 
 router = APIRouter(prefix="/bets", tags=["bets"])
 
+# Курсор следующей страницы отдаём в заголовке, чтобы тело осталось списком
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
-@router.post("/calculate", response_model=schemas.BetCalculateResponse)
+# Списки отдаются строками-кортежами нужных колонок через orjson (см. responses)
+BET_FIELDS = tuple(schemas.Bet.model_fields)
+
+
+@router.post("/calculate", response_model=schemas.BetCalculateResponse,
+             dependencies=[Depends(ratelimit.limit("bets.calculate"))])
 def calculate_bet(body: schemas.BetCalculateRequest):
   result = crud.calculate_potential_win(body.bet_amount, body.coefficient)
   return schemas.BetCalculateResponse(**result)
 
 
-@router.post("/", response_model=schemas.Bet, status_code=status.HTTP_201_CREATED)
-def create_bet(
-  bet: schemas.BetCreate,
-  db: Session = Depends(get_db),
-):
+@router.post("/calculate/bulk", response_model=schemas.BulkCalculateResponse,
+             dependencies=[Depends(ratelimit.limit("bets.calculate"))])
+def calculate_bulk(body: schemas.BulkCalculateRequest):
+  results = crud.calculate_coupons_win((c.bet_amount, c.coefficients) for c in body.coupons)
+  total_stake = sum((r["betAmount"] for r in results), Decimal("0"))
+  total_win = sum((r["potentialWin"] for r in results), Decimal("0"))
+  return schemas.BulkCalculateResponse(
+    results=results,
+    totalStake=total_stake,
+    totalPotentialWin=total_win,
+    totalProfit=total_win - total_stake,
+  )
+
+
+@router.post("/calculate/system", response_model=schemas.SystemCalculateResponse,
+             dependencies=[Depends(ratelimit.limit("bets.calculate"))])
+def calculate_system(body: schemas.SystemCalculateRequest):
   try:
-    created = crud.create_bet(db, payload=bet)
-    return created
+    result = crud.calculate_system_win(
+      body.bet_amount,
+      body.coefficients,
+      body.size,
+      include_combinations=body.include_combinations,
+    )
   except ValueError as e:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+  return schemas.SystemCalculateResponse(**result)
+
+
+@router.post("/", response_model=schemas.Bet, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(ratelimit.limit("bets.create"))])
+async def create_bet(
+  bet: schemas.BetCreate,
+  request: Request,
+  db=Depends(get_session),
+  idempotency_key: Optional[str] = Header(None, alias=idempotency.IDEMPOTENCY_HEADER, max_length=100),
+):
+  await ratelimit.limiter.check("bets.create", user_id=bet.user_id)
+
+  async def place():
+    try:
+      created = schemas.Bet.model_validate(await run_db(db, crud.create_bet, payload=bet))
+    except OddsVerificationError as e:
+      # Клиент должен обновить коэффициент и переподтвердить ставку
+      raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.to_detail())
+    except ValueError as e:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    replicas.router.mark_write(request)
+    return created
+
+  if not idempotency_key:
+    return await place()
+  return await idempotency.execute(db, scope="bets", key=idempotency_key, payload=bet, handler=place)
 
 
 @router.get("/{bet_id}", response_model=schemas.Bet)
-def get_bet(
+async def get_bet(
   bet_id: int,
-  db: Session = Depends(get_db),
+  db=Depends(replicas.get_read_session),
 ):
-  bet = crud.get_bet(db, bet_id)
+  bet = await run_db(db, crud.get_bet, bet_id)
   if not bet:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bet not found")
   return bet
 
 
-@router.get("/user/{user_id}", response_model=List[schemas.Bet])
-def list_user_bets(
+@router.get("/user/{user_id}", response_model=List[schemas.Bet], response_class=FastJSONResponse)
+async def list_user_bets(
   user_id: str,
-  db: Session = Depends(get_db),
+  limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+  cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+  bet_status: Optional[str] = Query(None, alias="status", pattern="^(open|cancelled|resolved|cashout)$"),
+  date_from: Optional[datetime] = None,
+  date_to: Optional[datetime] = None,
+  db=Depends(replicas.get_read_session),
 ):
-  return crud.list_user_bets(db, user_id=user_id)
+  try:
+    rows, next_cursor = await run_db(
+      db,
+      crud.list_user_bet_rows,
+      user_id=user_id,
+      fields=BET_FIELDS,
+      limit=limit,
+      cursor=cursor,
+      status=bet_status,
+      date_from=date_from,
+      date_to=date_to,
+    )
+  except ValueError as e:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+  headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+  return FastJSONResponse(rows, headers=headers)
 
 
 @router.patch("/{bet_id}/status", response_model=schemas.Bet)
-def update_status(
+async def update_status(
   bet_id: int,
   body: schemas.BetStatusUpdate,
-  db: Session = Depends(get_db),
+  request: Request,
+  db=Depends(get_session),
 ):
-  bet = crud.update_bet_status(db, bet_id=bet_id, new_status=body.new_status)
+  try:
+    bet = await run_db(db, crud.update_bet_status, bet_id=bet_id, new_status=body.new_status, result=body.result)
+  except ValueError as e:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
   if not bet:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bet not found")
+  replicas.router.mark_write(request)
   return bet
 
 
 
+@router.post("/status/bulk", response_model=schemas.BulkStatusJob,
+             dependencies=[Depends(auth.require_admin)])
+async def bulk_update_status(
+  body: schemas.BulkStatusUpdate,
+  response: Response,
+  background_tasks: BackgroundTasks,
+  db=Depends(get_session),
+):
+  """Change status of all bets of an event (or a list of bets); void refunds the stakes"""
+  job = await run_db(
+    db,
+    bulk_status.create_job,
+    event_id=body.event_id,
+    bet_ids=body.bet_ids,
+    new_status=body.new_status,
+    reason=body.reason,
+  )
+  if job.total <= bulk_status.BULK_STATUS_SYNC_LIMIT:
+    return await run_db(db, bulk_status.run_job, job.job_id)
+
+  # Большой набор - в фоне; прогресс: GET /bets/status/bulk/{job_id}
+  background_tasks.add_task(bulk_status.run_job_in_background, job.job_id)
+  response.status_code = status.HTTP_202_ACCEPTED
+  return job
+
+
+@router.get("/status/bulk/{job_id}", response_model=schemas.BulkStatusJob,
+            dependencies=[Depends(auth.require_admin)])
+async def bulk_status_job(job_id: str, db=Depends(get_session)):
+  job = await run_db(db, bulk_status.get_job, job_id)
+  if not job:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+  return job
+
+
 @router.get("/balance/{user_id}", response_model=schemas.UserBalance)
-def get_balance(
+async def get_balance(
   user_id: str,
-  db: Session = Depends(get_db),
+  db=Depends(replicas.get_read_session),
+  primary=Depends(get_session),
 ):
-  return crud.get_user_balance(db, user_id)
+  balance = await run_db(db, crud.find_user_balance, user_id)
+  if balance is None:
+    # Первое обращение создаёт пользователя - это запись, только в primary
+    balance = await run_db(primary, crud.get_user_balance, user_id)
+  return balance
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from .. import cashout, ratelimit, replicas, schemas
+from ..db import get_session, run_db
+
+router = APIRouter(prefix="/cashout", tags=["cashout"])
+
+
+@router.get("/user/{user_id}", response_model=schemas.CashoutQuotes)
+async def quote_user(user_id: str, db=Depends(replicas.get_read_session)):
+  """Cash-out quotes for every open bet and coupon of a user"""
+  return await run_db(db, cashout.quote_user, user_id)
+
+
+async def _accept(request: Request, db, fn, **kwargs):
+  await ratelimit.limiter.check("cashout.accept", user_id=kwargs["user_id"])
+  try:
+    accepted = await run_db(db, fn, **kwargs)
+  except LookupError as e:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+  except cashout.CashoutError as e:
+    # Клиент должен взять свежую котировку и подтвердить заново
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.to_detail())
+  replicas.router.mark_write(request)
+  return accepted
+
+
+@router.post("/bets/{bet_id}", response_model=schemas.Bet,
+             dependencies=[Depends(ratelimit.limit("cashout.accept"))])
+async def cash_out_bet(bet_id: int, body: schemas.CashoutAccept, request: Request, db=Depends(get_session)):
+  return await _accept(request, db, cashout.accept_bet_cashout, bet_id=bet_id, user_id=body.user_id,
+                       quoted_amount=body.amount)
+
+
+@router.post("/coupons/{coupon_id}", response_model=schemas.Coupon,
+             dependencies=[Depends(ratelimit.limit("cashout.accept"))])
+async def cash_out_coupon(coupon_id: int, body: schemas.CashoutAccept, request: Request,
+                          db=Depends(get_session)):
+  return await _accept(request, db, cashout.accept_coupon_cashout, coupon_id=coupon_id, user_id=body.user_id,
+                       quoted_amount=body.amount)
@@ -1,38 +1,73 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
 
-from .. import crud, schemas
-from ..db import get_db
+from .. import crud, idempotency, ratelimit, replicas, schemas
+from ..db import get_session, run_db
+from ..responses import FastJSONResponse
+from .bets import NEXT_CURSOR_HEADER
 
 router = APIRouter(prefix="/coupons", tags=["coupons"])
 
-
-@router.get("/user/{user_id}", response_model=List[schemas.Coupon])
-def list_user_coupons(
-  user_id: str,
-  db: Session = Depends(get_db),
-):
-  """Get all coupons for a user"""
-  return crud.list_user_coupons(db, user_id=user_id)
+COUPON_FIELDS = tuple(schemas.Coupon.model_fields)
 
 
-@router.post("/", response_model=schemas.Coupon, status_code=status.HTTP_201_CREATED)
-def create_coupon(
-  body: schemas.CouponCreate,
-  db: Session = Depends(get_db),
+@router.get("/user/{user_id}", response_model=List[schemas.Coupon], response_class=FastJSONResponse)
+async def list_user_coupons(
+  user_id: str,
+  limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+  cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+  coupon_status: Optional[str] = Query(None, alias="status"),
+  date_from: Optional[datetime] = None,
+  date_to: Optional[datetime] = None,
+  db=Depends(replicas.get_read_session),
 ):
+  """Get a page of coupons for a user, newest first"""
   try:
-    coupon = crud.create_coupon(
+    rows, next_cursor = await run_db(
       db,
-      user_id=body.user_id,
-      bet_ids=body.bet_ids,
-      total_amount=body.total_bet_amount,
+      crud.list_user_coupon_rows,
+      user_id=user_id,
+      fields=COUPON_FIELDS,
+      limit=limit,
+      cursor=cursor,
+      status=coupon_status,
+      date_from=date_from,
+      date_to=date_to,
     )
   except ValueError as exc:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+  headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+  return FastJSONResponse(rows, headers=headers)
+
+
+@router.post("/", response_model=schemas.Coupon, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(ratelimit.limit("coupons.create"))])
+async def create_coupon(
+  body: schemas.CouponCreate,
+  request: Request,
+  db=Depends(get_session),
+  idempotency_key: Optional[str] = Header(None, alias=idempotency.IDEMPOTENCY_HEADER, max_length=100),
+):
+  await ratelimit.limiter.check("coupons.create", user_id=body.user_id)
+
+  async def place():
+    try:
+      coupon = await run_db(
+        db,
+        crud.create_coupon,
+        user_id=body.user_id,
+        bet_ids=body.bet_ids,
+        total_amount=body.total_bet_amount,
+      )
+    except ValueError as exc:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    replicas.router.mark_write(request)
+    return schemas.Coupon.model_validate(coupon)
 
-  return coupon
+  if not idempotency_key:
+    return await place()
+  return await idempotency.execute(db, scope="coupons", key=idempotency_key, payload=body, handler=place)
 
 
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+
+from .. import outbox, schemas
+from ..db import get_session, run_db
+
+router = APIRouter(prefix="/outbox", tags=["service"])
+
+
+@router.get("/metrics", response_model=schemas.OutboxBacklog)
+async def outbox_metrics(db=Depends(get_session)):
+  """Backlog and delivery lag of the bet-events outbox"""
+  return await run_db(db, outbox.backlog)
@@ -0,0 +1,38 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from .. import exposure, schemas
+from ..db import get_session, run_db
+
+router = APIRouter(prefix="/risk", tags=["risk"])
+
+
+@router.get("/exposure", response_model=List[schemas.EventExposure])
+async def top_exposure(
+  limit: int = Query(10, ge=1, le=500),
+  source: str = Query("db", pattern="^(memory|db)$"),
+  db=Depends(get_session),
+):
+  """Top-N events by worst-case liability across open bets and coupons"""
+  # db - общая таблица event_exposure; memory - счётчики только этого процесса
+  # (точны при одном воркере, см. app/exposure.py)
+  if source == "memory":
+    return exposure.book.top_events(limit)
+  return await run_db(db, exposure.load_top_events, limit)
+
+
+@router.get("/exposure/{event_id}", response_model=schemas.EventExposure)
+async def event_exposure(
+  event_id: int,
+  source: str = Query("db", pattern="^(memory|db)$"),
+  db=Depends(get_session),
+):
+  if source == "memory":
+    ev = exposure.book.event(event_id)
+  else:
+    ev = await run_db(db, exposure.load_event, event_id)
+  if not ev:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No open exposure for event")
+  return ev
+
@@ -2,7 +2,7 @@ from datetime import datetime
 from decimal import Decimal
 from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class BetBase(BaseModel):
@@ -43,6 +43,55 @@ class BetCalculateResponse(BaseModel):
   profit: Decimal
 
 
+class CouponCalculateRequest(BaseModel):
+  bet_amount: Decimal = Field(..., example=100.0)
+  coefficients: List[Decimal] = Field(..., example=[1.85, 2.1, 3.4])
+
+
+class CouponCalculateResponse(BaseModel):
+  betAmount: Decimal
+  coefficients: List[Decimal]
+  totalCoefficient: Decimal
+  potentialWin: Decimal
+  profit: Decimal
+
+
+class BulkCalculateRequest(BaseModel):
+  coupons: List[CouponCalculateRequest] = Field(..., max_length=10000)
+
+
+class BulkCalculateResponse(BaseModel):
+  results: List[CouponCalculateResponse]
+  totalStake: Decimal
+  totalPotentialWin: Decimal
+  totalProfit: Decimal
+
+
+class SystemCalculateRequest(BaseModel):
+  bet_amount: Decimal = Field(..., example=10.0)  # ставка на одну комбинацию
+  coefficients: List[Decimal] = Field(..., example=[1.85, 2.1, 3.4])
+  size: int = Field(..., ge=1, example=2)
+  include_combinations: bool = False
+
+
+class SystemCombination(BaseModel):
+  legs: List[int]
+  totalCoefficient: Decimal
+  potentialWin: Decimal
+
+
+class SystemCalculateResponse(BaseModel):
+  betAmount: Decimal
+  size: int
+  numberOfCombinations: int
+  totalStake: Decimal
+  potentialWin: Decimal
+  profit: Decimal
+  minWin: Decimal
+  maxWin: Decimal
+  combinations: List[SystemCombination] = []
+
+
 class CouponCreate(BaseModel):
   user_id: str
   bet_ids: List[int]
@@ -67,8 +116,48 @@ class Coupon(BaseModel):
 
 class BetStatusUpdate(BaseModel):
   new_status: str = Field(..., pattern="^(open|cancelled|resolved)$")
+  result: Optional[str] = Field(None, pattern="^(won|lost)$")
   reason: Optional[str] = None
 
+  @model_validator(mode="after")
+  def result_on_resolve(self):
+    if (self.new_status == "resolved") != (self.result is not None):
+      raise ValueError("result (won|lost) is required for resolved and only for resolved")
+    return self
+
+
+
+class BulkStatusUpdate(BaseModel):
+  event_id: Optional[int] = None
+  bet_ids: Optional[List[int]] = Field(None, max_length=10000)
+  # Расчёт требует исхода каждой ставки - массово только void и возврат в open
+  new_status: str = Field(..., pattern="^(open|cancelled)$")
+  reason: Optional[str] = Field(None, max_length=500)
+
+  @model_validator(mode="after")
+  def one_selector(self):
+    if (self.event_id is None) == (not self.bet_ids):
+      raise ValueError("Specify either event_id or bet_ids")
+    return self
+
+
+class BulkStatusJob(BaseModel):
+  job_id: str
+  status: str
+  event_id: Optional[int]
+  new_status: str
+  reason: Optional[str]
+  total: int
+  updated: int
+  skipped: int
+  refunded: int
+  refunded_amount: Decimal
+  error: Optional[str]
+  created_at: datetime
+  finished_at: Optional[datetime]
+
+  class Config:
+    from_attributes = True
 
 
 class UserBalance(BaseModel):
@@ -78,3 +167,54 @@ class UserBalance(BaseModel):
 
   class Config:
     from_attributes = True
+
+
+class OutcomeExposure(BaseModel):
+  bet_type: str
+  open_bets: int
+  total_stake: Decimal
+  total_payout: Decimal
+  coupon_payout: Decimal
+  liability: Decimal
+
+
+class EventExposure(BaseModel):
+  event_id: int
+  open_bets: int
+  total_stake: Decimal
+  worst_outcome: str
+  worst_case_liability: Decimal
+  outcomes: List[OutcomeExposure]
+
+
+class OutboxBacklog(BaseModel):
+  pending_events: int
+  oldest_pending_at: Optional[datetime]
+  lag_seconds: float
+
+
+class CashoutQuote(BaseModel):
+  kind: str
+  id: int
+  stake: Decimal
+  potential_win: Decimal
+  amount: Optional[Decimal]  # None - cash-out сейчас недоступен
+  reason: Optional[str] = None
+  legs: List[Optional[int]]
+
+  class Config:
+    from_attributes = True
+
+
+class CashoutQuotes(BaseModel):
+  user_id: str
+  odds_version: int
+  priced_at: datetime
+  bets: List[CashoutQuote]
+  coupons: List[CashoutQuote]
+  total_available: Decimal
+
+
+class CashoutAccept(BaseModel):
+  user_id: str
+  amount: Decimal = Field(..., gt=0, description="Amount from the quote the user confirmed")
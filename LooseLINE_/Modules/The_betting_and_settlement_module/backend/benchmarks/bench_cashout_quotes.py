@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Латентность котировки cash-out для пользователя с сотнями открытых ставок.
+
+Запуск из каталога backend:
+  python benchmarks/bench_cashout_quotes.py --bets 500 --coupons 50 --repeat 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app import cashout, models  # noqa: E402
+from app.db import Base  # noqa: E402
+from app.odds_cache import OddsCache  # noqa: E402
+
+
+def seed(db, bets: int, coupons: int) -> None:
+  db.add(models.User(id="bench", username="bench"))
+  rows = [
+    models.Bet(
+      user_id="bench", event_id=i, odds_id=i, bet_type="1", bet_amount=Decimal("25.00"),
+      coefficient=Decimal("1.85"), potential_win=Decimal("46.25"), status="open",
+    )
+    for i in range(bets)
+  ]
+  db.add_all(rows)
+  db.flush()
+  for c in range(coupons):
+    coupon = models.Coupon(
+      user_id="bench", coupon_code=f"BENCH{c}", total_bet_amount=Decimal("10"),
+      total_potential_win=Decimal("63.31"), status="open", number_of_bets=3,
+    )
+    db.add(coupon)
+    db.flush()
+    db.add_all(models.CouponBet(coupon_id=coupon.coupon_id, bet_id=rows[(c * 3 + k) % bets].bet_id) for k in range(3))
+  db.commit()
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--bets", type=int, default=500)
+  parser.add_argument("--coupons", type=int, default=50)
+  parser.add_argument("--repeat", type=int, default=200)
+  args = parser.parse_args()
+
+  engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+  Base.metadata.create_all(bind=engine)
+  db = sessionmaker(bind=engine)()
+  seed(db, args.bets, args.coupons)
+
+  cache = OddsCache(base_url="http://sports", mode="lenient")
+  cache.apply({"odds_id": i, "event_id": i, "bet_type": "1", "coefficient": "1.70"} for i in range(args.bets))
+  cache.mark_synced()
+
+  timings = []
+  for _ in range(args.repeat):
+    started = time.perf_counter()
+    quotes = cashout.quote_user(db, "bench", cache=cache)
+    timings.append((time.perf_counter() - started) * 1000)
+
+  q = statistics.quantiles(timings, n=100)
+  print(f"bets={len(quotes['bets'])} coupons={len(quotes['coupons'])} repeat={args.repeat}")
+  print(f"p50 {q[49]:.2f} ms   p95 {q[94]:.2f} ms   p99 {q[98]:.2f} ms")
+
+
+if __name__ == "__main__":
+  main()
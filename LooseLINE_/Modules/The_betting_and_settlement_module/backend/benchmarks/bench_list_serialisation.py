@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+CPU на сериализацию 1k строк истории ставок: ORM + schemas.Bet + json
+(как FastAPI делает для response_model) против колонок-кортежей + orjson.
+
+Запуск из каталога backend:
+  python benchmarks/bench_list_serialisation.py --rows 5000 --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from sqlalchemy import create_engine, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app import models, schemas  # noqa: E402
+from app.db import Base  # noqa: E402
+from app.responses import FastJSONResponse  # noqa: E402
+
+
+def seed(db, rows: int) -> None:
+  start = datetime(2025, 1, 1)
+  db.add_all(
+    models.Bet(
+      user_id="bench", event_id=i % 300, event_name=f"Team {i % 40} vs Team {i % 41}",
+      event_end_date=start + timedelta(days=i % 30), expected_result="П1", odds_id=i,
+      bet_type="1", bet_amount=Decimal("125.50"), coefficient=Decimal("1.85"),
+      potential_win=Decimal("232.18"), status="open", placed_at=start + timedelta(seconds=i),
+    )
+    for i in range(rows)
+  )
+  db.commit()
+
+
+def orm_path(db) -> bytes:
+  bets = db.scalars(select(models.Bet).where(models.Bet.user_id == "bench")).all()
+  validated = [schemas.Bet.model_validate(b) for b in bets]
+  return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+def row_path(db, fields) -> bytes:
+  columns = [getattr(models.Bet, f) for f in fields]
+  rows = db.execute(select(*columns).where(models.Bet.user_id == "bench")).all()
+  return FastJSONResponse([dict(zip(fields, r)) for r in rows]).body
+
+
+def measure(fn, repeat: int) -> float:
+  fn()  # прогрев
+  started = time.process_time()
+  for _ in range(repeat):
+    fn()
+  return (time.process_time() - started) / repeat
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--rows", type=int, default=5000)
+  parser.add_argument("--repeat", type=int, default=20)
+  args = parser.parse_args()
+
+  engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+  Base.metadata.create_all(bind=engine)
+  db = sessionmaker(bind=engine)()
+  seed(db, args.rows)
+  fields = tuple(schemas.Bet.model_fields)
+
+  # Каждый прогон - с чистой identity map, как новый запрос
+  def orm():
+    db.expunge_all()
+    return orm_path(db)
+
+  def rows():
+    db.expunge_all()
+    return row_path(db, fields)
+
+  assert json.loads(orm()) == json.loads(rows())
+
+  per_1k = 1000 / args.rows
+  orm_cpu = measure(orm, args.repeat) * per_1k * 1000
+  row_cpu = measure(rows, args.repeat) * per_1k * 1000
+  print(f"rows={args.rows} repeat={args.repeat}")
+  print(f"orm + schemas.Bet + json : {orm_cpu:7.2f} ms CPU / 1k rows")
+  print(f"columns + orjson         : {row_cpu:7.2f} ms CPU / 1k rows")
+  print(f"speedup                  : {orm_cpu / row_cpu:7.2f}x")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1 @@
+"""Tests for the betting and settlement backend."""
@@ -0,0 +1,31 @@
+"""
+Test configuration: in-memory SQLite database with the betting models.
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db import Base
+from app import models  # noqa: F401  регистрирует таблицы в Base.metadata
+
+
+@pytest.fixture(scope="function")
+def engine():
+  engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+  )
+  Base.metadata.create_all(bind=engine)
+  yield engine
+  Base.metadata.drop_all(bind=engine)
+  engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def db_session(engine):
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+  session = SessionLocal()
+  yield session
+  session.close()
@@ -0,0 +1,61 @@
+import io
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from app import bets_report, models
+
+
+def _seed(db):
+  start = datetime(2025, 12, 20, 10, 0)
+  for i in range(6):
+    db.add(models.Bet(
+      user_id="u1" if i < 4 else "u2", event_id=1 + i % 2, event_name=f"Match {1 + i % 2}",
+      odds_id=i, bet_type="1" if i % 3 else "X", bet_amount=Decimal("10.00"),
+      coefficient=Decimal("2.00"), potential_win=Decimal("20.00"),
+      status="open", placed_at=start + timedelta(minutes=25 * i),
+    ))
+  db.commit()
+
+
+def _run(engine, argv):
+  out, err = io.StringIO(), io.StringIO()
+  args = bets_report.build_parser().parse_args(argv)
+  with engine.connect() as conn:
+    bets_report.run(conn, args, out, err)
+  return out.getvalue(), err.getvalue()
+
+
+def test_rows_stream_with_filters_and_formats(engine, db_session):
+  _seed(db_session)
+
+  out, _ = _run(engine, ["rows", "--user", "u1", "--format", "ndjson", "--chunk-size", "2"])
+  rows = [json.loads(line) for line in out.splitlines()]
+  assert [r["bet_id"] for r in rows] == [4, 3, 2, 1]
+  assert rows[0]["bet_amount"] == "10.00"
+
+  out, err = _run(engine, ["rows", "--event", "2", "--limit", "2"])
+  assert len(out.splitlines()) == 2 + 2  # заголовок, разделитель, 2 строки
+  assert "bets: 2  total stake: 20.00" in err
+
+  out, _ = _run(engine, ["rows", "--from", "2025-12-20T11:00", "--format", "csv", "--order", "asc"])
+  lines = out.splitlines()
+  assert lines[0].startswith("bet_id,user_id") and len(lines) == 1 + 3
+
+
+def test_aggregates(engine, db_session):
+  _seed(db_session)
+
+  out, _ = _run(engine, ["agg", "--by", "event", "--format", "ndjson"])
+  by_event = {r["event_id"]: r for r in map(json.loads, out.splitlines())}
+  assert by_event[1]["bets"] == 3 and by_event[1]["event_name"] == "Match 1"
+  assert Decimal(by_event[2]["total_stake"]) == Decimal("30")
+
+  out, _ = _run(engine, ["agg", "--by", "outcome", "--format", "csv"])
+  assert len(out.splitlines()) == 1 + 4
+
+  out, _ = _run(engine, ["agg", "--by", "hour", "--format", "ndjson"])
+  hours = [json.loads(line) for line in out.splitlines()]
+  assert [(h["hour"], h["bets"]) for h in hours] == [
+    ("2025-12-20 10:00:00", 3), ("2025-12-20 11:00:00", 2), ("2025-12-20 12:00:00", 1),
+  ]
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import auth, bulk_status, crud, exposure, models, schemas
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def fresh_book(monkeypatch):
+  book = exposure.ExposureBook()
+  monkeypatch.setattr(exposure, "book", book)
+  return book
+
+
+def _bet(db, event_id, user_id="u1", amount="10"):
+  return crud.create_bet(db, payload=schemas.BetCreate(
+    user_id=user_id, event_id=event_id, odds_id=1, bet_type="1",
+    bet_amount=Decimal(amount), coefficient=Decimal("2.00"),
+  ))
+
+
+def _ledger(db, bet, transaction_type):
+  db.add(models.BetTransaction(user_id=bet.user_id, bet_id=bet.bet_id,
+                               transaction_type=transaction_type, amount=bet.bet_amount))
+  db.commit()
+
+
+def test_void_event_in_chunks_refunds_open_bets(db_session, fresh_book):
+  bets = [_bet(db_session, 7, user_id=f"u{i % 2}", amount=str(10 + i)) for i in range(5)]
+  _bet(db_session, 8)
+  crud.update_bet_status(db_session, bets[0].bet_id, "resolved", result="lost")  # уже рассчитана - без возврата
+  # Возвращаются только списанные ставки: bets[4] не списана, bets[2] уже возвращена
+  for bet in bets[1:4]:
+    _ledger(db_session, bet, bulk_status.STAKE_TYPE)
+  _ledger(db_session, bets[2], bulk_status.REFUND_TYPE)
+  balance_before = db_session.get(models.UserBalance, "u1").balance
+
+  job = bulk_status.create_job(db_session, event_id=7, bet_ids=None, new_status="cancelled", reason="postponed")
+  assert (job.total, job.skipped) == (4, 1)
+  job = bulk_status.run_job(db_session, job.job_id, chunk_size=2)
+
+  assert (job.status, job.updated, job.refunded, job.refunded_amount) == ("done", 4, 2, Decimal("24"))
+  statuses = db_session.query(models.Bet.status).filter(models.Bet.event_id == 7).all()
+  assert sorted(s for (s,) in statuses) == ["cancelled"] * 4 + ["resolved"]
+
+  refunds = db_session.query(models.BetTransaction).filter_by(transaction_type="refund", user_id="u1").all()
+  assert sorted(r.amount for r in refunds) == [Decimal("11"), Decimal("13")]
+  assert db_session.query(models.BetTransaction).filter_by(transaction_type="refund", user_id="u0").count() == 1
+  assert db_session.get(models.UserBalance, "u1").balance == balance_before + Decimal("24")
+
+  assert fresh_book.event(7) is None and fresh_book.event(8)["open_bets"] == 1
+  events = db_session.query(models.OutboxEvent).filter_by(event_type="bet.status_changed").count()
+  assert events == 4
+
+
+def test_only_source_statuses_change(db_session):
+  open_bet, settled, cashed, voided = (_bet(db_session, 5) for _ in range(4))
+  crud.update_bet_status(db_session, settled.bet_id, "resolved", result="won")
+  crud.update_bet_status(db_session, cashed.bet_id, "cashout")
+  crud.update_bet_status(db_session, voided.bet_id, "cancelled")
+
+  job = bulk_status.create_job(db_session, event_id=5, bet_ids=None, new_status="open", reason=None)
+  job = bulk_status.run_job(db_session, job.job_id)
+
+  assert (job.total, job.updated, job.skipped) == (1, 1, 3)
+  statuses = [db_session.get(models.Bet, b.bet_id).status for b in (open_bet, settled, cashed, voided)]
+  assert statuses == ["open", "resolved", "cashout", "open"]
+
+
+def test_bet_ids_selection_skips_bets_already_in_status(db_session):
+  b1, b2, b3 = (_bet(db_session, 1) for _ in range(3))
+  crud.update_bet_status(db_session, b2.bet_id, "cancelled")
+
+  job = bulk_status.create_job(db_session, event_id=None, bet_ids=[b3.bet_id, b1.bet_id, b2.bet_id, 999],
+                               new_status="cancelled", reason=None)
+  job = bulk_status.run_job(db_session, job.job_id, chunk_size=1)
+  assert (job.total, job.updated, job.skipped, job.refunded) == (2, 2, 1, 0)
+
+
+def test_selector_validation():
+  with pytest.raises(ValueError):
+    schemas.BulkStatusUpdate(new_status="cancelled")
+  with pytest.raises(ValueError):
+    schemas.BulkStatusUpdate(event_id=1, bet_ids=[1], new_status="cancelled")
+
+
+def test_stale_jobs_claimed_once_and_resumed(db_session):
+  bets = [_bet(db_session, 3) for _ in range(3)]
+  stale = bulk_status.create_job(db_session, event_id=3, bet_ids=None, new_status="cancelled", reason=None)
+  fresh = bulk_status.create_job(db_session, event_id=4, bet_ids=None, new_status="cancelled", reason=None)
+  # Процесс упал после первой пачки
+  bulk_status._apply_chunk(db_session, stale, 0, 1)
+  stale.status, stale.heartbeat_at = "running", datetime.utcnow() - timedelta(hours=1)
+  db_session.commit()
+
+  assert bulk_status.claim_stale_jobs(db_session) == [stale.job_id]
+  assert bulk_status.claim_stale_jobs(db_session) == []
+  assert fresh.job_id not in bulk_status.claim_stale_jobs(
+    db_session, now=datetime.utcnow() + timedelta(seconds=bulk_status.BULK_STATUS_STALE_SECONDS - 5))
+
+  job = bulk_status.run_job(db_session, stale.job_id, chunk_size=1)
+  assert (job.status, job.total, job.updated) == ("done", 3, 3)
+  assert {db_session.get(models.Bet, b.bet_id).status for b in bets} == {"cancelled"}
+
+
+def test_bulk_endpoints_require_admin_token(monkeypatch):
+  client = TestClient(app)
+  body = {"event_id": 1, "new_status": "cancelled"}
+
+  monkeypatch.setattr(auth, "ADMIN_API_TOKEN", "")
+  assert client.post("/bets/status/bulk", json=body).status_code == 503
+
+  monkeypatch.setattr(auth, "ADMIN_API_TOKEN", "secret")
+  assert client.post("/bets/status/bulk", json=body).status_code == 401
+  assert client.post("/bets/status/bulk", json=body, headers={"X-Admin-Token": "wrong"}).status_code == 401
+  assert client.get("/bets/status/bulk/x", headers={"X-Admin-Token": "wrong"}).status_code == 401
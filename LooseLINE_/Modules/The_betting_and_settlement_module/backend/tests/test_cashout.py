@@ -0,0 +1,134 @@
+import json
+import re
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event as sa_event
+
+from app import cashout, crud, exposure, models, schemas
+from app.odds_cache import OddsCache
+
+
+def _cache(*rows):
+  cache = OddsCache(base_url="http://sports", mode="lenient")
+  cache.apply([
+    {"odds_id": odds_id, "event_id": odds_id, "bet_type": "1", "coefficient": coeff,
+     "is_active": active, "updated_at": f"2025-12-20T10:00:{odds_id:02d}"}
+    for odds_id, coeff, active in rows
+  ])
+  cache.mark_synced()
+  return cache
+
+
+def _place(db, odds_id, coefficient, amount="100"):
+  return crud.create_bet(db, payload=schemas.BetCreate(
+    user_id="u1", event_id=odds_id, odds_id=odds_id, bet_type="1",
+    bet_amount=Decimal(amount), coefficient=Decimal(coefficient),
+  ))
+
+
+def test_quote_prices_bets_and_coupons_in_one_pass(db_session):
+  b1 = _place(db_session, 1, "2.00")
+  b2 = _place(db_session, 2, "3.00")
+  b3 = _place(db_session, 3, "1.50")
+  legs = [_place(db_session, 1, "2.00"), _place(db_session, 2, "3.00")]
+  coupon = crud.create_coupon(db_session, user_id="u1", bet_ids=[b.bet_id for b in legs], total_amount=Decimal("10"))
+  cache = _cache((1, "1.60", True), (2, "3.00", True), (3, "1.50", False))
+
+  quotes = cashout.quote_user(db_session, "u1", cache=cache)
+  by_id = {q.id: q for q in quotes["bets"]}
+
+  # 100 * 2.00 / 1.60 = 125.00, минус 5% маржи
+  assert by_id[b1.bet_id].amount == Decimal("118.75")
+  assert by_id[b2.bet_id].amount == Decimal("95.00")
+  assert by_id[b3.bet_id].amount is None and by_id[b3.bet_id].reason == cashout.ODDS_SUSPENDED
+  # Ноги купона отдельно не котируются
+  assert set(by_id) == {b1.bet_id, b2.bet_id, b3.bet_id}
+  # 10 * (2.00 * 3.00) / (1.60 * 3.00) = 12.50 -> 11.87 (вниз до копеек)
+  assert quotes["coupons"][0].id == coupon.coupon_id
+  assert quotes["coupons"][0].amount == Decimal("11.87")
+  assert quotes["total_available"] == Decimal("225.62")
+
+  crud.update_bet_status(db_session, legs[0].bet_id, "resolved", result="lost")  # нога проиграла
+  assert cashout.quote_user(db_session, "u1", cache=cache)["coupons"][0].reason == cashout.LEG_LOST
+
+
+def test_accept_settles_bet_with_ledger_in_one_transaction(db_session):
+  exposure.book.replace({})
+  bet = _place(db_session, 1, "2.00")
+  cache = _cache((1, "1.60", True))
+  before = db_session.get(models.UserBalance, "u1").balance
+
+  with pytest.raises(cashout.CashoutError) as exc:
+    cashout.accept_bet_cashout(db_session, bet_id=bet.bet_id, user_id="u1",
+                               quoted_amount=Decimal("120.00"), cache=cache)
+  assert exc.value.code == "price_changed" and exc.value.current == Decimal("118.75")
+
+  bet = cashout.accept_bet_cashout(db_session, bet_id=bet.bet_id, user_id="u1",
+                                   quoted_amount=Decimal("118.75"), cache=cache)
+  assert (bet.status, bet.actual_win) == ("cashout", Decimal("118.75"))
+
+  tx = db_session.query(models.BetTransaction).one()
+  assert (tx.transaction_type, tx.amount, tx.bet_id) == ("cashout", Decimal("118.75"), bet.bet_id)
+  assert db_session.get(models.UserBalance, "u1").balance == before + Decimal("118.75")
+  assert exposure.book.events() == {}
+  assert db_session.query(models.OutboxEvent).order_by(models.OutboxEvent.id.desc()).first().event_type == "bet.cashed_out"
+
+  with pytest.raises(cashout.CashoutError) as exc:
+    cashout.accept_bet_cashout(db_session, bet_id=bet.bet_id, user_id="u1",
+                               quoted_amount=Decimal("1"), cache=cache)
+  assert exc.value.code == "not_open"
+
+
+def test_coupon_leg_only_with_coupon(db_session):
+  legs = [_place(db_session, 1, "2.00"), _place(db_session, 2, "3.00")]
+  coupon = crud.create_coupon(db_session, user_id="u1", bet_ids=[b.bet_id for b in legs], total_amount=Decimal("10"))
+  cache = _cache((1, "1.60", True), (2, "3.00", True))
+
+  with pytest.raises(cashout.CashoutError) as exc:
+    cashout.accept_bet_cashout(db_session, bet_id=legs[0].bet_id, user_id="u1",
+                               quoted_amount=Decimal("1"), cache=cache)
+  assert exc.value.code == cashout.COUPON_LEG
+
+  coupon = cashout.accept_coupon_cashout(db_session, coupon_id=coupon.coupon_id, user_id="u1",
+                                         quoted_amount=Decimal("11.87"), cache=cache)
+  assert coupon.status == "cashout"
+  event = db_session.query(models.OutboxEvent).order_by(models.OutboxEvent.id.desc()).first()
+  assert (event.aggregate_type, event.aggregate_id, event.event_type) == ("coupon", coupon.coupon_id, "coupon.cashed_out")
+  assert json.loads(event.payload)["bet_ids"] == [b.bet_id for b in legs]
+
+
+def test_coupon_cashout_loads_legs_in_one_query(db_session, engine):
+  legs = [_place(db_session, i, "2.00") for i in (1, 2, 3, 4)]
+  coupon = crud.create_coupon(db_session, user_id="u1", bet_ids=[b.bet_id for b in legs], total_amount=Decimal("10"))
+  cache = _cache(*((i, "2.00", True) for i in (1, 2, 3, 4)))
+  quote = cashout.quote_user(db_session, "u1", cache=cache)["coupons"][0]
+  db_session.expire_all()
+
+  statements = []
+
+  def record(conn, cursor, statement, *args):
+    statements.append(statement)
+
+  sa_event.listen(engine, "before_cursor_execute", record)
+  try:
+    cashout.accept_coupon_cashout(db_session, coupon_id=coupon.coupon_id, user_id="u1",
+                                  quoted_amount=quote.amount, cache=cache)
+  finally:
+    sa_event.remove(engine, "before_cursor_execute", record)
+  leg_reads = [s for s in statements if s.lstrip().startswith("SELECT") and re.search(r"\bbets\b", s)]
+  assert len(leg_reads) == 1
+
+
+def test_no_balance_row_fails_cashout(db_session):
+  bet = _place(db_session, 1, "2.00")
+  db_session.delete(db_session.get(models.UserBalance, "u1"))
+  db_session.commit()
+
+  with pytest.raises(cashout.CashoutError) as exc:
+    cashout.accept_bet_cashout(db_session, bet_id=bet.bet_id, user_id="u1",
+                               quoted_amount=Decimal("118.75"), cache=_cache((1, "1.60", True)))
+  assert exc.value.code == "no_balance"
+  db_session.rollback()
+  assert db_session.get(models.Bet, bet.bet_id).status == "open"
+  assert db_session.query(models.BetTransaction).count() == 0
@@ -0,0 +1,15 @@
+import pytest
+
+from app.db import async_database_url
+
+
+def test_async_database_url_uses_asyncpg_and_maps_sslmode():
+  url = async_database_url("postgresql://u:p@postgres:5432/looseline_betting?sslmode=disable")
+  assert url.drivername == "postgresql+asyncpg"
+  assert url.query == {"ssl": "disable"}
+  assert url.database == "looseline_betting"
+
+
+def test_async_mode_is_postgres_only():
+  with pytest.raises(RuntimeError):
+    async_database_url("sqlite:///./looseline.db")
@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+import pytest
+
+from app import crud, exposure, models, schemas
+
+
+@pytest.fixture(autouse=True)
+def fresh_book(monkeypatch):
+  book = exposure.ExposureBook()
+  monkeypatch.setattr(exposure, "book", book)
+  return book
+
+
+def _bet(db, event_id, bet_type, amount, coefficient):
+  return crud.create_bet(db, payload=schemas.BetCreate(
+    user_id="u1", event_id=event_id, odds_id=1, bet_type=bet_type,
+    bet_amount=Decimal(amount), coefficient=Decimal(coefficient),
+  ))
+
+
+def _persisted(db):
+  book = exposure.ExposureBook()
+  book.load(db)
+  return book.events()
+
+
+def test_counters_follow_bets_coupons_and_settlement(db_session, fresh_book):
+  b1 = _bet(db_session, 1, "1", "100", "2.00")
+  _bet(db_session, 1, "2", "50", "3.00")
+  b3 = _bet(db_session, 2, "X", "10", "3.50")
+
+  ev = fresh_book.event(1)
+  assert ev["open_bets"] == 2
+  assert ev["total_stake"] == Decimal("150")
+  # исход "2": 150 выплаты - 150 ставок = 0; исход "1": 200 - 150 = 50
+  assert ev["worst_outcome"] == "1"
+  assert ev["worst_case_liability"] == Decimal("50")
+
+  crud.create_coupon(db_session, user_id="u1", bet_ids=[b1.bet_id, b3.bet_id], total_amount=Decimal("10"))
+  assert fresh_book.event(2)["outcomes"][0]["coupon_payout"] == Decimal("70.00")
+
+  crud.update_bet_status(db_session, b1.bet_id, "resolved", result="lost")
+  ev = fresh_book.event(1)
+  assert ev["open_bets"] == 1
+  assert ev["total_stake"] == Decimal("50")
+  assert _persisted(db_session) == fresh_book.events()
+
+
+def test_rebuild_matches_incremental(db_session, fresh_book):
+  b1 = _bet(db_session, 1, "1", "100", "2.00")
+  b2 = _bet(db_session, 2, "2", "20", "1.50")
+  crud.create_coupon(db_session, user_id="u1", bet_ids=[b1.bet_id, b2.bet_id], total_amount=Decimal("5"))
+  crud.update_bet_status(db_session, b2.bet_id, "cancelled")
+  incremental = fresh_book.events()
+
+  db_session.query(models.EventExposure).delete()
+  db_session.commit()
+  assert exposure.rebuild(db_session, chunk_size=1) == 1
+  assert exposure.book.events() == incremental
+  assert _persisted(db_session) == incremental
+  assert [e["event_id"] for e in exposure.book.top_events(5)] == [1]
+
+
+def test_db_queries_select_top_events_and_drop_closed_outcomes(db_session, fresh_book):
+  b1 = _bet(db_session, 1, "1", "100", "2.00")
+  _bet(db_session, 2, "1", "10", "30.00")
+  _bet(db_session, 3, "X", "10", "1.50")
+
+  assert [e["event_id"] for e in exposure.load_top_events(db_session, 2)] == [2, 1]
+  assert exposure.load_event(db_session, 3) == fresh_book.event(3)
+
+  crud.update_bet_status(db_session, b1.bet_id, "cancelled")
+  assert db_session.query(models.EventExposure).filter_by(event_id=1).count() == 0
+  assert exposure.load_event(db_session, 1) is None
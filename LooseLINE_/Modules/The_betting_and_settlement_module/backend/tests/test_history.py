@@ -0,0 +1,104 @@
+"""
+Tests for keyset-paginated bet and coupon history.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app import crud, models, schemas
+
+BET_FIELDS = tuple(schemas.Bet.model_fields)
+COUPON_FIELDS = tuple(schemas.Coupon.model_fields)
+
+
+def _bets(db, user_id, **kwargs):
+  return crud.list_user_bet_rows(db, user_id, fields=BET_FIELDS, **kwargs)
+
+
+def _add_bets(db, user_id, count, start=datetime(2025, 1, 1), status="open"):
+  for i in range(count):
+    db.add(models.Bet(
+      user_id=user_id,
+      event_id=1,
+      odds_id=1,
+      bet_type="1",
+      bet_amount=Decimal("10"),
+      coefficient=Decimal("2"),
+      potential_win=Decimal("20"),
+      status=status,
+      # Пары ставок с одинаковым placed_at проверяют tie-break по bet_id
+      placed_at=start + timedelta(minutes=i // 2),
+    ))
+  db.commit()
+
+
+class TestListUserBets:
+  def test_pages_cover_all_bets_once_in_order(self, db_session):
+    _add_bets(db_session, "u1", 7)
+    _add_bets(db_session, "u2", 3)
+
+    seen, cursor = [], None
+    while True:
+      page, cursor = _bets(db_session, "u1", limit=3, cursor=cursor)
+      seen.extend(b["bet_id"] for b in page)
+      if not cursor:
+        break
+
+    assert seen == [7, 6, 5, 4, 3, 2, 1]
+
+  def test_status_and_date_filters(self, db_session):
+    _add_bets(db_session, "u1", 4)
+    _add_bets(db_session, "u1", 2, start=datetime(2025, 2, 1), status="resolved")
+
+    resolved, _ = _bets(db_session, "u1", status="resolved")
+    january, _ = _bets(db_session, "u1", date_to=datetime(2025, 1, 31))
+
+    assert {b["bet_id"] for b in resolved} == {5, 6}
+    assert {b["bet_id"] for b in january} == {1, 2, 3, 4}
+
+  def test_invalid_cursor(self, db_session):
+    with pytest.raises(ValueError):
+      _bets(db_session, "u1", cursor="not-a-cursor")
+
+
+class TestListUserCoupons:
+  def test_coupon_pages(self, db_session):
+    db_session.add(models.User(id="u1", username="user_u1"))
+    for i in range(5):
+      db_session.add(models.Coupon(
+        user_id="u1",
+        coupon_code=f"CPN_{i}",
+        total_bet_amount=Decimal("10"),
+        total_potential_win=Decimal("30"),
+        number_of_bets=2,
+        created_at=datetime(2025, 1, 1) + timedelta(hours=i),
+      ))
+    db_session.commit()
+
+    pages, cursor = [], None
+    for _ in range(3):
+      page, cursor = crud.list_user_coupon_rows(db_session, "u1", fields=COUPON_FIELDS, limit=2, cursor=cursor)
+      pages += page
+
+    assert [c["coupon_code"] for c in pages] == [
+      "CPN_4", "CPN_3", "CPN_2", "CPN_1", "CPN_0",
+    ]
+    assert cursor is None
+
+
+class TestFastListPath:
+  def test_row_path_matches_schema_serialisation(self, db_session):
+    import json
+
+    from app.responses import FastJSONResponse
+
+    _add_bets(db_session, "u1", 5)
+    rows, cursor = _bets(db_session, "u1", limit=3)
+
+    expected = [
+      schemas.Bet.model_validate(db_session.get(models.Bet, bet_id)).model_dump(mode="json")
+      for bet_id in (5, 4, 3)
+    ]
+    assert json.loads(FastJSONResponse(rows).body) == expected
+    assert crud.decode_cursor(cursor) == (datetime(2025, 1, 1, 0, 1), 3)
@@ -0,0 +1,170 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import idempotency, models, schemas
+from app.db import Base, get_db
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+  idempotency.cache.clear()
+  yield
+  idempotency.cache.clear()
+
+
+@pytest.fixture
+def client(engine):
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+  def override():
+    db = SessionLocal()
+    try:
+      yield db
+    finally:
+      db.close()
+
+  app.dependency_overrides[get_db] = override
+  yield TestClient(app)
+  app.dependency_overrides.clear()
+
+
+BET = {"user_id": "u1", "event_id": 1, "odds_id": 1, "bet_type": "1", "bet_amount": "10", "coefficient": "2.0"}
+
+
+def _bets(engine):
+  with engine.connect() as conn:
+    return conn.scalar(select(func.count()).select_from(models.Bet))
+
+
+def test_replay_returns_original_bet(client, engine):
+  first = client.post("/bets/", json=BET, headers={"Idempotency-Key": "k1"})
+  idempotency.cache.clear()  # повтор идёт из таблицы, а не из LRU
+  second = client.post("/bets/", json=BET, headers={"Idempotency-Key": "k1"})
+
+  assert first.status_code == second.status_code == 201
+  assert second.json() == first.json()
+  assert second.headers["Idempotent-Replayed"] == "true"
+  assert _bets(engine) == 1
+
+
+def test_key_reuse_with_other_body_is_rejected(client):
+  client.post("/bets/", json=BET, headers={"Idempotency-Key": "k2"})
+  r = client.post("/bets/", json={**BET, "bet_amount": "20"}, headers={"Idempotency-Key": "k2"})
+  assert r.status_code == 422
+
+
+def test_failed_request_is_not_remembered(client):
+  r = client.post("/coupons/", json={"user_id": "u1", "bet_ids": [999], "total_bet_amount": "5"},
+                  headers={"Idempotency-Key": "k3"})
+  assert r.status_code == 400
+  r = client.post("/bets/", json=BET, headers={"Idempotency-Key": "k3"})
+  assert r.status_code == 201
+
+
+def test_concurrent_duplicates_run_once(tmp_path):
+  engine = create_engine(f"sqlite:///{tmp_path / 'idem.db'}", connect_args={"check_same_thread": False})
+  Base.metadata.create_all(bind=engine)
+  SessionLocal = sessionmaker(bind=engine)
+  payload = schemas.CouponCreate(user_id="u1", bet_ids=[1], total_bet_amount=5)
+  calls = []
+
+  async def handler():
+    calls.append(1)
+    await asyncio.sleep(0.2)
+    return {"ok": len(calls)}
+
+  async def one():
+    with SessionLocal() as db:
+      return await idempotency.execute(db, scope="coupons", key="same", payload=payload, handler=handler)
+
+  async def burst():
+    return await asyncio.gather(*(one() for _ in range(5)))
+
+  responses = asyncio.run(burst())
+
+  assert len(calls) == 1
+  assert {r.body for r in responses} == {b'{"ok":1}'}
+  engine.dispose()
+
+
+def test_waits_for_claim_held_by_another_process(tmp_path, monkeypatch):
+  engine = create_engine(f"sqlite:///{tmp_path / 'idem.db'}", connect_args={"check_same_thread": False})
+  Base.metadata.create_all(bind=engine)
+  SessionLocal = sessionmaker(bind=engine)
+  payload = schemas.CouponCreate(user_id="u1", bet_ids=[1], total_bet_amount=5)
+  req_hash = idempotency.request_hash(payload)
+  with SessionLocal() as db:
+    db.add(models.IdempotencyKey(scope="coupons", idem_key="other", request_hash=req_hash))
+    db.commit()
+
+  async def owner_finishes():
+    await asyncio.sleep(0.2)
+    with SessionLocal() as db:
+      idempotency._store(db, "coupons", "other", idempotency.StoredResponse(req_hash, 201, '{"ok": "owner"}'))
+
+  async def handler():
+    raise AssertionError("must not run while another process owns the key")
+
+  async def scenario():
+    with SessionLocal() as db:
+      replay, _ = await asyncio.gather(
+        idempotency.execute(db, scope="coupons", key="other", payload=payload, handler=handler),
+        owner_finishes(),
+      )
+    return replay
+
+  assert asyncio.run(scenario()).body == b'{"ok":"owner"}'
+  engine.dispose()
+
+
+def test_claim_commits_together_with_the_write(tmp_path):
+  engine = create_engine(f"sqlite:///{tmp_path / 'idem.db'}", connect_args={"check_same_thread": False})
+  Base.metadata.create_all(bind=engine)
+  SessionLocal = sessionmaker(bind=engine)
+  payload = schemas.CouponCreate(user_id="u1", bet_ids=[1], total_bet_amount=5)
+  seen = []
+
+  def claims():
+    with engine.connect() as conn:
+      return conn.scalar(select(func.count()).select_from(models.IdempotencyKey))
+
+  async def handler():
+    seen.append(claims())  # заявка ещё не закоммичена - упавший владелец её не оставит
+    db.add(models.User(id="u1", username="u1", email="u1@example.com"))
+    db.commit()
+    seen.append(claims())
+    return {"ok": True}
+
+  with SessionLocal() as db:
+    asyncio.run(idempotency.execute(db, scope="coupons", key="tx", payload=payload, handler=handler))
+
+  assert seen == [0, 1]
+  engine.dispose()
+
+
+def test_unanswered_claim_is_never_taken_over(tmp_path, monkeypatch):
+  engine = create_engine(f"sqlite:///{tmp_path / 'idem.db'}", connect_args={"check_same_thread": False})
+  Base.metadata.create_all(bind=engine)
+  SessionLocal = sessionmaker(bind=engine)
+  payload = schemas.CouponCreate(user_id="u1", bet_ids=[1], total_bet_amount=5)
+  monkeypatch.setattr(idempotency, "IDEMPOTENCY_LOCK_SECONDS", 0.2)
+  with SessionLocal() as db:
+    db.add(models.IdempotencyKey(scope="coupons", idem_key="old", request_hash=idempotency.request_hash(payload),
+                                 created_at=datetime.utcnow() - timedelta(hours=1)))
+    db.commit()
+
+  async def handler():
+    raise AssertionError("the owner may have committed - must not run again")
+
+  with SessionLocal() as db, pytest.raises(HTTPException) as exc:
+    asyncio.run(idempotency.execute(db, scope="coupons", key="old", payload=payload, handler=handler))
+
+  assert exc.value.status_code == 409
+  engine.dispose()
@@ -0,0 +1,123 @@
+from decimal import Decimal
+
+import pytest
+
+from app import crud, odds_cache, schemas
+from app.odds_cache import OddsCache, OddsVerificationError
+
+
+def _cache(mode="lenient", tolerance="0.05"):
+  cache = OddsCache(base_url="http://sports", mode=mode, tolerance=Decimal(tolerance))
+  cache.apply([
+    {"odds_id": 1, "event_id": 10, "bet_type": "1", "coefficient": "1.85",
+     "is_active": True, "updated_at": "2025-12-20T10:00:00"},
+    {"odds_id": 2, "event_id": 10, "bet_type": "X", "coefficient": "3.40",
+     "is_active": False, "updated_at": "2025-12-20T10:00:01"},
+  ])
+  cache.mark_synced()
+  return cache
+
+
+def test_verify_accepts_within_tolerance_and_returns_server_price():
+  cache = _cache()
+  assert cache.verify(odds_id=1, event_id=10, bet_type="1", coefficient=Decimal("1.88")) == Decimal("1.85")
+
+
+@pytest.mark.parametrize("odds_id,event_id,bet_type,coeff,code", [
+  (1, 10, "1", "2.10", "price_changed"),
+  (1, 11, "1", "1.85", "odds_mismatch"),
+  (2, 10, "X", "3.40", "odds_suspended"),
+])
+def test_verify_rejects(odds_id, event_id, bet_type, coeff, code):
+  with pytest.raises(OddsVerificationError) as exc:
+    _cache().verify(odds_id=odds_id, event_id=event_id, bet_type=bet_type, coefficient=Decimal(coeff))
+  assert exc.value.code == code
+
+
+def test_unknown_odds_depends_on_mode():
+  assert _cache("lenient").verify(odds_id=99, event_id=10, bet_type="1", coefficient=Decimal("1.5")) is None
+  with pytest.raises(OddsVerificationError):
+    _cache("strict").verify(odds_id=99, event_id=10, bet_type="1", coefficient=Decimal("1.5"))
+  assert OddsCache(base_url="", mode="strict").verify(
+    odds_id=99, event_id=10, bet_type="1", coefficient=Decimal("1.5")) is None
+
+
+def test_create_bet_stores_cached_price(db_session, monkeypatch):
+  monkeypatch.setattr(crud, "odds_cache", _cache())
+  payload = schemas.BetCreate(user_id="u1", event_id=10, odds_id=1, bet_type="1",
+                              bet_amount=Decimal("100"), coefficient=Decimal("1.90"),
+                              potential_win=Decimal("999"))
+  bet = crud.create_bet(db_session, payload=payload)
+  assert bet.coefficient == Decimal("1.85")
+  assert bet.potential_win == Decimal("185.00")
+
+
+def _feed(rows):
+  """Фид sports-модуля: строки после курсора (updated_at, odds_id), NULL - '-infinity'."""
+  def key(row):
+    return (row["updated_at"] or odds_cache.FEED_NULL_UPDATED_AT, row["odds_id"])
+
+  def fetch(cursor):
+    ordered = sorted(rows, key=key)
+    if cursor:
+      ordered = [row for row in ordered if key(row) > cursor]
+    page = ordered[:odds_cache.FEED_PAGE_SIZE]
+    return {"odds": page, "has_more": len(page) == odds_cache.FEED_PAGE_SIZE}
+  return fetch
+
+
+def test_refresh_pages_through_equal_timestamps(monkeypatch):
+  monkeypatch.setattr(odds_cache, "FEED_PAGE_SIZE", 2)
+  rows = [
+    {"odds_id": i, "event_id": 10, "bet_type": "1", "coefficient": "1.50",
+     "updated_at": None if i == 6 else "2025-12-20T10:00:00"}
+    for i in range(1, 7)
+  ]
+  cache = OddsCache(base_url="http://sports")
+  cache._fetch = _feed(rows)
+  assert cache.refresh() == 6
+  assert len(cache) == 6
+
+  # Изменение после синхронизации приходит следующим опросом, старые строки - нет
+  rows.append({"odds_id": 7, "event_id": 11, "bet_type": "X", "coefficient": "3.10",
+               "updated_at": "2025-12-20T10:00:00"})
+  rows[0] = dict(rows[0], coefficient="1.45", updated_at="2025-12-20T10:00:05")
+  assert cache.refresh() == 2
+  assert cache.get(1).coefficient == Decimal("1.45")
+  assert cache.refresh() == 0
+
+
+def test_refresh_rereads_overlap_window_for_late_commits():
+  rows = [{"odds_id": 1, "event_id": 10, "bet_type": "1", "coefficient": "1.50", "updated_at": "2025-12-20T10:00:10"}]
+  cache = OddsCache(base_url="http://sports", overlap=5)
+  cache._fetch = _feed(rows)
+  cache.refresh()
+
+  # Транзакция началась раньше (updated_at меньше курсора), закоммитилась позже
+  rows.append({"odds_id": 2, "event_id": 10, "bet_type": "X", "coefficient": "3.20",
+               "updated_at": "2025-12-20T10:00:07"})
+  rows.append({"odds_id": 3, "event_id": 10, "bet_type": "2", "coefficient": "4.00",
+               "updated_at": "2025-12-20T10:00:01"})  # старше окна - придёт с полной перезагрузкой
+  assert cache.refresh() == 1
+  assert cache.get(2).coefficient == Decimal("3.20") and cache.get(3) is None
+
+
+def test_inactive_and_deleted_odds_are_evicted():
+  rows = [{"odds_id": i, "event_id": 10, "bet_type": "1", "coefficient": "1.50",
+           "updated_at": "2025-12-20T10:00:00"} for i in (1, 2)]
+  cache = OddsCache(base_url="http://sports", mode="strict")
+  cache._fetch = _feed(rows)
+  cache.refresh()
+
+  rows[0] = dict(rows[0], is_active=False, updated_at="2025-12-20T10:00:05")
+  del rows[1]  # событие удалено вместе с коэффициентами
+  cache.refresh()
+  assert cache.get(1) is None and cache.is_suspended(1)
+  with pytest.raises(OddsVerificationError) as exc:
+    cache.verify(odds_id=1, event_id=10, bet_type="1", coefficient=Decimal("1.50"))
+  assert exc.value.code == "odds_suspended"
+  assert cache.get(2) is not None
+
+  cache.resync_seconds = 0
+  assert cache.refresh() == 1
+  assert len(cache) == 0 and cache.is_suspended(1)
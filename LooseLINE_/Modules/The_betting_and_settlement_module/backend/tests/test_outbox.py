@@ -0,0 +1,60 @@
+import json
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, outbox, schemas
+
+
+class FlakyPublisher:
+  def __init__(self, fail_times=0):
+    self.fail_times = fail_times
+    self.batches = []
+
+  def publish(self, messages):
+    if self.fail_times:
+      self.fail_times -= 1
+      raise ConnectionError("consumer down")
+    self.batches.append(messages)
+
+
+def _place(db, amount="10"):
+  return crud.create_bet(db, payload=schemas.BetCreate(
+    user_id="u1", event_id=1, odds_id=1, bet_type="1",
+    bet_amount=Decimal(amount), coefficient=Decimal("2.0"),
+  ))
+
+
+def test_events_are_written_with_the_bet(db_session):
+  bet = _place(db_session)
+  crud.update_bet_status(db_session, bet.bet_id, "resolved", result="won")
+  crud.update_bet_status(db_session, bet.bet_id, "resolved", result="won")  # без изменения - без события
+
+  events = db_session.query(models.OutboxEvent).order_by(models.OutboxEvent.id).all()
+  assert [e.event_type for e in events] == ["bet.placed", "bet.settled"]
+  assert json.loads(events[1].payload)["previous_status"] == "open"
+  assert Decimal(json.loads(events[0].payload)["bet_amount"]) == Decimal("10")
+
+
+def test_relay_delivers_in_order_at_least_once(engine, db_session):
+  for amount in ("1", "2", "3"):
+    bet = _place(db_session, amount)
+  crud.update_bet_status(db_session, bet.bet_id, "cancelled")
+
+  publisher = FlakyPublisher(fail_times=1)
+  relay = outbox.OutboxRelay(publisher, sessionmaker(bind=engine), batch_size=3)
+
+  with pytest.raises(ConnectionError):
+    relay.run_once()
+  assert outbox.backlog(db_session)["pending_events"] == 4
+
+  assert relay.run_once() == 3
+  assert relay.run_once() == 1
+  assert relay.run_once() == 0
+
+  delivered = [m["id"] for batch in publisher.batches for m in batch]
+  assert delivered == sorted(delivered) and len(delivered) == 4
+  assert publisher.batches[1][0]["type"] == "bet.status_changed"
+  assert outbox.backlog(db_session)["pending_events"] == 0
+  assert relay.metrics["published_total"] == 4
@@ -0,0 +1,62 @@
+"""
+Tests for coupon and system bet pricing in app.crud.
+"""
+from decimal import Decimal
+from itertools import combinations
+
+import pytest
+
+from app import crud
+
+
+class TestBulkCouponPricing:
+  def test_bulk_matches_scalar(self):
+    coupons = [
+      (Decimal("150"), [1.85, 2.1, 3.4]),
+      (Decimal("10.55"), ["1.5", "1.00", "2.35"]),
+      (Decimal("0"), [1.85]),
+      (Decimal("100"), []),
+      (Decimal("33.33"), [1.85, 2.1, 3.4]),
+    ]
+
+    results = crud.calculate_coupons_win(coupons)
+
+    assert results == [crud.calculate_coupon_win(a, c) for a, c in coupons]
+
+  def test_invalid_coefficients_are_skipped(self):
+    result = crud.calculate_coupons_win([(Decimal("100"), [1.0, 2.0])])[0]
+
+    assert result["coefficients"] == [Decimal("2.0")]
+    assert result["potentialWin"] == Decimal("200.00")
+
+
+class TestSystemPricing:
+  def test_system_matches_sum_of_scalar_coupons(self):
+    coeffs = [Decimal("1.85"), Decimal("2.1"), Decimal("3.4"), Decimal("1.33")]
+    amount = Decimal("7.77")
+
+    result = crud.calculate_system_win(amount, coeffs, 2, include_combinations=True)
+
+    expected = [
+      crud.calculate_coupon_win(amount, list(combo))["potentialWin"]
+      for combo in combinations(coeffs, 2)
+    ]
+    assert result["numberOfCombinations"] == 6
+    assert [c["potentialWin"] for c in result["combinations"]] == expected
+    assert result["potentialWin"] == sum(expected)
+    assert result["totalStake"] == Decimal("46.62")
+    assert result["minWin"] == min(expected)
+    assert result["maxWin"] == max(expected)
+
+  def test_system_rejects_invalid_coefficients(self):
+    # Отброшенный коэффициент сдвинул бы индексы legs относительно входа
+    with pytest.raises(ValueError, match=r"positions \[1\]"):
+      crud.calculate_system_win(Decimal("10"), [1.5, 1.0, 2.0], 2, include_combinations=True)
+
+  def test_system_size_out_of_range(self):
+    with pytest.raises(ValueError):
+      crud.calculate_system_win(Decimal("10"), [1.5, 2.0], 3)
+
+  def test_system_combination_limit(self):
+    with pytest.raises(ValueError):
+      crud.calculate_system_win(Decimal("1"), [1.5] * 40, 20)
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.ratelimit import MemoryBucketStore, RateLimiter, RedisBucketStore, Rule, parse_rules
+
+
+class Clock:
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+def test_parse_rules():
+  assert parse_rules("bets.create=5/s:20, bets.calculate=50/s") == {
+    "bets.create": Rule(5, 20), "bets.calculate": Rule(50, 50),
+  }
+
+
+def test_bucket_refills_and_idle_keys_are_evicted():
+  clock = Clock()
+  store = MemoryBucketStore(shards=4, sweep_seconds=10, clock=clock)
+  rule = Rule(rate=2, burst=3)
+
+  assert [store.take_now("u1", rule) for _ in range(4)] == [0, 0, 0, 0.5]
+  clock.now += 0.5
+  assert store.take_now("u1", rule) == 0
+  store.take_now("u2", rule)
+  assert len(store) == 2
+
+  # Через время полного заполнения ключ не нужен - проход по шарду его удаляет
+  clock.now += 1
+  store.sweep()
+  assert len(store) == 1  # u1 ещё не заполнился
+  clock.now += 60
+  store.take_now("u3", rule)  # ленивый проход по шарду u3
+  store.sweep()
+  assert len(store) == 1
+
+
+def test_limiter_returns_429_with_retry_after_per_user_and_ip():
+  clock = Clock()
+  limiter = RateLimiter({"bets.create": Rule(1, 2)}, MemoryBucketStore(clock=clock), ip_factor=2, enabled=True)
+  check = lambda **kw: asyncio.run(limiter.check("bets.create", **kw))
+
+  check(user_id="u1", ip="1.1.1.1")
+  check(user_id="u1", ip="1.1.1.1")
+  with pytest.raises(HTTPException) as exc:
+    check(user_id="u1", ip="1.1.1.1")
+  assert exc.value.status_code == 429 and exc.value.headers["Retry-After"] == "1"
+
+  # Другой пользователь с того же IP: у IP bucket вдвое больше
+  check(user_id="u2", ip="1.1.1.1")
+  with pytest.raises(HTTPException):
+    check(user_id="u3", ip="1.1.1.1")
+
+  asyncio.run(limiter.check("unknown.route", user_id="u1"))  # без правила - без лимита
+
+
+class FlakyRedis:
+  def __init__(self):
+    self.calls = 0
+    self.down = True
+
+  def register_script(self, script):
+    async def run(keys, args):
+      self.calls += 1
+      if self.down:
+        raise ConnectionError("redis is down")
+      return "0"
+    return run
+
+
+def test_redis_circuit_breaker_uses_local_buckets_while_open(caplog):
+  clock, redis = Clock(), FlakyRedis()
+  store = RedisBucketStore("redis://", client=redis, retry_seconds=30, clock=clock)
+  rule = Rule(rate=1, burst=2)
+  take = lambda: asyncio.run(store.take("u1", rule))
+
+  assert [take() for _ in range(3)] == [0, 0, 1.0]  # локальный bucket
+  assert redis.calls == 1
+  assert len([r for r in caplog.records if "unavailable" in r.getMessage()]) == 1
+
+  # По истечении паузы - снова Redis
+  clock.now += 31
+  redis.down = False
+  assert take() == 0
+  assert redis.calls == 2
+  take()
+  assert redis.calls == 3
@@ -0,0 +1,37 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from app import refcodes
+
+PROCESSES = 4
+CODES_PER_PROCESS = 500_000
+
+
+def _generate(node_id, frozen):
+  # frozen - часы стоят на месте: проверяем переполнение счётчика за секунду
+  clock = (lambda: refcodes.EPOCH + 1000) if frozen else refcodes.time.time
+  gen = refcodes.ReferenceGenerator("CPN", node_source=lambda: node_id, clock=clock)
+  return [gen.next() for _ in range(CODES_PER_PROCESS)]
+
+
+@pytest.mark.parametrize("frozen", [False, True])
+def test_millions_of_codes_across_processes_are_unique(frozen):
+  with ProcessPoolExecutor(PROCESSES) as pool:
+    batches = list(pool.map(_generate, range(1, PROCESSES + 1), [frozen] * PROCESSES))
+
+  codes = [c for batch in batches for c in batch]
+  assert len(codes) == PROCESSES * CODES_PER_PROCESS
+  assert len(set(codes)) == len(codes)
+  assert max(len(c) for c in codes) <= refcodes.CODE_MAX_LENGTH
+
+
+def test_counter_overflow_borrows_next_second():
+  gen = refcodes.ReferenceGenerator("CPN", node_source=lambda: 7, clock=lambda: refcodes.EPOCH)
+  gen._counter = refcodes.COUNTER_SPACE - 1
+  gen._ts = 0
+  gen._pid = refcodes.os.getpid()
+  gen._node = refcodes._b36(7, refcodes.NODE_WIDTH)
+  last, borrowed = gen.next(), gen.next()
+  assert last.endswith("ZZZZ") and borrowed.endswith("0000")
+  assert borrowed[3:9] == "000001"
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import replicas
+
+
+def _bind_url(db: Session) -> str:
+  return str(db.get_bind().url)
+
+
+def test_round_robin_skips_unhealthy_replicas():
+  router = replicas.ReplicaRouter(
+    ["sqlite:///file:r1?mode=memory&uri=true", "sqlite:////nonexistent/dir/r2.db",
+     "sqlite:///file:r3?mode=memory&uri=true"],
+    async_mode=False,
+  )
+  asyncio.run(router.check())
+  assert [r.healthy for r in router.replicas] == [True, False, True]
+
+  picked = [router.pick().url for _ in range(4)]
+  assert picked == [router.replicas[0].url, router.replicas[2].url] * 2
+
+  for r in router.replicas:
+    r.healthy = False
+  db = router.session()
+  try:
+    assert _bind_url(db) == str(replicas.SessionLocal.kw["bind"].url)  # фолбэк на primary
+  finally:
+    db.close()
+
+
+def test_client_reads_primary_right_after_a_write(monkeypatch):
+  router = replicas.ReplicaRouter(["sqlite:///file:r1?mode=memory&uri=true"], async_mode=False, sticky_seconds=60)
+  monkeypatch.setattr(replicas, "router", router)
+  primary_url = str(replicas.SessionLocal.kw["bind"].url)
+
+  app = FastAPI()
+  app.add_middleware(replicas.ReadYourWritesMiddleware)
+
+  @app.post("/write")
+  def write(request: Request):
+    router.mark_write(request)
+
+  @app.get("/read")
+  def read(db=Depends(replicas.get_read_session)):
+    return _bind_url(db)
+
+  writer, other = TestClient(app), TestClient(app)
+  assert writer.post("/write").headers[replicas.LAST_WRITE_HEADER]
+  # Метка приходит с клиентом (cookie) - действует на любом процессе
+  assert writer.get("/read").json() == primary_url
+  assert other.get("/read").json() == router.replicas[0].url
+  marker = {replicas.LAST_WRITE_HEADER: writer.cookies[replicas.LAST_WRITE_COOKIE]}
+  assert other.get("/read", headers=marker).json() == primary_url
+
+  assert not router.is_sticky(str(time.time() - 61))
+  assert not router.is_sticky("garbage")
@@ -119,9 +119,12 @@ CREATE TABLE IF NOT EXISTS bet_results (
 
 -- Индексы
 CREATE INDEX IF NOT EXISTS idx_bets_user_id ON bets(user_id);
+-- Keyset-пагинация истории: WHERE user_id = ? ORDER BY placed_at DESC, bet_id DESC
+CREATE INDEX IF NOT EXISTS idx_bets_user_placed ON bets(user_id, placed_at DESC, bet_id DESC);
 CREATE INDEX IF NOT EXISTS idx_bets_event_id ON bets(event_id);
 CREATE INDEX IF NOT EXISTS idx_bets_status ON bets(status);
 CREATE INDEX IF NOT EXISTS idx_coupons_user_id ON coupons(user_id);
+CREATE INDEX IF NOT EXISTS idx_coupons_user_created ON coupons(user_id, created_at DESC, coupon_id DESC);
 CREATE INDEX IF NOT EXISTS idx_coupon_bets_coupon_id ON coupon_bets(coupon_id);
 CREATE INDEX IF NOT EXISTS idx_bet_transactions_user_id ON bet_transactions(user_id);
 CREATE INDEX IF NOT EXISTS idx_bet_transactions_bet_id ON bet_transactions(bet_id);